@@ -1,32 +1,78 @@
-# ----- Import Library -----
-import pandas as pd
-import numpy as np
-import streamlit as st
-from PIL import Image
-
-# ----- Load images as icon -----
-icon_image = Image.open("orderfaz.jpeg")
-
-# ----- Set Page Sidebar -----
-p1 = st.Page("pages/dashboard1.py", title="GMV Weekly", icon=":material/date_range:")
-p2 = st.Page("pages/dashboard2.py", title="GMV Monthly", icon=":material/calendar_month:")
-p3 = st.Page("pages/dashboard3.py", title="Top Revenue", icon=":material/hourglass_top:")
-
-# ----- Install Multi-page Navigation -----
-pg = st.navigation({
-    "Home": [st.Page("home.py", title="Home", icon=":material/home:")],
-    "Menu": [p1, p2, p3]
-})
-
-# ----- Set Page Config -----
-st.set_page_config(page_title="OF | Sales", page_icon=icon_image, layout="wide")
-
-# ----- Run Streamlit Page Navigation -----
-pg.run()
-
-# Share Info across all pages (optional)
-# ----- Set Logo -----
-st.logo('orderfaz.jpeg')
-st.sidebar.header(" ☎️ Adam Maurizio")
-
-
+# ----- Import Library -----
+import streamlit as st
+from utils.active_users import get_au_index
+from utils.cache import get_cache
+from utils.db import get_pool
+from utils.flight import get_flight, get_gate
+from utils.perf import session_spans, set_page
+from utils.prewarm import start_prewarm_scheduler
+from utils.startup import lazy_import, load_asset, startup_stats
+from utils.store import get_store
+
+# pandas hanya dipakai panel Performance, di-load saat sudah ada span
+pd = lazy_import('pandas')
+
+# ----- Pre-warm View Default setelah Update 00:00 (sekali per proses) -----
+start_prewarm_scheduler()
+
+# ----- Load images as icon (dibaca sekali per proses, bukan setiap rerun) -----
+icon_image = load_asset("orderfaz.jpeg")
+
+# ----- Set Page Sidebar -----
+p1 = st.Page("pages/dashboard1.py", title="GMV Weekly", icon=":material/date_range:")
+p2 = st.Page("pages/dashboard2.py", title="GMV Monthly", icon=":material/calendar_month:")
+p3 = st.Page("pages/dashboard3.py", title="Top Revenue", icon=":material/hourglass_top:")
+p4 = st.Page("pages/dashboard4.py", title="Cohort Retention", icon=":material/grid_on:")
+
+# ----- Install Multi-page Navigation -----
+pg = st.navigation({
+    "Home": [st.Page("home.py", title="Home", icon=":material/home:")],
+    "Menu": [p1, p2, p3, p4]
+})
+
+# ----- Set Page Config -----
+st.set_page_config(page_title="OF | Sales", page_icon=icon_image, layout="wide")
+
+# ----- Run Streamlit Page Navigation -----
+set_page(pg.title)
+pg.run()
+
+# Share Info across all pages (optional)
+# ----- Set Logo -----
+st.logo(icon_image)
+st.sidebar.header(" ☎️ Adam Maurizio")
+
+# ----- Snowflake Connection Pool Stats -----
+with st.sidebar.expander("Connection Pool"):
+    st.json(get_pool().stats())
+
+# ----- KPI Result Cache Stats -----
+with st.sidebar.expander("Result Cache"):
+    st.json(get_cache().stats())
+
+# ----- Active User Index Stats (hari yang sudah di-index, ukuran di disk) -----
+with st.sidebar.expander("Active User Index"):
+    st.json(get_au_index().stats())
+
+# ----- Warehouse Admission & Request Coalescing Stats -----
+with st.sidebar.expander("Warehouse Queue"):
+    st.json({'admission': get_gate().stats(), 'single_flight': get_flight().stats()})
+
+# ----- Shared Report Store Stats (satu salinan report untuk semua session) -----
+with st.sidebar.expander("Report Store"):
+    st.json(get_store().stats())
+
+# ----- Startup: library berat yang sudah di-load di proses ini (lazy import) -----
+with st.sidebar.expander("Startup"):
+    st.json(startup_stats())
+
+# ----- Performance Spans (connect, query, DataFrame, Excel, chart) -----
+with st.sidebar.expander("Performance"):
+    spans = session_spans()
+    if spans:
+        spans_df = pd.DataFrame(spans)[['page', 'span', 'wall_ms', 'rows', 'bytes_scanned', 'query_id', 'ts']]
+        spans_df['ts'] = pd.to_datetime(spans_df['ts'], unit='s')
+        st.dataframe(spans_df, use_container_width=True, hide_index=True)
+        st.caption(f"{len(spans)} span terakhir, total {spans_df['wall_ms'].sum():,.0f} ms")
+    else:
+        st.caption("Belum ada span di session ini.")
@@ -1,11 +1,25 @@
-# ----- Import Library -----
-import streamlit as st
-
-# ----- Set Title -----
-st.title('Orderfaz Analytics - Sales Division')
-
-st.markdown('<div style="text-align: justify; font-size:160%"> Data Analytics untuk Sales ini merangkum berbagai macam feature yang berkaitan dengan requirements divisi Sales di tim Orderfaz. Data ini diproses secara real-time (24 jam sekali) untuk memastikan pengambilan insight dan keputusan bisnis yang lebih cepat. </div>',
-            unsafe_allow_html=True)
-st.markdown('<br>', unsafe_allow_html=True)
-st.warning('⏲️ Data di-Update setiap 24 jam sekali di 00.00')
-st.success('☎️ If you find any Bug/Issues, please contact Adam Maurizio at Google Chat')
\ No newline at end of file
+# ----- Import Library -----
+import streamlit as st
+from utils.prewarm import prewarm_status
+
+# ----- Set Title -----
+st.title('Orderfaz Analytics - Sales Division')
+
+st.markdown('<div style="text-align: justify; font-size:160%"> Data Analytics untuk Sales ini merangkum berbagai macam feature yang berkaitan dengan requirements divisi Sales di tim Orderfaz. Data ini diproses secara real-time (24 jam sekali) untuk memastikan pengambilan insight dan keputusan bisnis yang lebih cepat. </div>',
+            unsafe_allow_html=True)
+st.markdown('<br>', unsafe_allow_html=True)
+st.warning('⏲️ Data di-Update setiap 24 jam sekali di 00.00')
+st.success('☎️ If you find any Bug/Issues, please contact Adam Maurizio at Google Chat')
+
+# ----- Status Pre-warm Laporan Default -----
+statuses = prewarm_status()
+warm = [status for status in statuses if status['state'] == 'warm']
+if len(warm) == len(statuses):
+    st.info(f"🔥 Warm: {len(warm)}/{len(statuses)} laporan default sudah siap, dibuka langsung dari cache")
+else:
+    st.info(f"🧊 Cold: {len(warm)}/{len(statuses)} laporan default sudah siap, sisanya dihitung saat Submit")
+with st.expander("Detail pre-warm"):
+    for status in statuses:
+        built_at = f", dibuat {status['built_at']:%H:%M}" if status.get('built_at') else ''
+        error = f" ({status['error']})" if status['state'] != 'warm' and status['error'] else ''
+        st.markdown(f"- `{status['key']}`: **{status['state']}**{built_at}{error}")
@@ -1,129 +1,109 @@
-import pandas as pd
-import streamlit as st
-import snowflake.connector
-from datetime import datetime, timedelta
-from io import BytesIO
-from decimal import Decimal
-from tqdm import tqdm
-from stqdm import stqdm  # Import stqdm for Streamlit integration
-from PIL import Image
-
-# ===== Connect & Fetch Database =====
-# Access secrets using st.secrets
-user = st.secrets["snowflake"]["user"]
-password = st.secrets["snowflake"]["password"]
-account = st.secrets["snowflake"]["account"]
-warehouse = st.secrets["snowflake"]["warehouse"]
-database = st.secrets["snowflake"]["database"]
-schema = st.secrets["snowflake"]["schema"]
-
-# Establish connection to Snowflake
-connection = snowflake.connector.connect(
-    user=user,
-    password=password,
-    account=account,
-    warehouse=warehouse,
-    database=database,
-    schema=schema
-)
-
-# ===== Streamlit Input Widgets =====
-st.title("Shipping Performance Weekly Report")
-
-# Input StartDate and EndDate
-start_date = st.date_input("Pilih Tanggal Mulai", value=datetime.now() - timedelta(days=30))
-end_date = st.date_input("Pilih Tanggal Akhir", value=datetime.now())
-
-# Validate the date inputs
-def validate_date_inputs(start_date, end_date):
-    errors = []
-    if start_date > end_date:
-        errors.append("Tanggal mulai tidak boleh lebih besar dari tanggal akhir.")
-    return errors
-
-# Function to calculate GMV EOM
-def calculate_gmv_eom(gmv_final, days, days_in_period):
-    gmv_eom = float(gmv_final) / days * days_in_period
-    return gmv_eom
-
-# Tombol Submit
-if st.button('Submit'):
-    errors = validate_date_inputs(start_date, end_date)
-
-    if errors:
-        for error in errors:
-            st.error(error)
-    else:
-        start_timestamp = int(datetime.combine(start_date, datetime.min.time()).timestamp())
-        end_timestamp = int(datetime.combine(end_date, datetime.max.time()).timestamp())
-        days_in_period = (end_date - start_date).days + 1
-
-        # Perhitungan preStart dan preEnd
-        c = end_timestamp - start_timestamp
-        preStart_timestamp = start_timestamp - c
-        preEnd_timestamp = end_timestamp - c
-
-        # Query to fetch data from Snowflake
-        query = f"""
-        SELECT
-            COALESCE(SUM(CASE WHEN so.status IN (500, 702, 703) THEN so.gmv_shipment END), 0) AS gmv_final_status,
-            COUNT(CASE WHEN so.status >= 300 AND so.status < 500 THEN 1 END) AS order_qty,
-            COUNT(DISTINCT(CASE WHEN EXISTS (
-                SELECT 1 FROM shipment_orders so3
-                WHERE so3.created_by = so.created_by
-                  AND so3.created_at < {start_timestamp}
-            ) THEN so.created_by END)) AS r_trx_user,
-            COUNT(DISTINCT(CASE WHEN NOT EXISTS (
-                SELECT 1 FROM shipment_orders so2
-                WHERE so2.created_by = so.created_by
-                  AND so2.created_at >= {preStart_timestamp} AND so2.created_at <= {preEnd_timestamp}
-            ) THEN so.created_by END)) AS n_trx_user,
-            (SELECT COUNT(DISTINCT ul.user_id)
-             FROM user_logs ul
-             WHERE ul.created_at >= {start_timestamp}
-               AND ul.created_at <= {end_timestamp}) AS active_user,
-            COUNT(DISTINCT so.created_by) AS trx_user,
-            AVG(so.transaction_value) AS aov,
-            CASE
-                WHEN COUNT(CASE WHEN so.status IN (500, 703) THEN 1 END) = 0
-                THEN 0
-                ELSE (COUNT(CASE WHEN so.status = 702 THEN 1 END)::NUMERIC / 
-                      COUNT(CASE WHEN so.status IN (500, 703) THEN 1 END)::NUMERIC)
-            END AS cod_rts
-        FROM shipment_orders so
-        WHERE so.created_at >= {start_timestamp} AND so.created_at <= {end_timestamp};
-        """
-
-        cur = connection.cursor()
-        cur.execute(query)
-        result = cur.fetchone()
-
-        # Prepare DataFrame with results
-        data = {
-            'GMV Final Status': [float(result[0])],
-            'Orders Qty': [result[1]],
-            'R Transacting User': [result[2]],
-            'N Transacting User': [result[3]],
-            'AU (Aktive User)': [result[4]],
-            'TU (Trx User)': [result[2] + result[3]],
-            'AOV': [result[6]],
-            'COD RTS%': [result[7]]
-        }
-
-        df = pd.DataFrame(data)
-
-        # Display the DataFrame
-        st.dataframe(df, use_container_width=True)
-
-        # Download the DataFrame as Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False)
-        processed_data = output.getvalue()
-
-        file_name = f"report_{start_date.strftime('%Y%m%d')}_{end_date.strftime('%Y%m%d')}.xlsx"
-
-        st.download_button(label='Download as Excel',
-                           data=processed_data,
-                           file_name=file_name,
-                           mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+import streamlit as st
+from utils.first_order import ensure_index_fresh
+from utils.active_users import ensure_au_index_fresh
+from utils.db import make_query_tag
+from utils.rollup import ensure_rollup_fresh
+from utils.prewarm import load_report, report_key
+from utils.reports import COMPARE_METRICS, build_weekly_report, format_delta, previous_period_of
+from utils.export import download_section
+from utils.flight import queue_feedback
+from utils.store import get_store
+from utils.startup import lazy_import
+from datetime import datetime, timedelta
+
+# numpy baru di-load saat metric report ditampilkan (bukan saat halaman dibuka)
+np = lazy_import('numpy')
+
+# ===== Connect & Fetch Database =====
+# Koneksi Snowflake diambil dari pool bersama (utils/db.py) dan baru dibuka saat Submit
+
+# ===== Streamlit Input Widgets =====
+st.title("Shipping Performance Weekly Report")
+
+# Input StartDate and EndDate
+start_date = st.date_input("Pilih Tanggal Mulai", value=datetime.now() - timedelta(days=30))
+end_date = st.date_input("Pilih Tanggal Akhir", value=datetime.now())
+
+# Mode compare: periode sebelumnya dengan jumlah hari yang sama, dihitung dalam query yang sama
+compare = st.toggle("Bandingkan dengan periode sebelumnya", value=False)
+
+# Validate the date inputs
+def validate_date_inputs(start_date, end_date):
+    errors = []
+    if start_date > end_date:
+        errors.append("Tanggal mulai tidak boleh lebih besar dari tanggal akhir.")
+    return errors
+
+# Tombol Submit
+report = None
+if st.button('Submit'):
+    errors = validate_date_inputs(start_date, end_date)
+
+    if errors:
+        for error in errors:
+            st.error(error)
+    else:
+        # Report dipakai bersama semua session lewat report store; view default (30 hari terakhir) sudah di-pre-warm
+        # setelah update 00:00, selain itu dihitung saat Submit
+        weekly_key = report_key('gmv_weekly', start_date, end_date, *(['compare'] if compare else []))
+        store = get_store()
+        report = store.get(weekly_key)
+        cache_caption = "Report store: hasil dipakai bersama semua session"
+        if report is None:
+            report = load_report(weekly_key)
+            if report is not None:
+                store.put(weekly_key, report)
+                cache_caption = f"Pre-warmed report, dibuat {report['built_at']:%H:%M}"
+        if report is None:
+            # KPI periode (metric additive dari daily rollup, R/N Transacting User dari first-order index, AU dari index AU)
+            cache_stats = {}
+            ensure_index_fresh()
+            ensure_rollup_fresh()
+            ensure_au_index_fresh()
+            # Posisi antrean warehouse / query yang sama dari session lain ditampilkan selama menunggu
+            queue_status = st.empty()
+            with queue_feedback(queue_status.info):
+                report = store.put(weekly_key, build_weekly_report(
+                    start_date, end_date, stats=cache_stats, compare=compare,
+                    query_tag=make_query_tag('gmv_weekly', 'period_compare' if compare else 'period')))
+            queue_status.empty()
+            cache_caption = f"Result cache: {cache_stats['hits']} hit, {cache_stats['misses']} miss"
+
+        # Session hanya menyimpan key report, supaya report tetap tampil saat rerun (mis. tombol download)
+        st.session_state['gmv_weekly_report'] = {'key': weekly_key, 'start_date': start_date, 'end_date': end_date,
+                                                 'caption': cache_caption}
+
+# ===== Display Report =====
+submitted_report = st.session_state.get('gmv_weekly_report')
+if report is None and submitted_report is not None:
+    report = get_store().get(submitted_report['key'])
+    if report is None:
+        st.info("Report sudah tidak ada di cache (data sudah di-refresh), klik Submit lagi.")
+
+if report is not None:
+    df = report['tables']['df']
+
+    # Display metrics with delta vs periode sebelumnya (mode compare)
+    metrics = report['metrics']
+    if metrics:
+        prev_start_date, prev_end_date = previous_period_of(submitted_report['start_date'], submitted_report['end_date'])
+        columns = st.columns(len(COMPARE_METRICS))
+        for column, (name, label) in zip(columns, COMPARE_METRICS.items()):
+            with column:
+                if name == 'cod_rts':
+                    st.metric(label=label, value=f"{metrics[name]:.2%}", delta=format_delta(metrics['delta_cod_rts'], " pp"),
+                              delta_color="inverse")
+                else:
+                    st.metric(label=label, value=f"{np.round(metrics[name], 2):,}",
+                              delta=format_delta(metrics[f'delta_{name}'], "%"))
+        st.caption(f"Dibandingkan dengan {prev_start_date:%d %b %Y} - {prev_end_date:%d %b %Y}")
+
+    # Display the DataFrame
+    st.dataframe(df, use_container_width=True)
+    if metrics:
+        st.dataframe(report['tables']['prev_df'], use_container_width=True)
+    st.caption(submitted_report['caption'])
+
+    # Download dibuat hanya saat diminta (Excel / Parquet / CSV), lihat utils/export.py
+    file_stem = f"report_{submitted_report['start_date']:%Y%m%d}_{submitted_report['end_date']:%Y%m%d}"
+    download_section(submitted_report['key'], report, file_stem)
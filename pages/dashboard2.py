@@ -1,427 +1,312 @@
-import pandas as pd
-import streamlit as st
-import snowflake.connector
-from datetime import datetime, timedelta
-from io import BytesIO
-import numpy as np
-from decimal import Decimal
-from tqdm import tqdm
-from streamlit.runtime.scriptrunner import add_script_run_ctx
-from stqdm import stqdm  # Import stqdm for Streamlit integration
-from PIL import Image
-import plotly.express as px
-
-# ===== Connect & Fetch Database =====
-# Access secrets using st.secrets
-user = st.secrets["snowflake"]["user"]
-password = st.secrets["snowflake"]["password"]
-account = st.secrets["snowflake"]["account"]
-warehouse = st.secrets["snowflake"]["warehouse"]
-database = st.secrets["snowflake"]["database"]
-schema = st.secrets["snowflake"]["schema"]
-
-# Establish connection to Snowflake
-connection = snowflake.connector.connect(
-    user=user,
-    password=password,
-    account=account,
-    warehouse=warehouse,
-    database=database,
-    schema=schema
-)
-
-# ===== Streamlit Input Widgets =====
-st.title("Shipping Performance Monthly Report")
-
-# Input bulan dan tahun
-month_input = st.selectbox("Pilih Bulan", range(1, 13), format_func=lambda x: datetime(1900, x, 1).strftime('%B'))
-year_input = st.number_input("Pilih Tahun", min_value=2000, max_value=2100, value=datetime.now().year)
-
-previous_month = (datetime(year_input, month_input, 1) - timedelta(days=1)).month
-previous_year = (datetime(year_input, month_input, 1) - timedelta(days=1)).year
-
-
-# Validasi input
-def validate_inputs(month_input, year_input):
-    errors = []
-    if month_input < 1 or month_input > 12:
-        errors.append("Bulan harus antara 1 dan 12.")
-    if year_input < 2000 or year_input > 2100:
-        errors.append("Tahun harus antara 2000 dan 2100.")
-    return errors
-
-
-# Function to calculate GMV EOM
-def calculate_gmv_eom(gmv_final, days, days_in_month):
-    gmv_eom = float(gmv_final) / days * days_in_month
-    return gmv_eom
-
-
-# Function to generate weekly data based on month and year
-def generate_weeks(month, year):
-    start_date = datetime(year, month, 1)
-    end_date = (datetime(year, month + 1, 1) - timedelta(seconds=1)) if month < 12 else datetime(year, month, 31, 23, 59, 59)
-    days_in_month = (end_date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-    days_in_month = days_in_month.day
-    data = []
-    day_of_week = start_date.weekday()
-
-    if day_of_week == 0:
-        current_date = start_date
-    elif day_of_week in {1, 2, 3, 4}:
-        end_of_week = start_date + timedelta(days=(6 - day_of_week))
-        end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
-        data.append({
-            "Tanggal Senin (Awal Minggu)": start_date.strftime('%Y-%m-%d %H:%M:%S'),
-            "Tanggal Minggu (Akhir Minggu)": end_of_week.strftime('%Y-%m-%d %H:%M:%S'),
-            "Minggu ke-": 1,
-            "Bulan": start_date.strftime('%B')
-        })
-        current_date = end_of_week + timedelta(seconds=1)
-    else:
-        start_of_week = start_date
-        end_of_week = start_of_week + timedelta(days=(6 - day_of_week + 7))
-        end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
-        data.append({
-            "Tanggal Senin (Awal Minggu)": start_of_week.strftime('%Y-%m-%d %H:%M:%S'),
-            "Tanggal Minggu (Akhir Minggu)": end_of_week.strftime('%Y-%m-%d %H:%M:%S'),
-            "Minggu ke-": 1,
-            "Bulan": start_of_week.strftime('%B')
-        })
-        current_date = end_of_week + timedelta(seconds=1)
-
-    week_number = 2 if day_of_week != 0 else 1
-
-    while current_date <= end_date:
-        start_of_week = current_date
-        end_of_week = start_of_week + timedelta(days=6)
-        end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
-
-        if end_of_week > end_date:
-            end_of_week = end_date
-
-        data.append({
-            "Tanggal Senin (Awal Minggu)": start_of_week.strftime('%Y-%m-%d %H:%M:%S'),
-            "Tanggal Minggu (Akhir Minggu)": end_of_week.strftime('%Y-%m-%d %H:%M:%S'),
-            "Minggu ke-": week_number,
-            "Bulan": start_of_week.strftime('%B')
-        })
-
-        current_date = end_of_week + timedelta(seconds=1)
-        week_number += 1
-
-    if len(data) > 1 and (datetime.strptime(data[-1]['Tanggal Minggu (Akhir Minggu)'], '%Y-%m-%d %H:%M:%S') - datetime.strptime(data[-1]['Tanggal Senin (Awal Minggu)'], '%Y-%m-%d %H:%M:%S')).days < 6:
-        data[-2]['Tanggal Minggu (Akhir Minggu)'] = data[-1]['Tanggal Minggu (Akhir Minggu)']
-        data.pop()
-
-    return pd.DataFrame(data), days_in_month
-
-
-# Tombol Submit
-if st.button('Submit'):
-    errors = validate_inputs(month_input, year_input)
-
-    if errors:
-        for error in errors:
-            st.error(error)
-    else:
-        weeks_df, days_in_month = generate_weeks(month_input, year_input)
-
-        # Tambahkan kolom GMV EOM setelah GMV Final Status
-        weeks_df[['GMV Final Status', 'GMV EOM', 'Orders Qty', 'R Transacting User', 'N Transacting User', 'AU (Aktive User)', 'TU (Trx User)', 'AOV', 'COD RTS%']] = None
-
-        cumulative_gmv = Decimal(0)
-
-        # Menggunakan stqdm untuk progress bar di Streamlit
-        for i, row in stqdm(weeks_df.iterrows(), total=weeks_df.shape[0], desc="Processing Weeks"):
-            st.write(f"Processing week {i + 1}")
-            start_date = datetime.strptime(row['Tanggal Senin (Awal Minggu)'], '%Y-%m-%d %H:%M:%S')
-            end_date = datetime.strptime(row['Tanggal Minggu (Akhir Minggu)'], '%Y-%m-%d %H:%M:%S')
-
-            start_timestamp = int(start_date.timestamp())
-            end_timestamp = int(end_date.timestamp())
-
-            # Perhitungan preStart dan preEnd
-            c = end_timestamp - start_timestamp
-            preStart_timestamp = start_timestamp - c
-            preEnd_timestamp = end_timestamp - c
-
-            query = f"""
-            SELECT
-                COALESCE(SUM(CASE WHEN so.status IN (500, 702, 703) THEN so.gmv_shipment END), 0) AS gmv_final_status,
-                COUNT(CASE WHEN so.status >= 300 AND so.status < 500 THEN 1 END) AS order_qty,
-                COUNT(DISTINCT(CASE WHEN EXISTS (
-                    SELECT 1 FROM shipment_orders so3
-                    WHERE so3.created_by = so.created_by
-                      AND so3.created_at < {start_timestamp}
-                ) THEN so.created_by END)) AS r_trx_user,
-                COUNT(DISTINCT(CASE WHEN NOT EXISTS (
-                    SELECT 1 FROM shipment_orders so2
-                    WHERE so2.created_by = so.created_by
-                      AND so2.created_at >= {preStart_timestamp} AND so2.created_at <= {preEnd_timestamp}
-                ) THEN so.created_by END)) AS n_trx_user,
-                (SELECT COUNT(DISTINCT ul.user_id)
-                 FROM user_logs ul
-                 WHERE ul.created_at >= {start_timestamp}
-                   AND ul.created_at <= {end_timestamp}) AS active_user,
-                COUNT(DISTINCT so.created_by) AS trx_user,
-                AVG(so.transaction_value) AS aov,
-                CASE
-                    WHEN COUNT(CASE WHEN so.status IN (500, 703) THEN 1 END) = 0
-                    THEN 0
-                    ELSE (COUNT(CASE WHEN so.status = 702 THEN 1 END)::NUMERIC / 
-                          COUNT(CASE WHEN so.status IN (500, 703) THEN 1 END)::NUMERIC)
-                END AS cod_rts
-            FROM shipment_orders so
-            WHERE so.created_at >= {start_timestamp} AND so.created_at <= {end_timestamp};
-            """
-
-            cur = connection.cursor()
-            cur.execute(query)
-            result = cur.fetchone()
-
-            # Update DataFrame with query results
-            weeks_df.at[i, 'GMV Final Status'] = float(result[0])  # Convert Decimal to float
-            weeks_df.at[i, 'Orders Qty'] = result[1]
-            weeks_df.at[i, 'R Transacting User'] = result[2]
-            weeks_df.at[i, 'N Transacting User'] = result[3]
-            weeks_df.at[i, 'AU (Aktive User)'] = result[4]
-            weeks_df.at[i, 'TU (Trx User)'] = result[2] + result[3]
-            weeks_df.at[i, 'AOV'] = result[6]
-            weeks_df.at[i, 'COD RTS%'] = result[7]
-
-            # Calculate cumulative GMV up to the current week
-            cumulative_gmv += result[0]
-
-            # Calculate GMV EOM
-            days_elapsed = (end_date - datetime(year_input, month_input, 1)).days + 1
-            gmv_eom = calculate_gmv_eom(cumulative_gmv, days_elapsed, days_in_month)
-            weeks_df.at[i, 'GMV EOM'] = gmv_eom
-
-        # Simpan hasil di session state
-        st.session_state['weeks_df'] = weeks_df
-
-        # Menghitung nilai rata-rata
-        avg_gmv = weeks_df['GMV Final Status'].mean()
-        sum_gmv_eom = weeks_df[weeks_df['Minggu ke-'] == 4]['GMV EOM'].max()
-        avg_orders_qty = weeks_df['Orders Qty'].mean()
-
-        # Simpan hasil perhitungan ke session state
-        st.session_state['avg_gmv'] = avg_gmv
-        st.session_state['sum_gmv_eom'] = sum_gmv_eom
-        st.session_state['avg_orders_qty'] = avg_orders_qty
-
-        # ==== PROCESS DATA FOR PREVIOUS MONTH ====
-        prev_weeks_df, prev_days_in_month = generate_weeks(previous_month, previous_year)
-        cumulative_gmv_prev = Decimal(0)
-
-        for i, row in stqdm(prev_weeks_df.iterrows(), total=prev_weeks_df.shape[0], desc="Processing Previous Month Weeks"):
-            st.write(f"Processing week {i + 1} of previous month")
-            start_date = datetime.strptime(row['Tanggal Senin (Awal Minggu)'], '%Y-%m-%d %H:%M:%S')
-            end_date = datetime.strptime(row['Tanggal Minggu (Akhir Minggu)'], '%Y-%m-%d %H:%M:%S')
-
-            start_timestamp = int(start_date.timestamp())
-            end_timestamp = int(end_date.timestamp())
-
-            # Perhitungan preStart dan preEnd
-            c = end_timestamp - start_timestamp
-            preStart_timestamp = start_timestamp - c
-            preEnd_timestamp = end_timestamp - c
-
-            query_prev = f"""
-            SELECT
-                COALESCE(SUM(CASE WHEN so.status IN (500, 702, 703) THEN so.gmv_shipment END), 0) AS gmv_final_status,
-                COUNT(CASE WHEN so.status >= 300 AND so.status < 500 THEN 1 END) AS order_qty,
-                AVG(so.transaction_value) AS aov
-            FROM shipment_orders so
-            WHERE so.created_at >= {start_timestamp} AND so.created_at <= {end_timestamp};
-            """
-
-            cur = connection.cursor()
-            cur.execute(query_prev)
-            result_prev = cur.fetchone()
-
-            # Update DataFrame with query results
-            prev_weeks_df.at[i, 'GMV Final Status'] = float(result_prev[0])  # Convert Decimal to float
-            prev_weeks_df.at[i, 'Orders Qty'] = result_prev[1]
-            prev_weeks_df.at[i, 'AOV'] = result_prev[2]
-
-            # Calculate cumulative GMV up to the current week
-            cumulative_gmv_prev += result_prev[0]
-
-            # Calculate GMV EOM for previous month
-            days_elapsed = (end_date - datetime(previous_year, previous_month, 1)).days + 1
-            gmv_eom_prev = calculate_gmv_eom(cumulative_gmv_prev, days_elapsed, prev_days_in_month)
-            prev_weeks_df.at[i, 'GMV EOM'] = gmv_eom_prev
-
-        # Simpan hasil di session state untuk bulan sebelumnya
-        st.session_state['prev_weeks_df'] = prev_weeks_df
-
-        # Hitung rata-rata untuk bulan sebelumnya
-        avg_gmv_prev = prev_weeks_df['GMV Final Status'].mean()
-        sum_gmv_eom_prev = prev_weeks_df[prev_weeks_df['Minggu ke-'] == 4]['GMV EOM'].max()
-        avg_orders_qty_prev = prev_weeks_df['Orders Qty'].mean()
-
-        # Simpan hasil perhitungan ke session state untuk bulan sebelumnya
-        st.session_state['avg_gmv_prev'] = avg_gmv_prev
-        st.session_state['sum_gmv_eom_prev'] = sum_gmv_eom_prev
-        st.session_state['avg_orders_qty_prev'] = avg_orders_qty_prev
-
-        # Hitung delta untuk setiap metrics
-        delta_gmv = (st.session_state['avg_gmv'] - avg_gmv_prev) / avg_gmv_prev * 100
-        delta_gmv_eom = (st.session_state['sum_gmv_eom'] - sum_gmv_eom_prev) / sum_gmv_eom_prev * 100
-        delta_orders_qty = (st.session_state['avg_orders_qty'] - avg_orders_qty_prev) / avg_orders_qty_prev * 100
-
-        # Plot GMV Final Status chart
-        # Dataframe 1
-        first_columns = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan',
-                         'GMV Final Status', 'GMV EOM', 'Orders Qty', 'R Transacting User', 'N Transacting User']
-        df1 = st.session_state['weeks_df'][first_columns]
-
-        # Dataframe 2
-        second_columns = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan',
-                          'AU (Aktive User)', 'TU (Trx User)', 'AOV', 'COD RTS%']
-        df2 = st.session_state['weeks_df'][second_columns]
-        st.dataframe(df1, use_container_width=True)
-        st.dataframe(df2, use_container_width=True)
-
-        # Button download for Excel
-        if 'weeks_df' in st.session_state:
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-                st.session_state['weeks_df'].to_excel(writer, index=False)
-            processed_data = output.getvalue()
-
-            file_name = f"weekly_report_{year_input}_{month_input:02d}.xlsx"
-
-            st.download_button(label='Download as Excel',
-                               data=processed_data,
-                               file_name=file_name,
-                               mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-
-        # Show metrics
-        # Display metrics with delta
-        st.markdown('<hr>', unsafe_allow_html=True)
-
-        left_column_stat, middle_column_stat, right_column_stat = st.columns(3)
-        with left_column_stat:
-            st.metric(label="Rata-rata GMV Final Status", value=f"{np.round(st.session_state['avg_gmv'], 2):,}",
-                      delta=f"{np.round(delta_gmv, 2)}%")
-        with middle_column_stat:
-            st.metric(label="Total GMV End of Month", value=f"{np.round(st.session_state['sum_gmv_eom'], 2):,}",
-                      delta=f"{np.round(delta_gmv_eom, 2)}%")
-        with right_column_stat:
-            st.metric(label="Rata-rata Orders QTY", value=f"{np.round(st.session_state['avg_orders_qty'], 2):,}",
-                      delta=f"{np.round(delta_orders_qty, 2)}%")
-
-        st.markdown('<hr>', unsafe_allow_html=True)
-
-        st.markdown('<hr>', unsafe_allow_html=True)
-        # ---
-
-        fig_gmv = px.line(df1, x='Tanggal Senin (Awal Minggu)', y='GMV Final Status',
-                          title='GMV Final Status per Minggu', labels={
-                'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
-                'GMV Final Status': 'GMV Final Status'
-            })
-        fig_gmv.update_traces(textposition='top center', mode='lines+markers+text',
-                              text=df1['GMV Final Status'].apply(lambda x: f"{x:,.0f}"))
-        fig_gmv.update_layout(yaxis_tickformat=',', showlegend=False)
-
-        # Save chart to session
-        st.session_state['fig_gmv'] = fig_gmv
-
-        # Plot Orders Qty chart
-        fig_orders = px.line(df1, x='Tanggal Senin (Awal Minggu)', y='Orders Qty',
-                             title='Orders Qty per Minggu', labels={
-                'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
-                'Orders Qty': 'Jumlah Orders'
-            })
-        fig_orders.update_traces(textposition='top center', mode='lines+markers+text',
-                                 text=df1['Orders Qty'].apply(lambda x: f"{x:,.0f}"))
-        fig_orders.update_layout(yaxis_tickformat=',', showlegend=False)
-
-        # Save chart to session
-        st.session_state['fig_orders'] = fig_orders
-
-        # Display charts
-        st.plotly_chart(st.session_state['fig_gmv'])
-        st.plotly_chart(st.session_state['fig_orders'])
-
-        # ---
-
-        # Plot Pie Chart for R Transacting User vs N Transacting User
-        r_transacting_total = st.session_state['weeks_df']['R Transacting User'].sum()
-        n_transacting_total = st.session_state['weeks_df']['N Transacting User'].sum()
-
-        fig_pie_transacting = px.pie(values=[r_transacting_total, n_transacting_total],
-                                     names=['R Transacting User', 'N Transacting User'],
-                                     title='Perbandingan R Transacting User dan N Transacting User',
-                                     labels={'value': 'Jumlah User', 'names': 'Kategori'})
-
-        fig_pie_transacting.update_traces(textinfo='percent+label')
-        fig_pie_transacting.update_layout(legend_title_text='Jenis User')
-
-        # Save pie chart to session
-        st.session_state['fig_pie_transacting'] = fig_pie_transacting
-
-        # Plot Pie Chart for Active User vs Trx User
-        active_user_total = st.session_state['weeks_df']['AU (Aktive User)'].sum()
-        trx_user_total = st.session_state['weeks_df']['TU (Trx User)'].sum()
-
-        fig_pie_active_trx = px.pie(values=[active_user_total, trx_user_total],
-                                    names=['Aktive User', 'Transacting User'],
-                                    title='Perbandingan Aktive User dan Transacting User',
-                                    labels={'value': 'Jumlah User', 'names': 'Kategori'})
-
-        fig_pie_active_trx.update_traces(textinfo='percent+label')
-        fig_pie_active_trx.update_layout(legend_title_text='Jenis User')
-
-        # Save pie chart to session
-        st.session_state['fig_pie_active_trx'] = fig_pie_active_trx
-
-        # Display Pie Charts in 2 columns
-        left_col, right_col = st.columns(2)
-        with left_col:
-            st.plotly_chart(st.session_state['fig_pie_transacting'])
-        with right_col:
-            st.plotly_chart(st.session_state['fig_pie_active_trx'])
-
-        # ---
-        df2_bar = df2.copy()
-
-        # Ubah sumbu X menjadi kategori (string) hanya untuk bar chart
-        df2_bar['Tanggal Senin (Awal Minggu)'] = df2_bar['Tanggal Senin (Awal Minggu)'].astype(str)
-
-        # Plot Bar Chart for AOV per Minggu
-        fig_bar_aov = px.bar(df2_bar, x='Tanggal Senin (Awal Minggu)', y='AOV',
-                             title='Rata-rata Nilai Pesanan (AOV) per Minggu',
-                             labels={'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
-                                     'AOV': 'Rata-rata Nilai Pesanan (AOV)'})
-
-        fig_bar_aov.update_traces(texttemplate='%{y:,.0f}', textposition='outside')
-        fig_bar_aov.update_layout(yaxis_tickformat=',', showlegend=False)
-
-        # Save bar chart to session
-        st.session_state['fig_bar_aov'] = fig_bar_aov
-
-        # Plot Line Chart for COD RTS per Minggu
-        fig_line_cod_rts = px.line(df2, x='Tanggal Senin (Awal Minggu)', y='COD RTS%',
-                                   title='COD RTS per Minggu',
-                                   labels={'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
-                                           'COD RTS%': 'Persentase COD RTS'})
-
-        fig_line_cod_rts.update_traces(textposition='top center', mode='lines+markers+text',
-                                       text=df2['COD RTS%'].apply(lambda x: f"{x:.2%}"))
-        # Update sumbu Y menjadi persentase
-        fig_line_cod_rts.update_layout(yaxis_tickformat='.2%', showlegend=False)
-
-        # Save line chart to session
-        st.session_state['fig_line_cod_rts'] = fig_line_cod_rts
-
-        # Display Bar and Line Charts in 2 columns
-        left_col, right_col = st.columns(2)
-        with left_col:
-            st.plotly_chart(st.session_state['fig_bar_aov'])
-        with right_col:
-            st.plotly_chart(st.session_state['fig_line_cod_rts'])
+import streamlit as st
+from utils.first_order import ensure_index_fresh
+from utils.active_users import ensure_au_index_fresh
+from utils.hll import ensure_sketches_fresh
+from utils.rollup import ensure_rollup_fresh
+from utils.trend import fetch_trend
+from utils.prewarm import load_report, report_key
+from utils.reports import build_monthly_report, format_delta
+from utils.db import make_query_tag
+from utils.weeks import month_weeks
+from utils.db import POOL_MAX_SIZE
+from utils.metrics import MAX_CONCURRENT_QUERIES
+from utils.perf import span
+from utils.export import download_section
+from utils.flight import queue_feedback
+from utils.store import get_store
+from utils.startup import lazy_import
+from datetime import datetime, timedelta
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import threading
+
+# numpy & plotly baru di-load saat report dijalankan/ditampilkan (bukan saat halaman dibuka)
+np = lazy_import('numpy')
+px = lazy_import('plotly.express')
+
+# ===== Connect & Fetch Database =====
+# Koneksi Snowflake diambil dari pool bersama (utils/db.py) dan baru dibuka saat Submit
+
+# ===== Streamlit Input Widgets =====
+st.title("Shipping Performance Monthly Report")
+
+# Input bulan dan tahun
+month_input = st.selectbox("Pilih Bulan", range(1, 13), format_func=lambda x: datetime(1900, x, 1).strftime('%B'))
+year_input = st.number_input("Pilih Tahun", min_value=2000, max_value=2100, value=datetime.now().year)
+
+previous_month = (datetime(year_input, month_input, 1) - timedelta(days=1)).month
+previous_year = (datetime(year_input, month_input, 1) - timedelta(days=1)).year
+
+
+# Mode laporan: 1 bulan + bulan sebelumnya, atau trend 12/24 bulan terakhir (sampai bulan yang dipilih)
+report_mode = st.radio("Mode laporan", ["Bulanan", "Trend 12 bulan", "Trend 24 bulan"], horizontal=True)
+trend_months = {"Trend 12 bulan": 12, "Trend 24 bulan": 24}.get(report_mode)
+
+# Mode query: satu query untuk semua minggu, atau satu query per minggu
+single_scan = st.toggle("Single-scan query (semua minggu dalam 1 query)", value=True)
+if not single_scan:
+    max_concurrency = st.slider("Maks. query paralel", min_value=1, max_value=POOL_MAX_SIZE, value=min(MAX_CONCURRENT_QUERIES, POOL_MAX_SIZE))
+
+# Mode distinct user (AU & TU): exact dari SQL, atau approximate dari HLL sketch harian (error ~0.8%, lihat utils/hll.py)
+distinct_mode = st.radio("Hitung distinct user", ["Exact", "Approximate (HLL)"], horizontal=True)
+
+
+# Validasi input
+def validate_inputs(month_input, year_input):
+    errors = []
+    if month_input < 1 or month_input > 12:
+        errors.append("Bulan harus antara 1 dan 12.")
+    if year_input < 2000 or year_input > 2100:
+        errors.append("Tahun harus antara 2000 dan 2100.")
+    return errors
+
+
+# Function to build a partial week table from the results that already arrived (rendering progresif)
+def partial_frame(weeks_df, period, period_results):
+    frame = weeks_df[['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-']].copy()
+    for column, position in (('GMV Final Status', 0), ('Orders Qty', 1), ('AOV', 6)):
+        values = []
+        for i in frame.index:
+            result = period_results.get((period, i))
+            values.append(np.nan if result is None else result[position])
+        frame[column] = values
+    return frame
+
+
+# Tombol Submit
+submitted = st.button('Submit')
+report = None
+
+if submitted and not trend_months:
+    errors = validate_inputs(month_input, year_input)
+
+    if errors:
+        for error in errors:
+            st.error(error)
+    else:
+        approximate = distinct_mode == "Approximate (HLL)"
+
+        # Report yang sudah dihitung session lain dipakai ulang dari report store bersama (session hanya simpan key),
+        # view default (exact) yang sudah di-pre-warm setelah update 00:00 dibaca dari disk sekali per proses
+        monthly_key = report_key('gmv_monthly', year_input, month_input, *(['hll'] if approximate else []))
+        store = get_store()
+        report = store.get(monthly_key)
+        cache_caption = "Report store: hasil dipakai bersama semua session"
+        if report is None and not approximate:
+            report = load_report(monthly_key)
+            if report is not None:
+                store.put(monthly_key, report)
+                cache_caption = f"Pre-warmed report, dibuat {report['built_at']:%H:%M}"
+        cache_stats = {'hits': 0, 'misses': 0}
+
+        if report is None:
+            # Metric additive dari daily rollup, R/N Transacting User dari first-order index, AU dari index AU
+            ensure_index_fresh()
+            ensure_rollup_fresh()
+            ensure_au_index_fresh()
+            if approximate:
+                ensure_sketches_fresh()
+            query_tag = make_query_tag('gmv_monthly', 'monthly')
+
+            # Report dibangun build_monthly_report (sama dengan pre-warm & batch): semua minggu bulan ini & bulan lalu
+            # plus total 1 bulan, bulan berjalan incremental dari state month-to-date, AU & TU dari HLL sketch
+            # di mode approximate. Single-scan: semua bucket dalam satu query
+            if single_scan:
+                # Posisi antrean warehouse / query yang sama dari session lain ditampilkan selama menunggu
+                queue_status = st.empty()
+                with st.spinner("Mengambil data semua minggu..."), queue_feedback(queue_status.info):
+                    report = build_monthly_report(year_input, month_input, stats=cache_stats, query_tag=query_tag,
+                                                  approximate=approximate)
+                queue_status.empty()
+            # Per minggu: query dikirim paralel (maks. max_concurrency), tabel & chart terisi begitu hasil tiap minggu masuk
+            else:
+                script_ctx = get_script_run_ctx()
+                progress_bar = st.progress(0.0, text="Mengambil data per minggu...")
+                current_table = st.empty()
+                current_chart = st.empty()
+                previous_table = st.empty()
+                # Kalender minggu (epoch int64, di-memoize per bulan) untuk tabel sementara
+                weeks_df = month_weeks(year_input, month_input).to_frame()
+                prev_weeks_df = month_weeks(previous_year, previous_month).to_frame()
+
+                def show_partial(key, period_results, total):
+                    progress_bar.progress(len(period_results) / total,
+                                          text=f"{len(period_results)}/{total} periode selesai")
+                    if key[0] == 'current':
+                        partial_df = partial_frame(weeks_df, 'current', period_results)
+                        current_table.dataframe(partial_df, use_container_width=True)
+                        current_chart.plotly_chart(px.line(partial_df, x='Tanggal Senin (Awal Minggu)', y='GMV Final Status',
+                                                           title='GMV Final Status per Minggu', markers=True),
+                                                   key=f"partial_gmv_{len(period_results)}")
+                    elif key[0] == 'previous':
+                        previous_table.dataframe(partial_frame(prev_weeks_df, 'previous', period_results), use_container_width=True)
+
+                report = build_monthly_report(
+                    year_input, month_input, stats=cache_stats, query_tag=query_tag, approximate=approximate,
+                    max_workers=max_concurrency, on_result=show_partial,
+                    initializer=lambda: add_script_run_ctx(threading.current_thread(), script_ctx))
+
+                # Hasil lengkap ditampilkan di bawah, tampilan sementara dibersihkan
+                for placeholder in (progress_bar, current_table, current_chart, previous_table):
+                    placeholder.empty()
+
+            report = store.put(monthly_key, report)
+            cache_caption = f"Result cache: {cache_stats['hits']} hit, {cache_stats['misses']} miss"
+            if cache_stats.get('mtd_weeks') is not None:
+                cache_caption += f", {cache_stats['mtd_weeks']} minggu dari state month-to-date"
+
+        # Session hanya menyimpan key report (tabel & figure tetap satu salinan di report store),
+        # supaya report tetap tampil saat rerun (mis. tombol download)
+        st.session_state['gmv_monthly_report'] = {'key': monthly_key, 'year': year_input, 'month': month_input,
+                                                  'caption': cache_caption}
+
+# ===== Display Monthly Report =====
+submitted_report = st.session_state.get('gmv_monthly_report') if not trend_months else None
+if report is None and submitted_report is not None:
+    report = get_store().get(submitted_report['key'])
+    if report is None:
+        st.info("Report sudah tidak ada di cache (data sudah di-refresh), klik Submit lagi.")
+
+if report is not None and not trend_months:
+    weeks_df = report['tables']['weeks_df']
+    metrics = report['metrics']
+    delta_gmv = report['metrics']['delta_gmv']
+    delta_gmv_eom = report['metrics']['delta_gmv_eom']
+    delta_orders_qty = report['metrics']['delta_orders_qty']
+
+    # Dataframe 1
+    first_columns = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan',
+                     'GMV Final Status', 'GMV EOM', 'Orders Qty', 'R Transacting User', 'N Transacting User']
+    df1 = weeks_df[first_columns]
+
+    # Dataframe 2
+    second_columns = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan',
+                      'AU (Aktive User)', 'TU (Trx User)', 'AOV', 'COD RTS%']
+    df2 = weeks_df[second_columns]
+    st.dataframe(df1, use_container_width=True)
+    st.dataframe(df2, use_container_width=True)
+    st.caption(submitted_report['caption'])
+
+    # Download dibuat hanya saat diminta: Excel multi-sheet (bulan ini, bulan lalu, ringkasan, raw mingguan),
+    # Parquet atau CSV, lihat utils/export.py
+    download_section(submitted_report['key'], report,
+                     f"weekly_report_{submitted_report['year']}_{submitted_report['month']:02d}")
+
+    # Show metrics
+    # Display metrics with delta
+    st.markdown('<hr>', unsafe_allow_html=True)
+
+    left_column_stat, middle_column_stat, right_column_stat = st.columns(3)
+    with left_column_stat:
+        st.metric(label="Rata-rata GMV Final Status", value=f"{np.round(metrics['avg_gmv'], 2):,}",
+                  delta=format_delta(delta_gmv, "%"))
+    with middle_column_stat:
+        st.metric(label="Total GMV End of Month", value=f"{np.round(metrics['sum_gmv_eom'], 2):,}",
+                  delta=format_delta(delta_gmv_eom, "%"))
+    with right_column_stat:
+        st.metric(label="Rata-rata Orders QTY", value=f"{np.round(metrics['avg_orders_qty'], 2):,}",
+                  delta=format_delta(delta_orders_qty, "%"))
+
+    # Bulan berjalan: proyeksi EOM dari GMV hari yang sudah lewat (bukan dari minggu yang belum selesai)
+    if metrics.get('mtd_days'):
+        st.metric(label=f"Proyeksi GMV End of Month (dari GMV {metrics['mtd_days']} hari yang sudah lewat)",
+                  value=f"{np.round(metrics['gmv_eom_mtd'], 2):,}")
+
+    st.markdown('<hr>', unsafe_allow_html=True)
+
+    st.markdown('<hr>', unsafe_allow_html=True)
+    # ---
+
+    figures = report['figures']
+
+    # Display charts
+    st.plotly_chart(figures['fig_gmv'])
+    st.plotly_chart(figures['fig_orders'])
+
+    # ---
+
+    # Display Pie Charts in 2 columns
+    left_col, right_col = st.columns(2)
+    with left_col:
+        st.plotly_chart(figures['fig_pie_transacting'])
+    with right_col:
+        st.plotly_chart(figures['fig_pie_active_trx'])
+
+    # ---
+
+    # Display Bar and Line Charts in 2 columns
+    left_col, right_col = st.columns(2)
+    with left_col:
+        st.plotly_chart(figures['fig_bar_aov'])
+    with right_col:
+        st.plotly_chart(figures['fig_line_cod_rts'])
+
+
+# ===== Trend Mode =====
+# Semua bulan & minggu di span (plus 12 bulan pembanding YoY) dihitung dalam dua query batch, lihat utils/trend.py
+if submitted and trend_months:
+    errors = validate_inputs(month_input, year_input)
+
+    if errors:
+        for error in errors:
+            st.error(error)
+    else:
+        ensure_index_fresh()
+        ensure_rollup_fresh()
+        ensure_au_index_fresh()
+        cache_stats = {'hits': 0, 'misses': 0}
+
+        queue_status = st.empty()
+        with st.spinner(f"Menghitung trend {trend_months} bulan..."), queue_feedback(queue_status.info):
+            monthly_df, trend_weekly_df = fetch_trend(year_input, month_input, trend_months, stats=cache_stats,
+                                                         query_tag=make_query_tag('gmv_monthly', f'trend_{trend_months}'))
+        queue_status.empty()
+
+        # Metric bulan terakhir dengan delta YoY
+        latest = monthly_df.iloc[-1]
+        left_column_stat, middle_column_stat, right_column_stat = st.columns(3)
+        with left_column_stat:
+            st.metric(label=f"GMV Final Status {latest['Bulan']}", value=f"{np.round(latest['GMV Final Status'], 2):,}",
+                      delta=format_delta(latest['GMV Final Status YoY %'], "% YoY"))
+        with middle_column_stat:
+            st.metric(label=f"Orders QTY {latest['Bulan']}", value=f"{latest['Orders Qty']:,}",
+                      delta=format_delta(latest['Orders Qty YoY %'], "% YoY"))
+        with right_column_stat:
+            st.metric(label=f"AOV {latest['Bulan']}", value=f"{np.round(latest['AOV'], 2):,}",
+                      delta=format_delta(latest['AOV YoY %'], "% YoY"))
+
+        st.markdown('<hr>', unsafe_allow_html=True)
+
+        with span('chart', chart='fig_trend_gmv'):
+            fig_trend_gmv = px.line(monthly_df, x='Bulan', y=['GMV Final Status', 'GMV Final Status (Tahun Lalu)'],
+                                    title=f'GMV Final Status per Bulan ({trend_months} bulan) vs Tahun Lalu', markers=True,
+                                    labels={'value': 'GMV Final Status', 'variable': ''})
+            fig_trend_gmv.update_layout(yaxis_tickformat=',')
+        st.plotly_chart(fig_trend_gmv)
+
+        with span('chart', chart='fig_trend_yoy'):
+            fig_trend_yoy = px.bar(monthly_df, x='Bulan', y='GMV Final Status YoY %', title='Pertumbuhan GMV YoY (%)')
+            fig_trend_yoy.update_traces(texttemplate='%{y:.1f}%', textposition='outside')
+        st.plotly_chart(fig_trend_yoy)
+
+        with span('chart', chart='fig_trend_weekly'):
+            fig_trend_weekly = px.line(trend_weekly_df, x='Tanggal Senin (Awal Minggu)', y='GMV Final Status',
+                                       title='GMV Final Status per Minggu', labels={
+                    'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal'})
+            fig_trend_weekly.update_layout(yaxis_tickformat=',', showlegend=False)
+        st.plotly_chart(fig_trend_weekly)
+
+        left_col, right_col = st.columns(2)
+        with left_col:
+            with span('chart', chart='fig_trend_orders'):
+                fig_trend_orders = px.bar(monthly_df, x='Bulan', y='Orders Qty', title='Orders Qty per Bulan')
+                fig_trend_orders.update_layout(yaxis_tickformat=',')
+            st.plotly_chart(fig_trend_orders)
+        with right_col:
+            with span('chart', chart='fig_trend_users'):
+                fig_trend_users = px.line(monthly_df, x='Bulan', y=['AU (Aktive User)', 'Trx User'],
+                                          title='Aktive User & Transacting User per Bulan', markers=True,
+                                          labels={'value': 'Jumlah User', 'variable': ''})
+            st.plotly_chart(fig_trend_users)
+
+        st.dataframe(monthly_df, use_container_width=True)
+        st.caption(f"Result cache: {cache_stats['hits']} hit, {cache_stats['misses']} miss")
@@ -1,12 +1,70 @@
-# ----- Import Library -----
-import pandas as pd
-import numpy as np
-import streamlit as st
-from PIL import Image
-import snowflake.connector
-
-# ----- Set Title -----
-st.error('Coming Soon : Feature is Still On-Progress')
-
-
-
+# ----- Import Library -----
+import math
+from datetime import datetime
+
+import streamlit as st
+
+from utils.db import make_query_tag
+from utils.flight import queue_feedback
+from utils.perf import span
+from utils.rollup import day_range
+from utils.startup import lazy_import
+from utils.top_revenue import TOP_REVENUE_MAX_RANK, get_ranking, ranking_page
+
+pd = lazy_import('pandas')
+px = lazy_import('plotly.express')
+
+# ===== Streamlit Input Widgets =====
+st.title("Top Revenue User")
+
+# Default periode: bulan berjalan sampai hari ini
+today = datetime.now().date()
+start_date = st.date_input("Pilih Tanggal Mulai", value=today.replace(day=1))
+end_date = st.date_input("Pilih Tanggal Akhir", value=today)
+page_size = st.selectbox("Baris per halaman", [25, 50, 100], index=1)
+
+if start_date > end_date:
+    st.error("Tanggal mulai tidak boleh lebih besar dari tanggal akhir.")
+    st.stop()
+
+# Tombol Submit, periode yang di-submit disimpan supaya ganti halaman tidak perlu Submit ulang
+if st.button('Submit'):
+    st.session_state['top_revenue_period'] = (start_date, end_date)
+    st.session_state['top_revenue_page'] = 1
+
+if 'top_revenue_period' in st.session_state:
+    period_start, period_end = st.session_state['top_revenue_period']
+    start_timestamp, end_timestamp = day_range(period_start, period_end)
+
+    # Ranking top-K dihitung sekali per periode (streaming Arrow batch), paging membaca ranking yang sama
+    queue_status = st.empty()
+    with st.spinner("Menghitung ranking..."), queue_feedback(queue_status.info):
+        ranking = get_ranking(start_timestamp, end_timestamp, query_tag=make_query_tag('top_revenue', 'ranking'))
+    queue_status.empty()
+
+    ranked = len(ranking['gmv'])
+    col1, col2, col3 = st.columns(3)
+    col1.metric("User dengan GMV", f"{ranking['total_users']:,}")
+    col2.metric("Total GMV Final Status", f"{ranking['total_gmv']:,.0f}")
+    top_share = ranking['gmv'].sum() / ranking['total_gmv'] * 100 if ranking['total_gmv'] else 0
+    col3.metric(f"Share Top {ranked:,}", f"{top_share:.1f}%")
+
+    if ranked == 0:
+        st.info("Tidak ada order dengan status final pada periode ini.")
+    else:
+        n_pages = math.ceil(ranked / page_size)
+        st.session_state['top_revenue_page'] = min(st.session_state.get('top_revenue_page', 1), n_pages)
+        page = st.number_input(f"Halaman (1 - {n_pages})", min_value=1, max_value=n_pages,
+                               key='top_revenue_page', step=1)
+
+        with span('dataframe', table='top_revenue'):
+            page_df = pd.DataFrame(ranking_page(ranking, page - 1, page_size))
+        st.dataframe(page_df, use_container_width=True, hide_index=True)
+        st.caption(f"Periode {period_start:%d %b %Y} - {period_end:%d %b %Y}, "
+                   f"ranking dibatasi {TOP_REVENUE_MAX_RANK:,} user teratas")
+
+        with span('chart', chart='fig_top_revenue'):
+            fig = px.bar(page_df, x='User', y='GMV Final Status', text_auto='.3s',
+                         title=f"GMV Final Status, Rank {page_df['Rank'].iloc[0]} - {page_df['Rank'].iloc[-1]}")
+            fig.update_xaxes(type='category')
+        st.plotly_chart(fig, use_container_width=True)
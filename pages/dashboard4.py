@@ -0,0 +1,64 @@
+# ----- Import Library -----
+from datetime import datetime
+
+import streamlit as st
+
+from utils.cohort import COHORT_MAX_MONTHS, get_cohort_report
+from utils.db import make_query_tag
+from utils.export import download_section
+from utils.first_order import ensure_index_fresh
+from utils.flight import queue_feedback
+from utils.store import get_store
+
+# ===== Streamlit Input Widgets =====
+st.title("Cohort Retention Transacting User")
+
+# Grid berakhir di bulan yang dipilih (default bulan berjalan), cohort = bulan order pertama user
+today = datetime.now().date()
+month_input = st.selectbox("Bulan terakhir", range(1, 13), index=today.month - 1,
+                           format_func=lambda x: datetime(1900, x, 1).strftime('%B'))
+year_input = st.number_input("Tahun", min_value=2000, max_value=2100, value=today.year)
+n_months = st.selectbox("Jumlah cohort (bulan)", [6, 12, COHORT_MAX_MONTHS], index=2)
+
+if (year_input, month_input) > (today.year, today.month):
+    st.error("Bulan terakhir tidak boleh melebihi bulan berjalan.")
+    st.stop()
+
+# Tombol Submit, session hanya menyimpan key report (grid tetap satu salinan di report store)
+if st.button('Submit'):
+    ensure_index_fresh()
+    queue_status = st.empty()
+    with st.spinner(f"Membangun cohort {n_months} bulan..."), queue_feedback(queue_status.info):
+        cohort_key, _ = get_cohort_report(year_input, month_input, n_months,
+                                          query_tag=make_query_tag('cohort', f'cohort_{n_months}'))
+    queue_status.empty()
+    st.session_state['cohort_report'] = {'key': cohort_key, 'year': year_input, 'month': month_input,
+                                         'n_months': n_months}
+
+# ===== Display Cohort Report =====
+submitted_report = st.session_state.get('cohort_report')
+report = get_store().get(submitted_report['key']) if submitted_report is not None else None
+if submitted_report is not None and report is None:
+    st.info("Report sudah tidak ada di cache (data sudah di-refresh), klik Submit lagi.")
+
+if report is not None:
+    metrics = report['metrics']
+    col1, col2, col3 = st.columns(3)
+    col1.metric("User Baru (semua cohort)", f"{metrics['new_users']:,}")
+    col2.metric("GMV Final Status Cohort", f"{metrics['total_gmv']:,.0f}")
+    col3.metric("Retensi Bulan ke-1", f"{metrics['month1_retention']:.1f}%")
+
+    tab_retention, tab_users, tab_gmv = st.tabs(["Retensi %", "User Aktif", "GMV"])
+    with tab_retention:
+        st.plotly_chart(report['figures']['fig_cohort_retention'], use_container_width=True)
+        st.dataframe(report['tables']['cohort_retention'], use_container_width=True, hide_index=True)
+    with tab_users:
+        st.dataframe(report['tables']['cohort_users'], use_container_width=True, hide_index=True)
+    with tab_gmv:
+        st.plotly_chart(report['figures']['fig_cohort_gmv'], use_container_width=True)
+        st.dataframe(report['tables']['cohort_gmv'], use_container_width=True, hide_index=True)
+    st.caption(f"{submitted_report['n_months']} cohort sampai {submitted_report['year']}-{submitted_report['month']:02d}, "
+               "transacting user = user dengan order (status apa pun), GMV = GMV Final Status")
+
+    download_section(submitted_report['key'], report,
+                     f"cohort_retention_{submitted_report['year']}_{submitted_report['month']:02d}")
@@ -0,0 +1,15 @@
+# ----- Import Library -----
+import pytest
+
+from utils.active_users import verify_against_sql
+
+
+# AU dari index harian harus sama dengan COUNT(DISTINCT user_id) user_logs dan dengan query KPI lama di sqlite stand-in
+@pytest.mark.parametrize('seed', [3, 17])
+def test_indexed_active_users_match_sql(seed):
+    assert verify_against_sql(seed=seed) == []
+
+
+# Window pendek (termasuk batas detik di tengah hari) di data 40 hari, sebagian di luar backfill index
+def test_indexed_active_users_match_sql_short_history():
+    assert verify_against_sql(n_windows=60, days=40, seed=8) == []
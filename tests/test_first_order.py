@@ -0,0 +1,15 @@
+# ----- Import Library -----
+import pytest
+
+from utils.first_order import verify_against_exists
+
+
+# R/N dari index (user_first_orders + user_order_days) harus sama dengan query EXISTS lama di sqlite stand-in
+@pytest.mark.parametrize('seed', [7, 21, 1234])
+def test_index_rn_matches_exists_query(seed):
+    assert verify_against_exists(seed=seed) == []
+
+
+# Banyak user dengan sedikit order: window pendek sering tanpa order sebelumnya (semua user New)
+def test_index_rn_matches_exists_query_sparse_users():
+    assert verify_against_exists(n_users=5000, n_orders=3000, n_windows=80, seed=3) == []
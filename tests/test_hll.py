@@ -0,0 +1,80 @@
+# ----- Import Library -----
+import sqlite3
+from datetime import date, datetime, time as dt_time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.db as db_module
+import utils.hll as hll_module
+from utils.db import ConnectionPool
+from utils.hll import HLL_STANDARD_ERROR, HyperLogLog, approx_distinct, build_sketches, hash_ids, verify_error
+from utils.localdb import SCHEMA_STATEMENTS, local_connect_factory
+
+
+# Error estimasi harus di dalam batas yang didokumentasikan (3 standard error) untuk window acak
+def test_error_within_documented_bound():
+    errors = verify_error()
+    assert errors.max() <= 3 * HLL_STANDARD_ERROR
+
+
+def test_sketch_survives_binary_roundtrip():
+    sketch = HyperLogLog().add(np.arange(50_000))
+    assert np.array_equal(HyperLogLog.from_bytes(sketch.to_bytes()).registers, sketch.registers)
+
+
+# Batch dengan NULL jadi float64/object di pandas, hash user yang sama tidak boleh berubah karena tipe batch
+def test_null_in_batch_does_not_change_hashes():
+    ids = np.array([3, 17, 123, 2**40 + 5], dtype=np.int64)
+    with_null = pd.Series([3, None, 17, 123, 2**40 + 5]).to_numpy()
+    assert with_null.dtype.kind == 'f'
+    assert np.array_equal(hash_ids(with_null), hash_ids(ids))
+    assert np.array_equal(hash_ids(np.array([3, None, 17, 123, 2**40 + 5], dtype=object)), hash_ids(ids))
+
+
+def test_union_of_int_and_null_batches_does_not_overcount():
+    users = np.arange(1, 20_001)
+    day_one = HyperLogLog().add(users)
+    day_two = HyperLogLog().add(pd.Series(list(users) + [None]).to_numpy())
+    estimate = HyperLogLog.union([day_one, day_two]).estimate()
+    assert abs(estimate - len(users)) / len(users) <= 3 * HLL_STANDARD_ERROR
+
+
+# Sketch harian dari sqlite stand-in (termasuk order dengan created_by NULL) vs COUNT(DISTINCT)
+@pytest.fixture
+def local_orders(tmp_path, monkeypatch):
+    rng = np.random.default_rng(5)
+    first_day = date.today() - timedelta(days=10)
+    start = int(datetime.combine(first_day, dt_time.min).timestamp())
+    created_at = start + rng.integers(0, 7 * 86400, 20_000)
+    created_by = [None if rng.random() < 0.05 else int(user) for user in rng.integers(1, 8_000, 20_000)]
+
+    path = tmp_path / "orders.sqlite"
+    conn = sqlite3.connect(path)
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(statement)
+    conn.executemany("INSERT INTO shipment_orders VALUES (?, ?, 500, 0, 0)",
+                     [(user, int(timestamp)) for user, timestamp in zip(created_by, created_at)])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.setattr(db_module, '_pool', ConnectionPool(local_connect_factory(path)))
+    monkeypatch.setattr(hll_module, 'SKETCH_DIR', tmp_path / "hll")
+    yield path, first_day
+    db_module.get_pool().close_all()
+
+
+def test_daily_sketches_match_exact_distinct(local_orders):
+    path, first_day = local_orders
+    build_sketches('trx_user', first_day, first_day + timedelta(days=6))
+
+    conn = sqlite3.connect(path)
+    for first, last in ((0, 0), (0, 6), (2, 4)):
+        start_timestamp = int(datetime.combine(first_day + timedelta(days=first), dt_time.min).timestamp())
+        end_timestamp = int(datetime.combine(first_day + timedelta(days=last), dt_time.max).timestamp())
+        exact = conn.execute("SELECT COUNT(DISTINCT created_by) FROM shipment_orders "
+                             "WHERE created_at >= ? AND created_at <= ?", (start_timestamp, end_timestamp)).fetchone()[0]
+        estimate = approx_distinct('trx_user', start_timestamp, end_timestamp)
+        assert abs(estimate - exact) / exact <= 3 * HLL_STANDARD_ERROR
+    conn.close()
@@ -0,0 +1,10 @@
+# ----- Import Library -----
+import pytest
+
+from utils.mtd import verify_against_full
+
+
+# Report bulan berjalan dari state month-to-date (cold, daily, restated) harus sama dengan hitung ulang penuh
+@pytest.mark.parametrize('seed', [5, 29])
+def test_incremental_month_matches_full_recompute(seed):
+    assert verify_against_full(seed=seed) == []
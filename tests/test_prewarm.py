@@ -0,0 +1,27 @@
+# ----- Import Library -----
+import json
+import os
+
+import utils.prewarm as prewarm_module
+from utils.prewarm import prune_reports
+
+
+# Report, sidecar & lock refresh sebelumnya dihapus; report hari ini dan file yang sedang ditulis tetap ada
+def test_prune_removes_reports_and_locks_of_earlier_refreshes(tmp_path, monkeypatch):
+    monkeypatch.setattr(prewarm_module, 'REPORT_DIR', tmp_path)
+    boundary = 1_800_000_000
+    yesterday = boundary - 86400
+    for key, refresh_boundary in (('gmv_weekly_old', yesterday), ('gmv_weekly_new', boundary)):
+        (tmp_path / f"{key}.pkl").write_bytes(b"report")
+        (tmp_path / f"{key}.json").write_text(json.dumps({'built_at': '', 'refresh_boundary': refresh_boundary}))
+    for name in ("gmv_monthly_orphan.pkl", "gmv_monthly_old.0a1b.tmp", "gmv_monthly_new.2c3d.tmp"):
+        (tmp_path / name).write_bytes(b"report")
+    for name, mtime in (("gmv_monthly_orphan.pkl", yesterday), ("gmv_monthly_old.0a1b.tmp", yesterday),
+                        ("gmv_monthly_new.2c3d.tmp", boundary + 60)):
+        os.utime(tmp_path / name, (mtime, mtime))
+    (tmp_path / f"prewarm_{yesterday}.lock").touch()
+    (tmp_path / f"prewarm_{boundary}.lock").touch()
+
+    assert prune_reports(boundary) == 4
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        'gmv_monthly_new.2c3d.tmp', 'gmv_weekly_new.json', 'gmv_weekly_new.pkl', f'prewarm_{boundary}.lock']
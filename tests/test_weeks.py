@@ -0,0 +1,15 @@
+# ----- Import Library -----
+from utils.weeks import month_weeks, verify_against_legacy
+
+
+# Kalender minggu vektorisasi harus identik dengan generator minggu lama untuk setiap bulan 2000-2100
+def test_calendar_matches_legacy_generator():
+    assert verify_against_legacy(2000, 2100) == []
+
+
+# Minggu satu bulan menutup semua hari bulan itu tanpa celah atau tumpang tindih
+def test_month_weeks_cover_month_without_gaps():
+    for year, month in ((2024, 2), (2026, 3), (2026, 10), (2100, 12)):
+        bounds = month_weeks(year, month).bounds()
+        assert all(start <= end for start, end in bounds)
+        assert all(next_start == end + 1 for (_, end), (next_start, _) in zip(bounds, bounds[1:]))
@@ -0,0 +1,349 @@
+# ----- Import Library -----
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+
+from utils.db import fetchall, get_pool, make_query_tag, set_query_tag, traced_execute
+from utils.flight import get_gate
+from utils.hll import window_days
+from utils.rollup import day_range, utc_offset_seconds
+from utils.startup import lazy_import
+
+np = lazy_import('numpy')
+
+# ===== Active User Index Settings =====
+# Index exact user_id distinct per hari dari user_logs (hari lokal, sama seperti daily rollup & HLL sketch).
+# Satu file per hari: header + user_id terurut yang disimpan sebagai selisih (delta) dengan dtype unsigned terkecil
+# yang muat, dibaca lewat np.memmap. AU window mana pun = union array harian di NumPy, tanpa scan user_logs.
+# Hari yang sudah lewat tidak berubah lagi, jadi refresh tiap malam hanya membangun hari yang belum ada.
+AU_INDEX_ENABLED = os.environ.get("ORDERFAZ_AU_INDEX", "1") != "0"  # 0 = AU selalu dari scan user_logs
+AU_INDEX_DIR = Path(os.environ.get("ORDERFAZ_AU_INDEX_DIR", Path(__file__).resolve().parent.parent / ".cache" / "au_index"))
+AU_INDEX_DAYS = int(os.environ.get("ORDERFAZ_AU_INDEX_DAYS", 400))  # Backfill: trend 24 bulan ambil sisanya dari SQL
+AU_INDEX_CHUNK_DAYS = 31  # Hari per query saat membangun index
+# Bagian window yang tidak tercakup index (hari ini / potongan hari di tepi window) diambil langsung dari user_logs
+# selama totalnya (sampai akhir hari ini, hari setelahnya belum punya data) maksimal sekian detik;
+# lebih dari itu AU window tersebut tetap dihitung query KPI biasa.
+AU_INDEX_MAX_RAW_SECONDS = 2 * 86400
+
+AU_INDEX_QUERY_TAG = make_query_tag('maintenance', 'active_user_index')
+
+AU_INDEX_SOURCE_QUERY = """
+    SELECT DISTINCT created_at - MOD(created_at + ?, 86400) AS day_start, user_id
+    FROM user_logs
+    WHERE created_at >= ? AND created_at <= ? AND user_id IS NOT NULL
+"""
+
+RAW_USERS_QUERY = """
+    SELECT DISTINCT user_id
+    FROM user_logs
+    WHERE created_at >= ? AND created_at <= ? AND user_id IS NOT NULL
+"""
+
+# Header file harian: magic, itemsize delta, user_id pertama, jumlah user
+_HEADER = struct.Struct('<4sB3xqq')
+_MAGIC = b'AUX1'
+_DELTA_DTYPES = ('uint8', 'uint16', 'uint32', 'uint64')
+
+
+# Function to encode sorted unique user ids as (base, deltas) with the smallest unsigned dtype that fits
+def encode_ids(ids):
+    ids = np.asarray(ids, dtype=np.int64)
+    if ids.size == 0:
+        return 0, np.array([], dtype=np.uint8)
+    deltas = np.diff(ids)
+    largest = int(deltas.max()) if deltas.size else 0
+    dtype = next(dtype for dtype in _DELTA_DTYPES if largest <= np.iinfo(dtype).max)
+    return int(ids[0]), deltas.astype(dtype)
+
+
+# Function to decode (base, deltas) back to the sorted int64 user ids
+def decode_ids(base, deltas):
+    ids = np.empty(len(deltas) + 1, dtype=np.int64)
+    ids[0] = base
+    np.cumsum(deltas, dtype=np.int64, out=ids[1:])
+    ids[1:] += base
+    return ids
+
+
+# Function to count the distinct ids of several int64 arrays (bitmap kalau rentang id rapat, selain itu sort)
+def count_union(arrays):
+    arrays = [array for array in arrays if len(array)]
+    if not arrays:
+        return 0
+    if len(arrays) == 1:
+        return len(arrays[0])  # Array harian sudah unik
+    low = min(int(array[0]) for array in arrays)
+    high = max(int(array[-1]) for array in arrays)
+    total = sum(len(array) for array in arrays)
+    if high - low < 8 * total:
+        seen = np.zeros(high - low + 1, dtype=bool)
+        for array in arrays:
+            seen[array - low] = True
+        return int(np.count_nonzero(seen))
+    return len(np.unique(np.concatenate(arrays)))
+
+
+class ActiveUserIndex:
+    """Per-day sorted, delta-encoded active user ids, memory-mapped from ``directory``.
+
+    A day file is written once after the day is over and never changes;
+    files are replaced atomically so readers never see a partial day.
+    """
+
+    def __init__(self, directory=AU_INDEX_DIR):
+        self.directory = Path(directory)
+
+    def _path(self, day):
+        return self.directory / f"{day.isoformat()}.au"
+
+    def has_day(self, day):
+        return self._path(day).exists()
+
+    def write_day(self, day, ids):
+        base, deltas = encode_ids(ids)
+        path = self._path(day)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'wb') as file:
+            file.write(_HEADER.pack(_MAGIC, deltas.itemsize, base, len(ids)))
+            file.write(deltas.tobytes())
+        os.replace(tmp_path, path)
+
+    # Function to read the user ids of one day, None kalau hari itu belum di-index
+    def read_day(self, day):
+        path = self._path(day)
+        try:
+            with open(path, 'rb') as file:
+                magic, itemsize, base, count = _HEADER.unpack(file.read(_HEADER.size))
+                if magic != _MAGIC:
+                    raise ValueError(f"Not an active user index file: {path}")
+                if count <= 1:
+                    return np.array([base] if count else [], dtype=np.int64)
+                # Delta dibaca langsung dari page cache lewat mmap, hanya hasil decode yang dialokasikan
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    dtype = next(dtype for dtype in _DELTA_DTYPES if np.dtype(dtype).itemsize == itemsize)
+                    deltas = np.frombuffer(mapped, dtype=dtype, count=count - 1, offset=_HEADER.size)
+                    ids = decode_ids(base, deltas)
+                    del deltas  # Lepas buffer sebelum mmap ditutup
+                    return ids
+        except FileNotFoundError:
+            return None
+
+    # Function to build the day files between start_date and end_date (inklusif) from user_logs
+    def build_days(self, start_date, end_date):
+        start_timestamp, end_timestamp = day_range(start_date, end_date)
+        params = (utc_offset_seconds(), start_timestamp, end_timestamp)
+
+        day_starts, user_ids = [], []
+        with get_gate().slot(), get_pool().connection() as connection:
+            cur = connection.cursor()
+            try:
+                set_query_tag(connection, cur, AU_INDEX_QUERY_TAG)
+                traced_execute(cur, AU_INDEX_SOURCE_QUERY, params, query_tag=AU_INDEX_QUERY_TAG, statement='user_days')
+                for batch in cur.fetch_arrow_batches():
+                    day_starts.append(batch.column(0).to_numpy(zero_copy_only=False).astype(np.int64))
+                    user_ids.append(batch.column(1).to_numpy(zero_copy_only=False).astype(np.int64))
+            finally:
+                cur.close()
+
+        day_starts = np.concatenate(day_starts) if day_starts else np.array([], dtype=np.int64)
+        user_ids = np.concatenate(user_ids) if user_ids else np.array([], dtype=np.int64)
+        order = np.lexsort((user_ids, day_starts))
+        day_starts, user_ids = day_starts[order], user_ids[order]
+
+        # Hari tanpa log tetap ditulis (file kosong) supaya tidak di-query ulang setiap malam
+        days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+        bounds = np.searchsorted(day_starts, [day_range(day, day)[0] for day in days] + [end_timestamp + 1])
+        for i, day in enumerate(days):
+            self.write_day(day, user_ids[bounds[i]:bounds[i + 1]])
+        return len(days)
+
+    # Function to build every missing day up to yesterday (hari yang sudah lewat tidak berubah lagi)
+    def refresh(self, backfill_days=AU_INDEX_DAYS, today=None):
+        today = today or date.today()
+        missing = sorted(day for day in (today - timedelta(days=i) for i in range(1, backfill_days + 1))
+                         if not self.has_day(day))
+        built = 0
+        # Hari yang hilang dikelompokkan jadi rentang berurutan, maksimal AU_INDEX_CHUNK_DAYS hari per query
+        while missing:
+            chunk = [missing[0]]
+            for day in missing[1:AU_INDEX_CHUNK_DAYS]:
+                if day != chunk[-1] + timedelta(days=1):
+                    break
+                chunk.append(day)
+            built += self.build_days(chunk[0], chunk[-1])
+            missing = missing[len(chunk):]
+        return built
+
+    # Function to split a window into indexed days and uncovered (start, end) ranges
+    def plan(self, start_timestamp, end_timestamp, today=None):
+        today = today or date.today()
+        days, raw_ranges = [], []
+        for day in window_days(start_timestamp, end_timestamp):
+            day_start, day_end = day_range(day, day)
+            if start_timestamp <= day_start and day_end <= end_timestamp and day < today and self.has_day(day):
+                days.append(day)
+                continue
+            low, high = max(start_timestamp, day_start), min(end_timestamp, day_end)
+            if raw_ranges and raw_ranges[-1][1] + 1 == low:
+                raw_ranges[-1] = (raw_ranges[-1][0], high)
+            else:
+                raw_ranges.append((low, high))
+        return days, raw_ranges
+
+    # Function to plan every window, None untuk window ada window yang bagian tanpa index-nya lebih dari AU_INDEX_MAX_RAW_SECONDS
+    def plan_windows(self, windows, today=None):
+        today = today or date.today()
+        end_of_today = day_range(today, today)[1]
+        plans = []
+        for start_timestamp, end_timestamp in windows:
+            days, raw_ranges = self.plan(start_timestamp, end_timestamp, today)
+            raw_seconds = sum(max(0, min(high, end_of_today) - low + 1) for low, high in raw_ranges)
+            plans.append((days, raw_ranges) if raw_seconds <= AU_INDEX_MAX_RAW_SECONDS else None)
+        return plans
+
+    # Function to count exact distinct active users of planned windows (sama dengan COUNT(DISTINCT ul.user_id))
+    def count_plans(self, plans, query_tag=None):
+        # Hari & potongan window yang sama dibaca sekali untuk semua window
+        day_ids, raw_ids = {}, {}
+        counts = []
+        for plan in plans:
+            if plan is None:
+                counts.append(None)
+                continue
+            days, raw_ranges = plan
+            for day in days:
+                if day not in day_ids:
+                    day_ids[day] = self.read_day(day)
+            for raw_range in raw_ranges:
+                if raw_range not in raw_ids:
+                    rows = fetchall(RAW_USERS_QUERY, raw_range, query_tag=query_tag, coalesce=True)
+                    raw_ids[raw_range] = np.unique(np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)))
+            counts.append(count_union([day_ids[day] for day in days] + [raw_ids[raw_range] for raw_range in raw_ranges]))
+        return counts
+
+    # Function to count exact distinct active users for every window, None untuk window yang tidak tercakup index
+    def count_windows(self, windows, query_tag=None):
+        return self.count_plans(self.plan_windows(windows), query_tag)
+
+    def stats(self):
+        files = list(self.directory.glob("*.au"))
+        days = sorted(path.stem for path in files)
+        return {
+            'days': len(days),
+            'first_day': days[0] if days else None,
+            'last_day': days[-1] if days else None,
+            'bytes': sum(path.stat().st_size for path in files),
+        }
+
+
+# ===== Process-wide Index =====
+_index = None
+_index_lock = threading.Lock()
+
+
+# Function to get the shared active user index
+def get_au_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = ActiveUserIndex()
+    return _index
+
+
+_refreshed_on = None
+_refresh_lock = threading.Lock()
+
+
+# Function to make sure yesterday is indexed (sekali per proses per hari, setelah update 00:00)
+def ensure_au_index_fresh():
+    global _refreshed_on
+    today = date.today()
+    if _refreshed_on == today:
+        return
+    with _refresh_lock:
+        if _refreshed_on != today:
+            get_au_index().refresh(today=today)
+            _refreshed_on = today
+
+
+# ===== Verification on the Local Stand-in =====
+# Function to compare indexed AU with COUNT(DISTINCT user_id) over user_logs and with the full KPI query
+def verify_against_sql(n_windows=80, days=90, seed=3):
+    import utils.active_users as au_module  # bukan __main__ saat dijalankan sebagai CLI
+    import utils.db as db_module
+    from utils.db import ConnectionPool
+    from utils.first_order import refresh_index
+    from utils.localdb import generate, local_connect_factory
+    from utils.metrics import KPI_COLUMNS, build_buckets, fetch_bucket_kpis
+
+    rng = np.random.default_rng(seed)
+    today = date.today()
+    mismatches = []
+    previous_pool, previous_index = db_module._pool, au_module._index
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / "verify.sqlite"
+        generate(database, orders=5_000, logs=60_000, users=20_000, days=days, seed=seed)
+        db_module._pool = ConnectionPool(local_connect_factory(database))
+        index = au_module._index = ActiveUserIndex(Path(directory) / "au_index")
+        try:
+            # 30 hari paling lama sengaja tidak di-index: AU window di sana harus tetap dari query KPI
+            index.refresh(backfill_days=days - 30, today=today)
+            refresh_index()
+
+            # Window per hari penuh (minggu/bulan), sampai hari ini/masa depan, dan window dengan batas detik sembarang
+            windows = []
+            for _ in range(n_windows):
+                first = today - timedelta(days=int(rng.integers(0, days)))
+                last = first + timedelta(days=int(rng.integers(0, 40)))
+                start_timestamp, end_timestamp = day_range(first, last)
+                if rng.random() < 0.3:
+                    start_timestamp += int(rng.integers(0, 86400))
+                    end_timestamp -= int(rng.integers(0, 86400))
+                if start_timestamp <= end_timestamp:
+                    windows.append((start_timestamp, end_timestamp))
+
+            counts = index.count_windows(windows)
+            for (start_timestamp, end_timestamp), count in zip(windows, counts):
+                if count is None:
+                    continue
+                expected = fetchall("SELECT COUNT(DISTINCT user_id) FROM user_logs WHERE created_at >= ? AND created_at <= ?",
+                                    (start_timestamp, end_timestamp))[0][0]
+                if count != expected:
+                    mismatches.append((start_timestamp, end_timestamp, expected, count))
+
+            # Query KPI dengan AU dari index harus identik dengan query KPI lama (AU dari scan user_logs)
+            buckets = build_buckets('check', windows)
+            indexed = fetch_bucket_kpis(buckets, use_cache=False, use_rollup=False, use_au_index=True)
+            scanned = fetch_bucket_kpis(buckets, use_cache=False, use_rollup=False, use_au_index=False)
+            position = KPI_COLUMNS.index('active_user')
+            for key, kpis in scanned.items():
+                if indexed[key][position] != kpis[position]:
+                    mismatches.append((*windows[key[1]], kpis[position], indexed[key][position]))
+        finally:
+            db_module.get_pool().close_all()
+            db_module._pool, au_module._index = previous_pool, previous_index
+    return mismatches
+
+
+# Command line: python -m utils.active_users [refresh | stats | verify]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'refresh'
+    if command == 'refresh':
+        print(f"{get_au_index().refresh()} day(s) indexed")
+    elif command == 'stats':
+        print(get_au_index().stats())
+    elif command == 'verify':
+        mismatches = verify_against_sql()
+        for mismatch in mismatches:
+            print("MISMATCH (start, end, sql, index):", mismatch)
+        print("OK" if not mismatches else f"{len(mismatches)} window(s) differ")
+        sys.exit(1 if mismatches else 0)
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,156 @@
+# ----- Import Library -----
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from pathlib import Path
+
+import utils.active_users as active_users_module
+import utils.cache as cache_module
+import utils.db as db_module
+import utils.mtd as mtd_module
+from utils.active_users import ActiveUserIndex, ensure_au_index_fresh
+from utils.cache import ResultCache
+from utils.db import POOL_MAX_SIZE, ConnectionPool, make_query_tag, snowflake_connect
+from utils.first_order import ensure_index_fresh
+from utils.export import write_report
+from utils.mtd import MonthToDateStore
+from utils.perf import capture
+from utils.reports import build_monthly_report
+from utils.rollup import ensure_rollup_fresh
+from utils.trend import shift_month
+
+# ===== Batch Report Settings =====
+# Report bulanan (weekly breakdown dashboard2) untuk banyak bulan sekaligus tanpa Streamlit.
+# Setiap worker process memegang maksimal 1 koneksi warehouse, jadi jumlah session = jumlah worker (<= --sessions).
+BATCH_OUTPUT_DIR = Path(os.environ.get("ORDERFAZ_BATCH_DIR", Path(__file__).resolve().parent.parent / ".cache" / "batch"))
+BATCH_FORMATS = ('xlsx', 'parquet', 'csv')
+BATCH_QUERY_TAG = make_query_tag('batch', 'gmv_monthly')
+
+
+# Function to parse month arguments: 'YYYY-MM' atau range 'YYYY-MM..YYYY-MM' (inklusif)
+def parse_months(values):
+    months = []
+    for value in values:
+        first, _, last = value.partition('..')
+        first_year, first_month = (int(part) for part in first.split('-'))
+        last_year, last_month = (int(part) for part in (last or first).split('-'))
+        for i in range((last_year * 12 + last_month) - (first_year * 12 + first_month) + 1):
+            months.append(shift_month(first_year, first_month, i))
+    return sorted(set(months))
+
+
+# Function to point this process at the warehouse (atau database lokal utils/localdb.py) with a pool of `sessions`
+def _install_backend(sessions, database=None, cache_dir=None):
+    if database:
+        from utils.localdb import local_connect_factory
+
+        db_module._pool = ConnectionPool(local_connect_factory(database), max_size=sessions)
+        cache_module._cache = ResultCache(cache_dir)
+        active_users_module._index = ActiveUserIndex(Path(cache_dir) / "au_index")
+        mtd_module._store = MonthToDateStore(Path(cache_dir) / "mtd")
+    else:
+        db_module._pool = ConnectionPool(snowflake_connect, max_size=sessions)
+
+
+# Function to write one report in the requested formats (lihat utils/export.py), returns the file paths
+def write_outputs(report, stem, formats, output_dir):
+    files = []
+    for fmt in formats:
+        path = Path(output_dir) / f"{stem}.{fmt}"
+        write_report(report, fmt, path)
+        files.append(str(path))
+    return files
+
+
+# Function to build & write one monthly report inside a worker process (error dikembalikan, tidak di-raise)
+def build_one(year, month, formats, output_dir):
+    stem = f"weekly_report_{year}_{month:02d}"
+    started = time.perf_counter()
+    summary = {'report': stem, 'year': year, 'month': month, 'status': 'ok', 'error': None, 'files': [], 'rows': 0}
+    with capture() as spans:
+        try:
+            report = build_monthly_report(year, month, query_tag=BATCH_QUERY_TAG, figures=False)
+            summary['rows'] = len(report['tables']['weeks_df'])
+            summary['files'] = write_outputs(report, stem, formats, output_dir)
+        except Exception as exc:
+            summary.update(status='failed', error=f"{type(exc).__name__}: {exc}")
+
+    stages = {}
+    for record in spans:
+        stages[record['span']] = stages.get(record['span'], 0.0) + record['wall_ms']
+    summary['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    summary['stages_ms'] = {stage: round(wall_ms, 2) for stage, wall_ms in sorted(stages.items())}
+    summary['worker'] = os.getpid()
+    return summary
+
+
+# Function to generate the reports of every month on a process pool and write run_summary.json
+def run_batch(months, formats=BATCH_FORMATS, output_dir=BATCH_OUTPUT_DIR, sessions=POOL_MAX_SIZE, workers=None,
+              database=None):
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    workers = max(1, min(workers or os.cpu_count() or 1, sessions, len(months)))
+    started_at = datetime.now()
+    started = time.perf_counter()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Maintenance (first-order index, daily rollup & index AU) sekali di proses utama, bukan di setiap worker
+        _install_backend(1, database, cache_dir)
+        ensure_index_fresh()
+        ensure_rollup_fresh()
+        ensure_au_index_fresh()
+        db_module.get_pool().close_all()
+
+        # spawn: worker tidak mewarisi koneksi/lock dari proses utama
+        context = multiprocessing.get_context('spawn')
+        reports = []
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_install_backend,
+                                 initargs=(1, database, cache_dir)) as executor:
+            futures = [executor.submit(build_one, year, month, tuple(formats), str(output_dir)) for year, month in months]
+            for future in as_completed(futures):
+                summary = future.result()
+                reports.append(summary)
+                print(f"{summary['report']:28s} {summary['status']:6s} {summary['wall_ms']:>10,.0f} ms"
+                      + (f"  {summary['error']}" if summary['error'] else ""), flush=True)
+
+    reports.sort(key=lambda summary: (summary['year'], summary['month']))
+    run_summary = {
+        'started_at': started_at.isoformat(timespec='seconds'),
+        'wall_ms': round((time.perf_counter() - started) * 1000, 2),
+        'workers': workers,
+        'warehouse_sessions': workers,
+        'formats': list(formats),
+        'output_dir': str(output_dir),
+        'succeeded': sum(summary['status'] == 'ok' for summary in reports),
+        'failed': sum(summary['status'] != 'ok' for summary in reports),
+        'reports': reports,
+    }
+    (output_dir / "run_summary.json").write_text(json.dumps(run_summary, indent=2))
+    return run_summary
+
+
+# Command line:
+#   python -m utils.batch MONTHS... [--format xlsx parquet csv] [--out DIR] [--sessions N] [--workers N] [--database PATH]
+#   MONTHS: 2026-01 2026-03 atau range 2025-10..2026-03
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m utils.batch")
+    parser.add_argument('months', nargs='*', help="YYYY-MM or YYYY-MM..YYYY-MM (default: bulan berjalan)")
+    parser.add_argument('--format', nargs='+', choices=BATCH_FORMATS, default=['xlsx'])
+    parser.add_argument('--out', default=str(BATCH_OUTPUT_DIR))
+    parser.add_argument('--sessions', type=int, default=POOL_MAX_SIZE, help="maksimal session warehouse bersamaan")
+    parser.add_argument('--workers', type=int, default=None, help="default min(CPU, sessions, jumlah bulan)")
+    parser.add_argument('--database', help="local stand-in database (utils/localdb.py) instead of Snowflake")
+    args = parser.parse_args()
+
+    today = date.today()
+    months = parse_months(args.months) if args.months else [(today.year, today.month)]
+    result = run_batch(months, args.format, args.out, args.sessions, args.workers, args.database)
+    print(f"{result['succeeded']}/{len(months)} reports in {result['wall_ms'] / 1000:,.1f}s "
+          f"with {result['workers']} workers -> {Path(args.out) / 'run_summary.json'}")
+    sys.exit(1 if result['failed'] else 0)
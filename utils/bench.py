@@ -0,0 +1,463 @@
+# ----- Import Library -----
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+import utils.active_users as active_users_module
+import utils.cache as cache_module
+import utils.db as db_module
+import utils.mtd as mtd_module
+from utils.active_users import ActiveUserIndex
+from utils.cache import ResultCache
+from utils.db import ConnectionPool
+from utils.export import write_xlsx
+from utils.first_order import refresh_index
+from utils.localdb import generate, local_connect_factory, read_meta
+from utils.metrics import MAX_CONCURRENT_QUERIES, build_buckets, fetch_bucket_kpis, iter_bucket_kpis, kpi_frame, typed_kpis
+from utils.mtd import MonthToDateStore
+from utils.perf import capture, span
+from utils.reports import (build_monthly_report, build_weekly_report, fill_month_tables, monthly_metrics, previous_period_of,
+                           report_columns)
+from utils.rollup import day_range, rebuild_days
+from utils.trend import fetch_trend
+from utils.weeks import month_weeks, span_weeks
+
+# ===== Benchmark Settings =====
+ROOT_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = Path(os.environ.get("ORDERFAZ_BENCH_DIR", ROOT_DIR / ".cache" / "bench"))
+BASELINE_DIR = BENCH_DIR / "baselines"
+REGRESSION_THRESHOLD = 0.10  # Lebih lambat/boros >10% dari baseline dianggap regresi
+
+
+# ===== Report Scenarios =====
+# Setiap skenario meniru alur Submit di halaman (query + DataFrame + Excel) tanpa Streamlit
+def _excel_bytes(df):
+    with span('excel'):
+        output = BytesIO()
+        write_xlsx([('Sheet1', df)], output)
+        return output.getvalue()
+
+
+def _frame(results, keys):
+    with span('dataframe'):
+        return pd.DataFrame(report_columns(kpi_frame(results, keys)))
+
+
+def _weekly_windows(today):
+    return [day_range(today - timedelta(days=30), today)]
+
+
+# GMV Weekly (dashboard1): default 30 hari terakhir
+def scenario_weekly(today):
+    bounds = _weekly_windows(today)
+    results = fetch_bucket_kpis(build_buckets('period', bounds), use_cache=False)
+    _excel_bytes(_frame(results, [('period', 0)]))
+    return bounds
+
+
+# GMV Weekly mode compare: periode + periode sebelumnya dalam satu query (target <= ~1.2x skenario weekly)
+def scenario_weekly_compare(today):
+    start_date = today - timedelta(days=30)
+    report = build_weekly_report(start_date, today, compare=True)
+    _excel_bytes(report['tables']['df'])
+    return [day_range(previous_period_of(start_date, today)[0], today)]
+
+
+# Function to build the dashboard2 buckets: minggu bulan ini + bulan lalu + total bulan
+def _monthly_buckets(today):
+    weeks = month_weeks(today.year, today.month)
+    previous = today.replace(day=1) - timedelta(days=1)
+    prev_weeks = month_weeks(previous.year, previous.month)
+    current_bounds = weeks.bounds()
+    month_bounds = [(current_bounds[0][0], current_bounds[-1][1])]
+    buckets = (build_buckets('current', current_bounds) + build_buckets('previous', prev_weeks.bounds())
+               + build_buckets('month', month_bounds))
+    return weeks, prev_weeks, buckets
+
+
+def _monthly_windows(today):
+    buckets = _monthly_buckets(today)[2]
+    return [(min(bucket[2] for bucket in buckets), max(bucket[3] for bucket in buckets))]
+
+
+# GMV Monthly (dashboard2): single-scan atau satu query per minggu secara paralel
+def scenario_monthly(today, parallel=False):
+    weeks, prev_weeks, buckets = _monthly_buckets(today)
+    if parallel:
+        results = dict(iter_bucket_kpis(buckets, max_workers=MAX_CONCURRENT_QUERIES))
+    else:
+        results = fetch_bucket_kpis(buckets, use_cache=False)
+    df = _frame(results, [('current', i) for i in range(len(weeks))])
+    _frame(results, [('previous', i) for i in range(len(prev_weeks))])
+    _excel_bytes(df)
+    return _monthly_windows(today)
+
+
+# Report bulan berjalan lengkap (pre-warm/dashboard2): hitung ulang penuh, atau incremental dari state month-to-date
+# (state tetap tersimpan antar iterasi, jadi iterasi pertama membangun state dan sisanya hanya minggu terbuka + hari baru)
+def scenario_monthly_report(today, incremental):
+    report = build_monthly_report(today.year, today.month, figures=False, incremental=incremental)
+    _excel_bytes(report['tables']['weeks_df'])
+    return _monthly_windows(today)
+
+
+# Trend 12 bulan (dashboard2 mode trend): 24 bulan + minggu-minggu 12 bulan terakhir dalam 1 batch
+def scenario_trend(today, n_months=12):
+    monthly_df, _ = fetch_trend(today.year, today.month, n_months)
+    _excel_bytes(monthly_df)
+    first = today.replace(day=1) - timedelta(days=31 * (n_months + 12))
+    return [day_range(first, today)]
+
+
+# Halaman asli dijalankan headless dengan streamlit.testing, tombol Submit di-klik seperti user
+def scenario_page(script, windows):
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(str(ROOT_DIR / script), default_timeout=600)
+    app.run()
+    next(button for button in app.button if button.label == 'Submit').click().run()
+    if app.exception:
+        raise RuntimeError(f"{script}: {app.exception[0].message}")
+    return windows
+
+
+SCENARIOS = {
+    'weekly': scenario_weekly,
+    'weekly_compare': scenario_weekly_compare,
+    'monthly': scenario_monthly,
+    'monthly_parallel': lambda today: scenario_monthly(today, parallel=True),
+    'monthly_full': lambda today: scenario_monthly_report(today, incremental=False),
+    'monthly_mtd': lambda today: scenario_monthly_report(today, incremental=True),
+    'trend12': scenario_trend,
+    'page_weekly': lambda today: scenario_page("pages/dashboard1.py", _weekly_windows(today)),
+    'page_monthly': lambda today: scenario_page("pages/dashboard2.py", _monthly_windows(today)),
+}
+
+# Skenario halaman butuh streamlit.testing, dijalankan hanya kalau diminta dengan --scenario
+DEFAULT_SCENARIOS = ['weekly', 'weekly_compare', 'monthly', 'monthly_parallel', 'monthly_full', 'monthly_mtd', 'trend12']
+
+
+# ===== Harness =====
+# Function to point the app's pool, result cache & AU index at the local stand-in (tanpa mengubah kode report)
+def install_local_backend(database_path, cache_dir):
+    db_module._pool = ConnectionPool(local_connect_factory(database_path))
+    cache_module._cache = ResultCache(cache_dir)
+    active_users_module._index = ActiveUserIndex(Path(cache_dir) / "au_index")
+    mtd_module._store = MonthToDateStore(Path(cache_dir) / "mtd")
+
+
+# Function to make sure the synthetic database for the given scale exists (dibuat ulang kalau harinya sudah lewat)
+def prepare_database(orders, logs, users, days, seed):
+    path = BENCH_DIR / f"orders_{orders}_{logs}_{seed}.sqlite"
+    meta = read_meta(path)
+    if meta is None or meta.get('today') != date.today().isoformat() or meta.get('days') != days:
+        print(f"Generating {orders:,} orders + {logs:,} logs -> {path}")
+        generate(path, orders=orders, logs=logs, users=users, days=days, seed=seed)
+    return path
+
+
+# Function to (re)build the daily rollup, first-order index and AU index on the local database
+def build_derived_tables(days):
+    rebuild_days(date.today() - timedelta(days=days), date.today())
+    refresh_index()
+    active_users_module.get_au_index().refresh(backfill_days=days)
+
+
+# Function to count source rows inside the windows read by a scenario (untuk throughput)
+def _source_rows(windows):
+    rows = 0
+    for start_timestamp, end_timestamp in windows:
+        for table in ('shipment_orders', 'user_logs'):
+            rows += db_module.fetchone(f"SELECT COUNT(*) FROM {table} WHERE created_at >= ? AND created_at <= ?",
+                                       (start_timestamp, end_timestamp))[0]
+    return rows
+
+
+# Function to run one scenario `repeat` times and summarize latency per stage, peak memory and throughput
+def run_scenario(name, repeat, today):
+    walls, peaks, stage_ms = [], [], {}
+    windows = None
+    for _ in range(repeat):
+        # Setiap iterasi cold: koneksi baru (stage connect ikut terukur) dan result cache kosong
+        db_module.get_pool().close_all()
+        cache_module.get_cache().clear()
+        tracemalloc.start()
+        started = time.perf_counter()
+        with capture() as spans:
+            windows = SCENARIOS[name](today)
+        walls.append((time.perf_counter() - started) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+        totals = {}
+        for record in spans:
+            totals[record['span']] = totals.get(record['span'], 0.0) + record['wall_ms']
+        for stage, wall_ms in totals.items():
+            stage_ms.setdefault(stage, []).append(wall_ms)
+
+    median_wall = statistics.median(walls)
+    source_rows = _source_rows(windows)
+    return {
+        'wall_ms_median': round(median_wall, 2),
+        'wall_ms_min': round(min(walls), 2),
+        'wall_ms_max': round(max(walls), 2),
+        'stages_ms_median': {stage: round(statistics.median(values), 2) for stage, values in sorted(stage_ms.items())},
+        'peak_python_bytes': max(peaks),
+        'source_rows': source_rows,
+        'rows_per_s': round(source_rows / (median_wall / 1000), 1) if median_wall else None,
+        'reports_per_s': round(1000 / median_wall, 3) if median_wall else None,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent.parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+# Function to run the whole suite and return a result document (disimpan sebagai baseline kalau diminta)
+def run_suite(scenarios, repeat=3, orders=1_000_000, logs=2_000_000, users=200_000, days=760, seed=42):
+    path = prepare_database(orders, logs, users, days, seed)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        install_local_backend(path, cache_dir)
+        with capture():
+            started = time.perf_counter()
+            build_derived_tables(days)
+            derived_ms = (time.perf_counter() - started) * 1000
+
+        today = date.today()
+        results = {name: run_scenario(name, repeat, today) for name in scenarios}
+        db_module.get_pool().close_all()
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scale': {'orders': orders, 'logs': logs, 'users': users, 'days': days, 'seed': seed},
+        'repeat': repeat,
+        'derived_tables_ms': round(derived_ms, 2),
+        'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'scenarios': results,
+    }
+
+
+# ===== Result Frame Micro-benchmark =====
+# Tabel minggu panjang (multi-bulan) dibangun dengan cara lama (kolom object diisi per sel dengan .at, Decimal
+# kumulatif) vs typed frame (konversi Decimal sekali, kolom float64/int64, GMV EOM vektor), lalu dipakai seperti
+# di halaman: rata-rata, label teks chart, export Excel.
+
+# Function to draw raw KPI rows like the Snowflake connector returns them (Decimal untuk NUMBER berskala)
+def _raw_kpi_results(n_weeks, seed=7):
+    rng = np.random.default_rng(seed)
+    results = {}
+    for period in ('current', 'previous'):
+        for i in range(n_weeks):
+            r_users, n_users = int(rng.integers(500, 5000)), int(rng.integers(50, 800))
+            results[(period, i)] = (Decimal(f"{rng.gamma(2.0, 5e8):.2f}"), int(rng.integers(1000, 50000)), r_users,
+                                    n_users, int(rng.integers(5000, 60000)), r_users + n_users,
+                                    Decimal(f"{rng.gamma(2.0, 9e4):.6f}"), Decimal(f"{rng.uniform(0, 0.2):.6f}"))
+    return results
+
+
+# fill_month_tables sebelum typed frame, dipakai sebagai acuan
+def _legacy_fill_month_tables(weeks, prev_weeks, period_results):
+    weeks_df, days_in_month = weeks.to_frame(), int(weeks.days_in_month[0])
+    prev_weeks_df, prev_days_in_month = prev_weeks.to_frame(), int(prev_weeks.days_in_month[0])
+    weeks_df[['GMV Final Status', 'GMV EOM', 'Orders Qty', 'R Transacting User', 'N Transacting User', 'AU (Aktive User)', 'TU (Trx User)', 'AOV', 'COD RTS%']] = None
+
+    cumulative_gmv = Decimal(0)
+    for i in range(len(weeks)):
+        result = period_results[('current', i)]
+        weeks_df.at[i, 'GMV Final Status'] = float(result[0])
+        weeks_df.at[i, 'Orders Qty'] = result[1]
+        weeks_df.at[i, 'R Transacting User'] = result[2]
+        weeks_df.at[i, 'N Transacting User'] = result[3]
+        weeks_df.at[i, 'AU (Aktive User)'] = result[4]
+        weeks_df.at[i, 'TU (Trx User)'] = result[2] + result[3]
+        weeks_df.at[i, 'AOV'] = result[6]
+        weeks_df.at[i, 'COD RTS%'] = result[7]
+        cumulative_gmv += result[0]
+        weeks_df.at[i, 'GMV EOM'] = float(cumulative_gmv) / int(weeks.days_elapsed[i]) * days_in_month
+
+    cumulative_gmv_prev = Decimal(0)
+    for i in range(len(prev_weeks)):
+        result = period_results[('previous', i)]
+        prev_weeks_df.at[i, 'GMV Final Status'] = float(result[0])
+        prev_weeks_df.at[i, 'Orders Qty'] = result[1]
+        prev_weeks_df.at[i, 'AOV'] = result[6]
+        cumulative_gmv_prev += result[0]
+        prev_weeks_df.at[i, 'GMV EOM'] = float(cumulative_gmv_prev) / int(prev_weeks.days_elapsed[i]) * prev_days_in_month
+    return weeks_df, prev_weeks_df
+
+
+# Function to build, aggregate, format & export the week tables with one implementation, returns wall ms per stage
+def _frame_pipeline(fill, weeks, raw_results):
+    stages = {}
+    started = time.perf_counter()
+    weeks_df, prev_weeks_df = fill(weeks, weeks, raw_results)
+    stages['build'] = time.perf_counter()
+    monthly_metrics(weeks_df, prev_weeks_df)
+    stages['aggregate'] = time.perf_counter()
+    weeks_df['GMV Final Status'].apply(lambda x: f"{x:,.0f}")
+    weeks_df['COD RTS%'].apply(lambda x: f"{x:.2%}")
+    stages['format'] = time.perf_counter()
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        weeks_df.to_excel(writer, index=False)
+    stages['excel'] = time.perf_counter()
+
+    wall_ms, previous = {}, started
+    for stage, finished in stages.items():
+        wall_ms[stage] = (finished - previous) * 1000
+        previous = finished
+    return weeks_df, wall_ms
+
+
+# Function to compare the legacy object-dtype frames with the typed frames on an n_months long week table
+def run_frame_benchmark(n_months=120, repeat=5):
+    weeks = span_weeks(2015, 1, n_months)
+    raw_results = _raw_kpi_results(len(weeks))
+    implementations = {
+        'object': _legacy_fill_month_tables,
+        # Konversi Decimal (typed_kpis) ikut diukur karena di aplikasi terjadi saat fetch
+        'typed': lambda weeks, prev_weeks, results: fill_month_tables(
+            weeks, prev_weeks, {key: typed_kpis(row) for key, row in results.items()}),
+    }
+
+    summary, frames = {}, {}
+    for name, fill in implementations.items():
+        stage_ms, peaks = {}, []
+        for _ in range(repeat):
+            tracemalloc.start()
+            frames[name], wall_ms = _frame_pipeline(fill, weeks, raw_results)
+            peaks.append(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            for stage, value in wall_ms.items():
+                stage_ms.setdefault(stage, []).append(value)
+        summary[name] = {
+            'stages_ms_median': {stage: round(statistics.median(values), 2) for stage, values in stage_ms.items()},
+            'frame_bytes': int(frames[name].memory_usage(index=True, deep=True).sum()),
+            'peak_python_bytes': max(peaks),
+            'dtypes': sorted({str(dtype) for dtype in frames[name].dtypes}),
+        }
+
+    # Kedua implementasi harus menghasilkan angka yang sama (selisih hanya pembulatan float vs Decimal)
+    columns = ['GMV Final Status', 'GMV EOM', 'Orders Qty', 'TU (Trx User)', 'AOV', 'COD RTS%']
+    summary['matches'] = bool(np.allclose(frames['object'][columns].astype(np.float64).to_numpy(),
+                                          frames['typed'][columns].to_numpy(np.float64), rtol=1e-12))
+    summary['weeks'] = len(weeks)
+    return summary
+
+
+# ===== Baselines & Comparison =====
+def save_baseline(result, name):
+    BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+    path = BASELINE_DIR / f"{name}.json"
+    path.write_text(json.dumps(result, indent=2))
+    return path
+
+
+def load_baseline(name_or_path):
+    path = Path(name_or_path)
+    if not path.exists():
+        path = BASELINE_DIR / f"{name_or_path}.json"
+    return json.loads(path.read_text())
+
+
+# Function to compare two suite results per scenario/metric, returns (DataFrame, regressed)
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    rows = []
+    for name, now in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        metrics = {'wall_ms_median': (before['wall_ms_median'], now['wall_ms_median']),
+                   'peak_python_bytes': (before['peak_python_bytes'], now['peak_python_bytes'])}
+        for stage in sorted(set(before['stages_ms_median']) | set(now['stages_ms_median'])):
+            metrics[f"stage:{stage}"] = (before['stages_ms_median'].get(stage), now['stages_ms_median'].get(stage))
+        for metric, (old, new) in metrics.items():
+            change = (new - old) / old if old and new is not None else None
+            rows.append({'scenario': name, 'metric': metric, 'baseline': old, 'current': new,
+                         'change_%': None if change is None else round(change * 100, 1),
+                         'regression': change is not None and change > threshold})
+    report = pd.DataFrame(rows)
+    if baseline['scale'] != current['scale']:
+        print(f"WARNING: scale differs, baseline {baseline['scale']} vs current {current['scale']}")
+    return report, bool(not report.empty and report['regression'].any())
+
+
+# Command line:
+#   python -m utils.bench run [--orders N] [--logs N] [--repeat N] [--scenario NAME ...] [--save NAME] [--compare NAME]
+#   python -m utils.bench compare BASELINE CURRENT
+#   python -m utils.bench frames [--months N] [--repeat N]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog="python -m utils.bench")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run')
+    run_parser.add_argument('--orders', type=int, default=1_000_000)
+    run_parser.add_argument('--logs', type=int, default=None, help="default 2x orders")
+    run_parser.add_argument('--users', type=int, default=200_000)
+    run_parser.add_argument('--days', type=int, default=760)
+    run_parser.add_argument('--seed', type=int, default=42)
+    run_parser.add_argument('--repeat', type=int, default=3)
+    run_parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS))
+    run_parser.add_argument('--save', help="save the result as baseline NAME")
+    run_parser.add_argument('--compare', help="compare against baseline NAME (exit 1 on regression)")
+
+    compare_parser = commands.add_parser('compare')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD)
+
+    frames_parser = commands.add_parser('frames')
+    frames_parser.add_argument('--months', type=int, default=120)
+    frames_parser.add_argument('--repeat', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        result = run_suite(args.scenario or DEFAULT_SCENARIOS, repeat=args.repeat, orders=args.orders,
+                           logs=args.logs if args.logs is not None else 2 * args.orders,
+                           users=args.users, days=args.days, seed=args.seed)
+        for name, summary in result['scenarios'].items():
+            stages = ", ".join(f"{stage} {wall_ms:,.0f}ms" for stage, wall_ms in summary['stages_ms_median'].items())
+            print(f"{name:18s} {summary['wall_ms_median']:>10,.1f} ms  peak {summary['peak_python_bytes'] / 2**20:7.1f} MiB  "
+                  f"{summary['rows_per_s'] or 0:>14,.0f} rows/s  [{stages}]")
+        print(f"derived tables {result['derived_tables_ms']:,.0f} ms, max RSS {result['max_rss_bytes'] / 2**20:,.0f} MiB")
+        if args.save:
+            print(f"Baseline saved to {save_baseline(result, args.save)}")
+        if args.compare:
+            report, regressed = compare(load_baseline(args.compare), result)
+            print(report.to_string(index=False))
+            sys.exit(1 if regressed else 0)
+    elif args.command == 'frames':
+        result = run_frame_benchmark(args.months, args.repeat)
+        print(f"{result['weeks']:,} weeks ({args.months} months), results match: {result['matches']}")
+        for name in ('object', 'typed'):
+            summary = result[name]
+            stages = ", ".join(f"{stage} {wall_ms:,.1f}ms" for stage, wall_ms in summary['stages_ms_median'].items())
+            print(f"{name:7s} frame {summary['frame_bytes'] / 2**10:8.1f} KiB  peak {summary['peak_python_bytes'] / 2**20:6.1f} MiB  "
+                  f"[{stages}]  dtypes {', '.join(summary['dtypes'])}")
+        sys.exit(0 if result['matches'] else 1)
+    else:
+        report, regressed = compare(load_baseline(args.baseline), load_baseline(args.current), args.threshold)
+        print(report.to_string(index=False))
+        sys.exit(1 if regressed else 0)
@@ -0,0 +1,179 @@
+# ----- Import Library -----
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, time as dt_time, timedelta
+from pathlib import Path
+
+from utils.rollup import ROLLUP_RESTATE_DAYS
+from utils.startup import lazy_import
+
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+
+# ===== Cache Settings =====
+# Disimpan di disk supaya dipakai bersama oleh semua session & proses Streamlit di server yang sama
+CACHE_DIR = Path(os.environ.get("ORDERFAZ_CACHE_DIR", Path(__file__).resolve().parent.parent / ".cache" / "kpi"))
+CACHE_MAX_BYTES = int(os.environ.get("ORDERFAZ_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Versi aturan 'final' entry cache. Entry versi lama bisa final padahal dihitung dari rollup yang belum di-build
+# (GMV/order 0 untuk bulan lama), jadi dibuang saat dibaca.
+CACHE_FORMAT_VERSION = 2
+
+
+# Function to get the epoch timestamp of the latest 00:00 data refresh
+def last_refresh_boundary(now=None):
+    now = now or datetime.now()
+    return int(datetime.combine(now.date(), dt_time.min).timestamp())
+
+
+# Function to get the epoch timestamp before which data is final (status order masih berubah selama
+# ROLLUP_RESTATE_DAYS hari, sama dengan window restate daily rollup di utils/rollup.py)
+def final_boundary(now=None):
+    now = now or datetime.now()
+    return int(datetime.combine(now.date() - timedelta(days=ROLLUP_RESTATE_DAYS), dt_time.min).timestamp())
+
+
+# Function to build a stable cache key from the metric query signature and its window
+def make_key(signature, start_timestamp, end_timestamp):
+    raw = json.dumps([signature, int(start_timestamp), int(end_timestamp)])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+class ResultCache:
+    """Parquet-backed result cache shared by every process on the host.
+
+    Windows that ended before ``final_boundary()`` (older than the rollup
+    restate window) and that the caller marks as exact (computed from raw
+    orders or from rollup days known to be built) are final and kept until
+    evicted; every other window,
+    including recently closed ones whose order status can still change, is
+    only valid until the next 00:00 refresh. Eviction is
+    LRU by file mtime (bumped on every hit) once the directory exceeds
+    ``max_bytes``.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.parquet"
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            table = pq.read_table(path)
+        except (FileNotFoundError, OSError, pa.ArrowInvalid):
+            self._count('misses')
+            return None
+
+        meta = table.schema.metadata or {}
+        if meta.get(b'format') != str(CACHE_FORMAT_VERSION).encode():
+            self._remove(path)
+            self._count('misses')
+            return None
+        final = meta.get(b'final') == b'1'
+        boundary = int(meta.get(b'refresh_boundary', b'0'))
+        if not final and boundary != last_refresh_boundary():
+            # Window belum final saat disimpan dan data sudah di-refresh (dan mungkin di-restate) sejak itu
+            self._remove(path)
+            self._count('misses')
+            return None
+
+        try:
+            os.utime(path)  # LRU: tandai baru dipakai
+        except FileNotFoundError:
+            pass
+        self._count('hits')
+        return table.to_pylist()[0]
+
+    def put(self, key, row, end_timestamp, final=True):
+        boundary = last_refresh_boundary()
+        metadata = {
+            'format': str(CACHE_FORMAT_VERSION),
+            'final': '1' if final and end_timestamp < final_boundary() else '0',
+            'refresh_boundary': str(boundary),
+            'created_at': str(int(time.time())),
+        }
+        table = pa.Table.from_pylist([row]).replace_schema_metadata(metadata)
+
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Tulis ke file sementara lalu rename supaya proses lain tidak membaca file setengah jadi
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+        self._count('writes')
+        self.evict()
+
+    def _remove(self, path):
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _entries(self):
+        entries = []
+        for path in self.directory.glob("*/*.parquet"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return 0
+
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                evicted += 1
+            total -= size
+        self._count('evictions', evicted)
+        return evicted
+
+    def clear(self):
+        for _, _, path in self._entries():
+            self._remove(path)
+
+    def stats(self):
+        entries = self._entries()
+        with self._lock:
+            return {
+                **self._stats,
+                'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries),
+                'max_bytes': self.max_bytes,
+            }
+
+
+# ===== Process-wide Cache =====
+_cache = None
+_cache_lock = threading.Lock()
+
+
+# Function to get the shared result cache
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache()
+    return _cache
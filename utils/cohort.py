@@ -0,0 +1,256 @@
+# ----- Import Library -----
+import sys
+import time
+from datetime import date, datetime, time as dt_time
+
+from utils.db import get_pool, set_query_tag
+from utils.flight import get_flight, get_gate
+from utils.perf import annotate_query, span
+from utils.startup import lazy_import
+from utils.store import get_store
+from utils.trend import shift_month
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+px = lazy_import('plotly.express')
+pa = lazy_import('pyarrow')
+
+# ===== Cohort Settings =====
+# Cohort = bulan order pertama user (sama dengan user_first_orders, lihat utils/first_order.py), kolom = bulan sejak
+# order pertama. Satu extract order (created_by, created_at, gmv_shipment, status) untuk user yang order pertamanya
+# ada di dalam grid dibaca sebagai Arrow batch; setiap batch langsung diringkas per (user, bulan) dan grid dibangun
+# dengan bincount, jadi memory O(pasangan user-bulan), bukan O(order).
+COHORT_MAX_MONTHS = 24
+
+COHORT_QUERY = """
+    SELECT so.created_by, so.created_at, so.gmv_shipment, so.status
+    FROM shipment_orders so
+    WHERE so.created_at >= ? AND so.created_at <= ?
+      AND so.created_by IN (
+          SELECT created_by FROM user_first_orders WHERE first_order_at >= ? AND first_order_at <= ?
+      )
+"""
+
+# Status order yang dihitung ke GMV Final Status (sama dengan ADDITIVE_KPIS['gmv_final_status'] di utils/metrics.py)
+GMV_FINAL_STATUSES = (500, 702, 703)
+
+# Ringkasan per (user, bulan) digabung ulang kalau barisnya sudah 2x hasil penggabungan terakhir (minimal sekian baris),
+# jadi total biaya sort tetap O(n log n) dan memory O(pasangan user-bulan)
+COMPACT_MIN_ROWS = 4_000_000
+
+
+# Function to get the epoch boundaries of n_months calendar months ending at (year, month), n_months + 1 nilai
+def month_boundaries(year, month, n_months):
+    first_year, first_month = shift_month(year, month, -(n_months - 1))
+    return np.array([
+        int(datetime.combine(date(*shift_month(first_year, first_month, i), 1), dt_time.min).timestamp())
+        for i in range(n_months + 1)
+    ], dtype=np.int64)
+
+
+# Function to sum values per unique key (keys boleh tidak urut), hasil key terurut
+def _group_sum(keys, *values):
+    unique, inverse = np.unique(keys, return_inverse=True)
+    return (unique, *(np.bincount(inverse, weights=value, minlength=len(unique)) for value in values))
+
+
+class CohortGrid:
+    """Streams order batches into per-(user, month) partials and folds them into a cohort x age grid.
+
+    Keys are ``user * n_months + month``; after the final merge they are
+    sorted by user, so every user's first key holds their cohort month.
+    """
+
+    def __init__(self, boundaries):
+        self.boundaries = np.asarray(boundaries, dtype=np.int64)
+        self.n_months = len(self.boundaries) - 1
+        self._parts = []
+        self._size = 0
+        self._compacted = 0
+        self.total_rows = 0
+
+    def push(self, user_ids, created_at, gmv, status):
+        created_at = np.asarray(created_at, dtype=np.int64)
+        month = np.searchsorted(self.boundaries, created_at, side='right') - 1
+        inside = (month >= 0) & (month < self.n_months)
+        keys = np.asarray(user_ids, dtype=np.int64)[inside] * self.n_months + month[inside]
+        final_gmv = np.where(np.isin(np.asarray(status)[inside], GMV_FINAL_STATUSES),
+                             np.nan_to_num(np.asarray(gmv, dtype=np.float64)[inside]), 0.0)
+        self.total_rows += int(inside.sum())
+        part = _group_sum(keys, final_gmv, np.ones(len(keys)))
+        self._parts.append(part)
+        self._size += len(part[0])
+        if self._size > 2 * max(self._compacted, COMPACT_MIN_ROWS):
+            self._compact()
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            self._parts = [_group_sum(*(np.concatenate(column) for column in zip(*self._parts)))]
+        self._size = self._compacted = len(self._parts[0][0])
+
+    # Function to build the grids: users, orders & GMV per (cohort, bulan ke-), baris = cohort, kolom = umur
+    def result(self):
+        n = self.n_months
+        if not self._parts:
+            return {name: np.zeros((n, n)) for name in ('users', 'orders', 'gmv')}
+        self._compact()
+        keys, gmv, orders = self._parts[0]
+        users, months = keys // n, keys % n
+
+        # Index awal grup setiap user (keys terurut per user lalu bulan) -> bulan pertama = cohort
+        first = np.ones(len(keys), dtype=bool)
+        first[1:] = users[1:] != users[:-1]
+        cohort = months[np.maximum.accumulate(np.where(first, np.arange(len(keys)), 0))]
+        cell = cohort * n + (months - cohort)
+        return {
+            'users': np.bincount(cell, minlength=n * n).reshape(n, n),
+            'orders': np.bincount(cell, weights=orders, minlength=n * n).reshape(n, n),
+            'gmv': np.bincount(cell, weights=gmv, minlength=n * n).reshape(n, n),
+        }
+
+
+# Function to stream the order extract of the cohort window through a CohortGrid
+def extract_cohort_grid(year, month, n_months=COHORT_MAX_MONTHS, query_tag=None):
+    boundaries = month_boundaries(year, month, n_months)
+    grid = CohortGrid(boundaries)
+    window = (int(boundaries[0]), int(boundaries[-1]) - 1)
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, query_tag)
+            with span('query', query_tag=query_tag, report='cohort') as record:
+                cur.execute(COHORT_QUERY, window + window)
+                for batch in cur.fetch_arrow_batches():
+                    grid.push(batch.column(0).to_numpy(zero_copy_only=False),
+                              batch.column(1).to_numpy(zero_copy_only=False),
+                              batch.column(2).cast(pa.float64()).to_numpy(zero_copy_only=False),
+                              batch.column(3).to_numpy(zero_copy_only=False))
+                annotate_query(record, cur, grid.total_rows)
+        finally:
+            cur.close()
+    return grid.result()
+
+
+# ===== Cohort Report =====
+# Function to turn the grids into tables, metrics & heatmaps (sel yang belum terjadi = kosong)
+def cohort_report(grids, year, month, n_months):
+    n = n_months
+    labels = [f"{y}-{m:02d}" for y, m in (shift_month(year, month, i - (n - 1)) for i in range(n))]
+    ages = [f"Bulan ke-{age}" for age in range(n)]
+    # Cohort ke-i baru punya n - i bulan sampai bulan terakhir grid
+    future = np.arange(n)[None, :] > (n - 1 - np.arange(n))[:, None]
+
+    sizes = grids['users'][:, 0].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        retention = np.where(sizes[:, None] > 0, grids['users'] / sizes[:, None] * 100, np.nan)
+
+    def table(values, dtype=np.float64):
+        frame = pd.DataFrame(np.where(future, np.nan, values).astype(dtype), columns=ages)
+        frame.insert(0, 'Cohort', labels)
+        frame.insert(1, 'User Baru', sizes.astype(np.int64))
+        return frame
+
+    with span('dataframe', table='cohort'):
+        tables = {
+            'cohort_retention': table(retention),
+            'cohort_users': table(grids['users']),
+            'cohort_gmv': table(grids['gmv']),
+        }
+
+    with span('chart', chart='fig_cohort_retention'):
+        fig_retention = px.imshow(np.where(future, np.nan, retention), x=ages, y=labels, text_auto='.1f',
+                                  aspect='auto', color_continuous_scale='Blues', zmin=0, zmax=100,
+                                  labels={'x': 'Bulan sejak order pertama', 'y': 'Cohort', 'color': 'Retensi %'},
+                                  title='Retensi Transacting User per Cohort (%)')
+    with span('chart', chart='fig_cohort_gmv'):
+        fig_gmv = px.imshow(np.where(future, np.nan, grids['gmv']), x=ages, y=labels, text_auto='.3s',
+                            aspect='auto', color_continuous_scale='Greens',
+                            labels={'x': 'Bulan sejak order pertama', 'y': 'Cohort', 'color': 'GMV'},
+                            title='GMV Final Status per Cohort')
+
+    month_one = retention[:-1, 1] if n > 1 else np.array([])
+    return {
+        'tables': tables,
+        'metrics': {
+            'new_users': int(sizes.sum()),
+            'total_gmv': float(grids['gmv'].sum()),
+            'total_orders': int(grids['orders'].sum()),
+            # Rata-rata retensi bulan ke-1, berbobot ukuran cohort (cohort terakhir belum punya bulan ke-1)
+            'month1_retention': (float(np.nansum(month_one * sizes[:-1]) / sizes[:-1].sum())
+                                 if n > 1 and sizes[:-1].sum() else np.nan),
+        },
+        'figures': {'fig_cohort_retention': fig_retention, 'fig_cohort_gmv': fig_gmv},
+    }
+
+
+# Function to get the cohort report ending at (year, month) from the shared report store (dihitung ulang setelah 00:00)
+# Panggil ensure_index_fresh() dulu: user_first_orders menentukan user mana yang masuk grid
+def get_cohort_report(year, month, n_months=COHORT_MAX_MONTHS, query_tag=None):
+    key = f"cohort_{year}_{month:02d}_{n_months}"
+    report = get_store().get(key)
+    if report is None:
+        # Session lain yang meminta grid yang sama saat ini menunggu hasil yang sama
+        report = get_flight().do(key, lambda: get_store().get(key) or get_store().put(
+            key, cohort_report(extract_cohort_grid(year, month, n_months, query_tag), year, month, n_months)))
+    return key, report
+
+
+# ===== Verification =====
+# Function to draw a synthetic order extract (user, created_at, gmv, status) inside the cohort window
+def _synthetic_orders(boundaries, n_rows, n_users, seed):
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, n_users, n_rows) * 7919 + 10_000  # id jarang seperti id asli
+    created_at = rng.integers(boundaries[0], boundaries[-1], n_rows)
+    gmv = np.round(rng.gamma(2.0, 75_000, n_rows), 2)
+    gmv[rng.random(n_rows) < 0.01] = np.nan  # gmv_shipment NULL
+    status = rng.choice(np.array([100, 300, 400, 500, 702, 703]), n_rows)
+    return users, created_at, gmv, status
+
+
+# Function to compare the streamed grid with a straightforward pandas groupby on random orders
+def verify_cohort(n_rows=300_000, n_users=20_000, n_months=24, batch=50_000, seed=9):
+    boundaries = month_boundaries(2026, 6, n_months)
+    users, created_at, gmv, status = _synthetic_orders(boundaries, n_rows, n_users, seed)
+
+    grid = CohortGrid(boundaries)
+    for offset in range(0, n_rows, batch):
+        grid.push(*(column[offset:offset + batch] for column in (users, created_at, gmv, status)))
+    grids = grid.result()
+
+    orders = pd.DataFrame({'user': users, 'month': np.searchsorted(boundaries, created_at, side='right') - 1,
+                           'gmv': np.where(np.isin(status, GMV_FINAL_STATUSES), np.nan_to_num(gmv), 0.0)})
+    orders['cohort'] = orders.groupby('user')['month'].transform('min')
+    orders['age'] = orders['month'] - orders['cohort']
+    cells = orders.groupby(['cohort', 'age']).agg(users=('user', 'nunique'), orders=('user', 'size'), gmv=('gmv', 'sum'))
+
+    expected = {name: np.zeros((n_months, n_months)) for name in ('users', 'orders', 'gmv')}
+    for (cohort, age), row in cells.iterrows():
+        for name in expected:
+            expected[name][cohort, age] = row[name]
+    return all(np.allclose(grids[name], expected[name]) for name in expected) and grid.total_rows == n_rows
+
+
+# Function to time the NumPy part of the grid (tanpa transfer dari warehouse) on n_rows synthetic orders
+def benchmark_grid(n_rows=20_000_000, n_users=2_000_000, n_months=24, batch=1_000_000, seed=9):
+    boundaries = month_boundaries(2026, 6, n_months)
+    users, created_at, gmv, status = _synthetic_orders(boundaries, n_rows, n_users, seed)
+    started = time.perf_counter()
+    grid = CohortGrid(boundaries)
+    for offset in range(0, n_rows, batch):
+        grid.push(*(column[offset:offset + batch] for column in (users, created_at, gmv, status)))
+    grid.result()
+    return time.perf_counter() - started
+
+
+# Command line: python -m utils.cohort [verify | bench [ROWS]]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    if command == 'verify':
+        ok = verify_cohort()
+        print("OK" if ok else "MISMATCH")
+        sys.exit(0 if ok else 1)
+    elif command == 'bench':
+        n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000_000
+        print(f"{n_rows:,} orders -> {COHORT_MAX_MONTHS}x{COHORT_MAX_MONTHS} grid in {benchmark_grid(n_rows):.2f}s")
+    else:
+        sys.exit(f"Unknown command: {command}")
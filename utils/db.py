@@ -0,0 +1,298 @@
+# ----- Import Library -----
+import json
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import contextmanager
+
+from utils.flight import get_flight, get_gate
+from utils.perf import annotate_query, span
+from utils.startup import get_secrets
+
+# ===== Pool Settings =====
+# Satu pool per proses Streamlit, dipakai bersama oleh semua session & halaman
+POOL_MAX_SIZE = 4             # Maksimal koneksi terbuka ke warehouse
+POOL_CHECKOUT_TIMEOUT = 60    # Detik menunggu koneksi kosong sebelum error
+POOL_IDLE_TIMEOUT = 15 * 60   # Koneksi idle lebih lama dari ini akan ditutup
+POOL_HEALTH_CHECK_AFTER = 60  # Koneksi idle lebih lama dari ini dicek dulu dengan SELECT 1
+
+# ===== Query Settings =====
+# Bind parameter dikirim ke server (qmark '?'), jadi teks SQL sama untuk setiap window dan result cache Snowflake bisa dipakai ulang
+PARAMSTYLE = 'qmark'
+QUERY_TAG_APP = 'orderfaz-sales-analytics'
+
+
+# Function to open a new Snowflake connection from st.secrets (dibaca sekali per proses, connector di-import saat koneksi pertama)
+def snowflake_connect():
+    import snowflake.connector
+
+    secrets = get_secrets("snowflake")
+    return snowflake.connector.connect(
+        user=secrets["user"],
+        password=secrets["password"],
+        account=secrets["account"],
+        warehouse=secrets["warehouse"],
+        database=secrets["database"],
+        schema=secrets["schema"],
+        client_session_keep_alive=False,
+        paramstyle=PARAMSTYLE
+    )
+
+
+class ConnectionPool:
+    """Bounded, lazily-filled pool of Snowflake connections.
+
+    Connections are only opened when a query actually needs one, idle
+    connections are health-checked before reuse and closed once they have
+    been idle for longer than ``idle_timeout``.
+    """
+
+    def __init__(self, connect, max_size=POOL_MAX_SIZE, checkout_timeout=POOL_CHECKOUT_TIMEOUT,
+                 idle_timeout=POOL_IDLE_TIMEOUT, health_check_after=POOL_HEALTH_CHECK_AFTER):
+        self._connect = connect
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.idle_timeout = idle_timeout
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connection, last_used)
+        self._size = 0
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'connects': 0,
+            'reconnects': 0,
+            'reaped': 0,
+            'errors': 0,
+        }
+
+    # ----- Internal Helpers -----
+    def _is_healthy(self, connection, last_used):
+        if connection.is_closed():
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            cur = connection.cursor()
+            try:
+                cur.execute("SELECT 1")
+                cur.fetchone()
+            finally:
+                cur.close()
+            return True
+        except Exception:
+            return False
+
+    def _close_quietly(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _reap_locked(self):
+        # Tutup koneksi idle yang sudah melewati idle_timeout (yang paling lama ada di kiri)
+        now = time.monotonic()
+        reaped = []
+        while self._idle and now - self._idle[0][1] > self.idle_timeout:
+            reaped.append(self._idle.popleft()[0])
+            self._size -= 1
+            self._stats['reaped'] += 1
+        return reaped
+
+    # ----- Public API -----
+    def acquire(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        waited_from = None
+
+        with self._cond:
+            reaped = self._reap_locked()
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    connection, last_used = None, None
+                    self._size += 1
+                    break
+                if waited_from is None:
+                    waited_from = time.monotonic()
+                    self._stats['waits'] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"Tidak ada koneksi Snowflake yang tersedia dalam {self.checkout_timeout} detik.")
+                self._cond.wait(remaining)
+
+            self._in_use += 1
+            self._stats['checkouts'] += 1
+            if waited_from is not None:
+                self._stats['wait_seconds'] += time.monotonic() - waited_from
+
+        for stale in reaped:
+            self._close_quietly(stale)
+
+        try:
+            if connection is not None and not self._is_healthy(connection, last_used):
+                self._close_quietly(connection)
+                connection = None
+                with self._cond:
+                    self._stats['reconnects'] += 1
+            if connection is None:
+                with span('connect'):
+                    connection = self._connect()
+                with self._cond:
+                    self._stats['connects'] += 1
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._stats['errors'] += 1
+                self._cond.notify()
+            raise
+
+        return connection
+
+    def release(self, connection, broken=False):
+        with self._cond:
+            self._in_use -= 1
+            if broken or connection.is_closed():
+                self._size -= 1
+            else:
+                self._idle.append((connection, time.monotonic()))
+                connection = None
+            self._cond.notify()
+
+        if connection is not None:
+            self._close_quietly(connection)
+
+    @contextmanager
+    def connection(self):
+        connection = self.acquire()
+        broken = False
+        try:
+            yield connection
+        except Exception:
+            broken = connection.is_closed()
+            with self._cond:
+                self._stats['errors'] += 1
+            raise
+        finally:
+            # Juga untuk BaseException (rerun/stop Streamlit, KeyboardInterrupt), supaya slot pool tidak bocor
+            self.release(connection, broken=broken)
+
+    def reap_idle(self):
+        with self._cond:
+            reaped = self._reap_locked()
+        for stale in reaped:
+            self._close_quietly(stale)
+        return len(reaped)
+
+    def close_all(self):
+        with self._cond:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'max_size': self.max_size,
+            }
+
+
+# ===== Process-wide Pool =====
+_pool = None
+_pool_lock = threading.Lock()
+
+
+# Function to get the shared pool (created lazily, no connection is opened here)
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(snowflake_connect)
+    return _pool
+
+
+# ===== Query Tags =====
+# QUERY_TAG terakhir per koneksi, supaya ALTER SESSION hanya dikirim kalau tag berubah
+_session_tags = weakref.WeakKeyDictionary()
+_session_tags_lock = threading.Lock()
+
+
+# Function to build the QUERY_TAG for a page/report (dipakai untuk filter QUERY_HISTORY per halaman)
+def make_query_tag(page, report=None):
+    tag = {'app': QUERY_TAG_APP, 'page': page}
+    if report is not None:
+        tag['report'] = report
+    return json.dumps(tag, separators=(',', ':'))
+
+
+DEFAULT_QUERY_TAG = make_query_tag('default')
+
+
+# Function to set the QUERY_TAG of a pooled connection before running a query
+def set_query_tag(connection, cur, query_tag=None):
+    query_tag = query_tag or DEFAULT_QUERY_TAG
+    with _session_tags_lock:
+        if _session_tags.get(connection) == query_tag:
+            return
+    # ALTER SESSION tidak menerima bind parameter, tag di-escape sebagai string literal
+    escaped = query_tag.replace("\\", "\\\\").replace("'", "\\'")
+    cur.execute(f"ALTER SESSION SET QUERY_TAG = '{escaped}'")
+    with _session_tags_lock:
+        _session_tags[connection] = query_tag
+
+
+# Function to run a query on a pooled connection and fetch the first row
+# Slot warehouse (utils/flight.py) diambil sebelum koneksi, jadi query yang antre tidak memegang koneksi
+def fetchone(query, params=None, query_tag=None):
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, query_tag)
+            with span('query', query_tag=query_tag) as record:
+                cur.execute(query, params)
+                row = cur.fetchone()
+                annotate_query(record, cur, 0 if row is None else 1)
+            return row
+        finally:
+            cur.close()
+
+
+# Function to run a query on a pooled connection and fetch all rows
+# coalesce=True: query + bind yang sama dan sedang berjalan (session lain) tidak dikirim lagi, hasilnya dipakai bersama
+def fetchall(query, params=None, query_tag=None, coalesce=False):
+    if coalesce:
+        return get_flight().do(('fetchall', query, tuple(params or ())),
+                               lambda: fetchall(query, params, query_tag=query_tag))
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, query_tag)
+            with span('query', query_tag=query_tag) as record:
+                cur.execute(query, params)
+                rows = cur.fetchall()
+                annotate_query(record, cur, len(rows))
+            return rows
+        finally:
+            cur.close()
+
+
+# Function to run one statement on an open cursor inside a "query" span (dipakai job maintenance yang memegang cursor sendiri)
+def traced_execute(cur, query, params=None, **attrs):
+    with span('query', **attrs) as record:
+        cur.execute(query, params)
+        record['query_id'] = getattr(cur, 'sfqid', None)
+        record['rows'] = getattr(cur, 'rowcount', None)
+    return cur
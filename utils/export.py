@@ -0,0 +1,116 @@
+# ----- Import Library -----
+from io import BytesIO
+
+from utils.perf import span
+from utils.startup import lazy_import
+from utils.store import get_store
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+xlsxwriter = lazy_import('xlsxwriter')
+
+# ===== Export Settings =====
+# File download dibuat hanya saat diminta (bukan di setiap Submit/rerun) dan byte-nya disimpan di report store
+# per report key + format, jadi download berikutnya (session mana pun) tidak membangun file lagi.
+# Excel ditulis baris per baris dengan mode constant_memory xlsxwriter; Parquet & CSV hanya tabel utama.
+EXPORT_FORMATS = {
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'CSV': ('csv', 'text/csv'),
+}
+
+# Nama sheet untuk setiap tabel report (urutan = urutan sheet)
+SHEET_NAMES = {
+    'df': 'Periode',
+    'prev_df': 'Periode Sebelumnya',
+    'weeks_df': 'Bulan Ini',
+    'prev_weeks_df': 'Bulan Lalu',
+    'cohort_retention': 'Cohort Retensi %',
+    'cohort_users': 'Cohort User Aktif',
+    'cohort_gmv': 'Cohort GMV',
+    'metrics': 'Ringkasan',
+    'raw_df': 'Raw Mingguan',
+}
+
+
+# Function to flatten the report metrics into a two-column sheet (month_users dipecah jadi AU, TU, R & N 1 bulan)
+def _metrics_frame(metrics):
+    rows = []
+    for name, value in metrics.items():
+        if name == 'month_users':
+            rows += zip(('month_active_user', 'month_trx_user', 'month_r_trx_user', 'month_n_trx_user'), value)
+        else:
+            rows.append((name, value))
+    return pd.DataFrame(rows, columns=['Metric', 'Nilai'])
+
+
+# Function to list the sheets of a report as (sheet name, DataFrame), tabel utama lebih dulu
+def report_sheets(report):
+    tables = dict(report['tables'])
+    if report['metrics']:
+        tables['metrics'] = _metrics_frame(report['metrics'])
+    return [(SHEET_NAMES.get(name, name), tables[name]) for name in SHEET_NAMES if name in tables]
+
+
+def _cell(value):
+    if isinstance(value, np.generic):
+        value = value.item()
+    return None if isinstance(value, float) and np.isnan(value) else value
+
+
+# Function to stream sheets into an .xlsx (path atau file-like) with xlsxwriter constant_memory, baris demi baris
+def write_xlsx(sheets, target):
+    workbook = xlsxwriter.Workbook(target, {'constant_memory': True})
+    header_format = workbook.add_format({'bold': True})
+    for sheet_name, frame in sheets:
+        worksheet = workbook.add_worksheet(sheet_name)
+        for column, name in enumerate(frame.columns):
+            worksheet.set_column(column, column, max(len(str(name)) + 2, 12))
+        worksheet.write_row(0, 0, [str(name) for name in frame.columns], header_format)
+        for row, values in enumerate(frame.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row, 0, [_cell(value) for value in values])
+    workbook.close()
+
+
+# Function to write a report in one format to a path or file-like object
+def write_report(report, fmt, target):
+    sheets = report_sheets(report)
+    with span('export', format=fmt):
+        if fmt == 'xlsx':
+            write_xlsx(sheets, target)
+        elif fmt == 'parquet':
+            sheets[0][1].to_parquet(target, index=False)
+        elif fmt == 'csv':
+            sheets[0][1].to_csv(target, index=False)
+        else:
+            raise ValueError(f"Unknown export format: {fmt}")
+
+
+# Function to get the export bytes of a report, dibangun sekali per report key & format
+def export_bytes(key, report, fmt):
+    store, export_key = get_store(), f"export_{fmt}_{key}"
+    data = store.get(export_key)
+    if data is None:
+        output = BytesIO()
+        write_report(report, fmt, output)
+        data = store.put(export_key, output.getvalue())
+    return data
+
+
+# Function to render the format choice + lazy download button of a report on a page
+def download_section(key, report, file_stem):
+    import streamlit as st  # hanya halaman yang butuh streamlit, batch CLI cukup write_report
+    label = st.radio("Format download", list(EXPORT_FORMATS), horizontal=True, key=f"export_format_{key}")
+    extension, mime = EXPORT_FORMATS[label]
+    export_key = f"export_{extension}_{key}"
+
+    # File hanya dibangun setelah tombol ini diklik (atau sudah ada di report store)
+    if get_store().get(export_key) is None and not st.button(f"Siapkan file {label}", key=f"prepare_{export_key}"):
+        return
+    with st.spinner(f"Membuat file {label}..."):
+        data = export_bytes(key, report, extension)
+    st.download_button(label=f'Download as {label}',
+                       data=data,
+                       file_name=f"{file_stem}.{extension}",
+                       mime=mime,
+                       key=f"download_{export_key}")
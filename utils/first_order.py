@@ -0,0 +1,203 @@
+# ----- Import Library -----
+import random
+import sqlite3
+import sys
+import threading
+from datetime import date
+
+from utils.db import get_pool, make_query_tag, set_query_tag, traced_execute
+from utils.flight import get_gate
+from utils.metrics import SECONDS_PER_DAY, build_bucket_rn_query, build_buckets
+
+# ===== First-Order Index =====
+# user_first_orders : created_by -> timestamp order pertama (untuk R Transacting User)
+# user_order_days   : created_by x hari (epoch day UTC) -> order pertama & terakhir di hari itu
+#                     (set periode aktif yang compact, untuk cek "punya order di preStart..preEnd")
+# Index di-refresh incremental dari watermark MAX(last_at), jadi cukup dijalankan setelah load data 00:00.
+
+CREATE_INDEX_STATEMENTS = [
+    """
+    CREATE TABLE IF NOT EXISTS user_first_orders AS
+    SELECT created_by, created_at AS first_order_at
+    FROM shipment_orders
+    WHERE FALSE
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_order_days CLUSTER BY (order_day) AS
+    SELECT created_by, FLOOR(created_at / 86400) AS order_day, created_at AS first_at, created_at AS last_at
+    FROM shipment_orders
+    WHERE FALSE
+    """,
+]
+
+WATERMARK_QUERY = "SELECT COALESCE(MAX(last_at), 0) FROM user_order_days"
+
+INDEX_QUERY_TAG = make_query_tag('maintenance', 'first_order_index')
+
+# Order di hari yang sama dengan watermark ikut di-merge ulang (idempotent karena pakai LEAST/GREATEST)
+MERGE_FIRST_ORDERS = """
+    MERGE INTO user_first_orders f
+    USING (
+        SELECT created_by, MIN(created_at) AS first_order_at
+        FROM shipment_orders
+        WHERE created_at >= ?
+        GROUP BY created_by
+    ) n
+    ON f.created_by = n.created_by
+    WHEN MATCHED AND n.first_order_at < f.first_order_at THEN UPDATE SET first_order_at = n.first_order_at
+    WHEN NOT MATCHED THEN INSERT (created_by, first_order_at) VALUES (n.created_by, n.first_order_at)
+"""
+
+MERGE_ORDER_DAYS = """
+    MERGE INTO user_order_days d
+    USING (
+        SELECT created_by, FLOOR(created_at / 86400) AS order_day, MIN(created_at) AS first_at, MAX(created_at) AS last_at
+        FROM shipment_orders
+        WHERE created_at >= ?
+        GROUP BY created_by, FLOOR(created_at / 86400)
+    ) n
+    ON d.created_by = n.created_by AND d.order_day = n.order_day
+    WHEN MATCHED THEN UPDATE SET first_at = LEAST(d.first_at, n.first_at), last_at = GREATEST(d.last_at, n.last_at)
+    WHEN NOT MATCHED THEN INSERT (created_by, order_day, first_at, last_at)
+        VALUES (n.created_by, n.order_day, n.first_at, n.last_at)
+"""
+
+
+# Function to create (if needed) and incrementally refresh the index, returns the new watermark
+def refresh_index():
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, INDEX_QUERY_TAG)
+            for statement in CREATE_INDEX_STATEMENTS:
+                cur.execute(statement)
+            cur.execute(WATERMARK_QUERY)
+            watermark = int(cur.fetchone()[0])
+
+            # user_first_orders dulu, user_order_days terakhir karena tabel itu yang menentukan watermark
+            traced_execute(cur, MERGE_FIRST_ORDERS, (watermark,), query_tag=INDEX_QUERY_TAG, statement='merge_first_orders')
+            traced_execute(cur, MERGE_ORDER_DAYS, (watermark,), query_tag=INDEX_QUERY_TAG, statement='merge_order_days')
+
+            cur.execute(WATERMARK_QUERY)
+            return int(cur.fetchone()[0])
+        finally:
+            cur.close()
+
+
+# Function to drop and rebuild the whole index from shipment_orders
+def rebuild_index():
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, INDEX_QUERY_TAG)
+            cur.execute("DROP TABLE IF EXISTS user_first_orders")
+            cur.execute("DROP TABLE IF EXISTS user_order_days")
+        finally:
+            cur.close()
+    return refresh_index()
+
+
+_refreshed_on = None
+_refresh_lock = threading.Lock()
+
+
+# Function to make sure the index was refreshed today (sekali per proses per hari, setelah update 00:00)
+def ensure_index_fresh():
+    global _refreshed_on
+    today = date.today()
+    if _refreshed_on == today:
+        return
+    with _refresh_lock:
+        if _refreshed_on != today:
+            refresh_index()
+            _refreshed_on = today
+
+
+# ===== Verification on Synthetic Data =====
+# Query R/N asli (correlated EXISTS) dari dashboard, dipakai sebagai acuan
+REFERENCE_RN_QUERY = """
+    SELECT
+        COUNT(DISTINCT(CASE WHEN EXISTS (
+            SELECT 1 FROM shipment_orders so3
+            WHERE so3.created_by = so.created_by
+              AND so3.created_at < {start_timestamp}
+        ) THEN so.created_by END)) AS r_trx_user,
+        COUNT(DISTINCT(CASE WHEN NOT EXISTS (
+            SELECT 1 FROM shipment_orders so2
+            WHERE so2.created_by = so.created_by
+              AND so2.created_at >= {preStart_timestamp} AND so2.created_at <= {preEnd_timestamp}
+        ) THEN so.created_by END)) AS n_trx_user
+    FROM shipment_orders so
+    WHERE so.created_at >= {start_timestamp} AND so.created_at <= {end_timestamp};
+"""
+
+
+# Function to build the index tables in a local sqlite database straight from the raw rows
+def _build_local_index(conn, orders):
+    first_orders = {}
+    order_days = {}
+    for created_by, created_at in orders:
+        first_orders[created_by] = min(created_at, first_orders.get(created_by, created_at))
+        key = (created_by, created_at // SECONDS_PER_DAY)
+        first_at, last_at = order_days.get(key, (created_at, created_at))
+        order_days[key] = (min(first_at, created_at), max(last_at, created_at))
+
+    conn.execute("CREATE TABLE user_first_orders (created_by INTEGER, first_order_at INTEGER)")
+    conn.execute("CREATE TABLE user_order_days (created_by INTEGER, order_day INTEGER, first_at INTEGER, last_at INTEGER)")
+    conn.executemany("INSERT INTO user_first_orders VALUES (?, ?)", first_orders.items())
+    conn.executemany("INSERT INTO user_order_days VALUES (?, ?, ?, ?)",
+                     [(user, day, first_at, last_at) for (user, day), (first_at, last_at) in order_days.items()])
+
+
+# Function to compare the index-based R/N counts with the correlated EXISTS query on synthetic data
+def verify_against_exists(n_users=300, n_orders=6000, n_windows=60, seed=7):
+    rng = random.Random(seed)
+    origin = 1_700_000_000
+    span = 120 * SECONDS_PER_DAY
+    orders = [(rng.randrange(n_users), origin + rng.randrange(span)) for _ in range(n_orders)]
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE shipment_orders (created_by INTEGER, created_at INTEGER, status INTEGER, "
+                 "gmv_shipment REAL, transaction_value REAL)")
+    conn.executemany("INSERT INTO shipment_orders VALUES (?, ?, 500, 0, 0)", orders)
+    conn.execute("CREATE INDEX so_created_by ON shipment_orders (created_by, created_at)")
+    _build_local_index(conn, orders)
+
+    # Window acak: dari beberapa jam (di dalam 1 hari) sampai beberapa minggu, batas detik sembarang
+    bounds = []
+    for _ in range(n_windows):
+        length = rng.choice([rng.randrange(1, SECONDS_PER_DAY), rng.randrange(SECONDS_PER_DAY, 40 * SECONDS_PER_DAY)])
+        start = origin + rng.randrange(span)
+        bounds.append((start, start + length))
+
+    indexed = {bucket: (r, n) for _, bucket, r, n in conn.execute(*build_bucket_rn_query(build_buckets('check', bounds)))}
+
+    mismatches = []
+    for i, (start_timestamp, end_timestamp) in enumerate(bounds):
+        c = end_timestamp - start_timestamp
+        expected = conn.execute(REFERENCE_RN_QUERY.format(
+            start_timestamp=start_timestamp, end_timestamp=end_timestamp,
+            preStart_timestamp=start_timestamp - c, preEnd_timestamp=end_timestamp - c)).fetchone()
+        actual = indexed.get(i, (0, 0))
+        if tuple(expected) != tuple(actual):
+            mismatches.append((start_timestamp, end_timestamp, tuple(expected), tuple(actual)))
+
+    conn.close()
+    return mismatches
+
+
+# Command line: python -m utils.first_order [refresh|rebuild|verify]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'refresh'
+    if command == 'refresh':
+        print(f"Index refreshed, watermark = {refresh_index()}")
+    elif command == 'rebuild':
+        print(f"Index rebuilt, watermark = {rebuild_index()}")
+    elif command == 'verify':
+        mismatches = verify_against_exists()
+        for mismatch in mismatches:
+            print("MISMATCH (start, end, exists, index):", mismatch)
+        print("OK" if not mismatches else f"{len(mismatches)} window(s) differ")
+        sys.exit(1 if mismatches else 0)
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,167 @@
+# ----- Import Library -----
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# ===== Admission Settings =====
+# Maksimal query report & maintenance (rollup, index, sketch) yang berjalan bersamaan di warehouse untuk satu proses
+# Streamlit (semua session). Semua checkout koneksi lewat gate ini, jadi selama limit <= POOL_MAX_SIZE
+# query tidak pernah menunggu koneksi pool.
+# Query di atas batas ini antre FIFO, posisi antrean dikirim ke UI lewat queue_feedback().
+MAX_WAREHOUSE_QUERIES = int(os.environ.get("ORDERFAZ_MAX_WAREHOUSE_QUERIES", 4))  # Default = POOL_MAX_SIZE (utils/db.py)
+QUEUE_POLL_SECONDS = 0.5  # Interval cek posisi antrean saat menunggu
+
+# ===== Queue Feedback =====
+# Callback per thread (script thread Streamlit), dipanggil dengan pesan saat request harus menunggu
+_feedback = threading.local()
+
+
+@contextmanager
+def queue_feedback(callback):
+    previous = getattr(_feedback, 'callback', None)
+    _feedback.callback = callback
+    try:
+        yield
+    finally:
+        _feedback.callback = previous
+
+
+def _notify(message):
+    callback = getattr(_feedback, 'callback', None)
+    if callback is not None:
+        callback(message)
+
+
+class AdmissionGate:
+    """FIFO counting semaphore for warehouse queries that reports queue positions."""
+
+    def __init__(self, limit=MAX_WAREHOUSE_QUERIES):
+        self.limit = limit
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._tickets = itertools.count()
+        self._running = 0
+        self._stats = {'admitted': 0, 'queued': 0, 'wait_seconds': 0.0, 'max_queue': 0}
+
+    def acquire(self):
+        ticket = next(self._tickets)
+        waited_from, last_position = None, None
+        with self._cond:
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    if self._running < self.limit and self._queue[0] == ticket:
+                        self._queue.popleft()
+                        self._running += 1
+                        self._stats['admitted'] += 1
+                        if waited_from is not None:
+                            self._stats['wait_seconds'] += time.monotonic() - waited_from
+                        self._cond.notify_all()
+                        return
+                    position = self._queue.index(ticket) + 1
+                    if waited_from is None:
+                        waited_from = time.monotonic()
+                        self._stats['queued'] += 1
+                        self._stats['max_queue'] = max(self._stats['max_queue'], len(self._queue))
+                # Callback UI dipanggil di luar lock
+                if position != last_position:
+                    _notify(f"Warehouse sedang sibuk (maks. {self.limit} query bersamaan), antrean ke-{position}")
+                    last_position = position
+                with self._cond:
+                    self._cond.wait(QUEUE_POLL_SECONDS)
+        except BaseException:
+            # Session dihentikan/rerun saat menunggu: keluar dari antrean
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                self._cond.notify_all()
+            raise
+
+    def release(self):
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        with self._cond:
+            return {**self._stats, 'running': self._running, 'waiting': len(self._queue), 'limit': self.limit}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces identical in-flight calls: the first caller executes, later callers wait for its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {'executed': 0, 'coalesced': 0, 'failed': 0}
+
+    def do(self, key, fn):
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                    self._stats['executed'] += 1
+                else:
+                    self._stats['coalesced'] += 1
+
+            if leader:
+                try:
+                    call.result = fn()
+                except BaseException as exc:
+                    call.error = exc
+                    with self._lock:
+                        self._stats['failed'] += 1
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                return call.result
+
+            _notify("Query yang sama sedang dijalankan session lain, menunggu hasilnya...")
+            call.done.wait()
+            if call.error is None:
+                return call.result
+            if isinstance(call.error, Exception):
+                raise call.error
+            # Session pemimpin dihentikan (rerun/stop Streamlit), bukan query yang gagal: jalankan ulang
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'in_flight': len(self._calls)}
+
+
+# ===== Process-wide Gate & Single-flight =====
+_gate = AdmissionGate()
+_flight = SingleFlight()
+
+
+# Function to get the shared warehouse admission gate
+def get_gate():
+    return _gate
+
+
+# Function to get the shared single-flight group
+def get_flight():
+    return _flight
@@ -0,0 +1,255 @@
+# ----- Import Library -----
+import math
+import os
+import sys
+import threading
+import zlib
+from datetime import date, datetime, time as dt_time, timedelta
+from pathlib import Path
+
+from utils.db import get_pool, make_query_tag, set_query_tag, traced_execute
+from utils.flight import get_gate
+from utils.rollup import utc_offset_seconds
+from utils.startup import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# ===== HyperLogLog Settings =====
+# Presisi p=14 -> m=16384 register (1 byte per register, ~16 KB per hari per metric sebelum dikompres).
+# Standard error HLL = 1.04 / sqrt(m) = 0.81%; ~95% estimasi dalam +/-1.6% dan ~99.7% dalam +/-2.4% dari nilai exact.
+# Untuk cardinality kecil (< 2.5m) dipakai linear counting yang praktis exact.
+HLL_PRECISION = 14
+HLL_STANDARD_ERROR = 1.04 / math.sqrt(1 << HLL_PRECISION)
+
+SKETCH_DIR = Path(os.environ.get("ORDERFAZ_SKETCH_DIR", Path(__file__).resolve().parent.parent / ".cache" / "hll"))
+# Dinaikkan kalau query sumber atau hashing id berubah: sketch versi lama tidak dibaca lagi dan dibangun ulang
+SKETCH_VERSION = 2
+
+# Sumber user per hari untuk setiap metric distinct
+SKETCH_SOURCES = {
+    'active_user': ("user_logs", "user_id"),
+    'trx_user': ("shipment_orders", "created_by"),
+}
+
+SKETCH_SOURCE_QUERY = """
+    SELECT DISTINCT created_at - MOD(created_at + ?, 86400) AS day_start, {column} AS user_id
+    FROM {table}
+    WHERE created_at >= ? AND created_at <= ? AND {column} IS NOT NULL
+"""
+
+SKETCH_QUERY_TAG = make_query_tag('maintenance', 'hll_sketches')
+
+# Function to hash user ids to uint64 (integer id pakai splitmix64, selain itu pakai hash pandas)
+# Id numerik di-cast ke int64 dulu (batch dengan NULL jadi float64/object di pandas), supaya hash user yang sama
+# tidak bergantung pada tipe batch-nya. NULL diabaikan, sama seperti COUNT(DISTINCT).
+def hash_ids(ids):
+    ids = np.asarray(ids)
+    if ids.dtype.kind == 'f':
+        ids = ids[~np.isnan(ids)].astype(np.int64)
+    elif ids.dtype.kind == 'O':
+        ids = ids[pd.notna(ids)]
+        if pd.api.types.infer_dtype(ids, skipna=False) in ('integer', 'decimal', 'floating', 'mixed-integer-float'):
+            ids = ids.astype(np.int64)
+    if ids.dtype.kind in 'iu':
+        with np.errstate(over='ignore'):
+            x = ids.astype(np.int64).view(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+            x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+            x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+            return x ^ (x >> np.uint64(31))
+    return pd.util.hash_array(ids.astype(str).astype(object))
+
+
+# Function to count leading zero bits of every uint64 (x tidak boleh 0)
+def _clz64(x):
+    zeros = np.zeros(x.shape, dtype=np.uint8)
+    for shift in (32, 16, 8, 4, 2, 1):
+        small = x < (np.uint64(1) << np.uint64(64 - shift))
+        zeros[small] += shift
+        x = np.where(small, x << np.uint64(shift), x)
+    return zeros
+
+
+class HyperLogLog:
+    """HyperLogLog sketch backed by a NumPy uint8 register array."""
+
+    def __init__(self, registers=None, precision=HLL_PRECISION):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registers = np.zeros(self.m, dtype=np.uint8) if registers is None else registers
+
+    def add_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if hashes.size == 0:
+            return self
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        # Bit sentinel supaya rank maksimal 64 - p + 1
+        remaining = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = _clz64(remaining) + 1
+        np.maximum.at(self.registers, index, rank)
+        return self
+
+    def add(self, ids):
+        return self.add_hashes(hash_ids(ids))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    @classmethod
+    def union(cls, sketches, precision=HLL_PRECISION):
+        sketches = list(sketches)
+        if not sketches:
+            return cls(precision=precision)
+        return cls(np.maximum.reduce([sketch.registers for sketch in sketches]), precision)
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return m * math.log(m / zeros)  # linear counting untuk cardinality kecil
+        return float(raw)
+
+    # Format binary: 1 byte presisi + register yang dikompres zlib
+    def to_bytes(self):
+        return bytes([self.precision]) + zlib.compress(self.registers.tobytes(), 6)
+
+    @classmethod
+    def from_bytes(cls, payload):
+        precision = payload[0]
+        registers = np.frombuffer(zlib.decompress(payload[1:]), dtype=np.uint8).copy()
+        return cls(registers, precision)
+
+
+# ===== Daily Sketch Store =====
+def _sketch_path(metric, day):
+    return SKETCH_DIR / f"v{SKETCH_VERSION}" / metric / f"{day.isoformat()}.hll"
+
+
+# Function to load the sketch of one day, None kalau belum dibangun
+def load_sketch(metric, day):
+    try:
+        return HyperLogLog.from_bytes(_sketch_path(metric, day).read_bytes())
+    except FileNotFoundError:
+        return None
+
+
+def save_sketch(metric, day, sketch):
+    path = _sketch_path(metric, day)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_bytes(sketch.to_bytes())
+    os.replace(tmp_path, path)
+
+
+# Function to list days (local) fully covered by an epoch window
+def window_days(start_timestamp, end_timestamp):
+    first = datetime.fromtimestamp(start_timestamp).date()
+    last = datetime.fromtimestamp(end_timestamp).date()
+    return [first + timedelta(days=i) for i in range((last - first).days + 1)]
+
+
+# Function to estimate distinct users for any day-aligned window by merging daily sketches
+# Hasil None kalau ada hari yang belum punya sketch (caller pakai query exact)
+def approx_distinct(metric, start_timestamp, end_timestamp):
+    sketches = []
+    for day in window_days(start_timestamp, end_timestamp):
+        if day >= date.today():
+            continue  # data hari ini belum di-load
+        sketch = load_sketch(metric, day)
+        if sketch is None:
+            return None
+        sketches.append(sketch)
+    return int(round(HyperLogLog.union(sketches).estimate()))
+
+
+# Function to build daily sketches from Snowflake for every day between start_date and end_date
+def build_sketches(metric, start_date, end_date):
+    table, column = SKETCH_SOURCES[metric]
+    start_timestamp = int(datetime.combine(start_date, dt_time.min).timestamp())
+    end_timestamp = int(datetime.combine(end_date, dt_time.max).timestamp())
+    params = (utc_offset_seconds(), start_timestamp, end_timestamp)
+
+    sketches = {day: HyperLogLog() for day in window_days(start_timestamp, end_timestamp)}
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, SKETCH_QUERY_TAG)
+            traced_execute(cur, SKETCH_SOURCE_QUERY.format(table=table, column=column), params,
+                           query_tag=SKETCH_QUERY_TAG, statement=metric)
+            for batch in cur.fetch_pandas_batches():
+                batch.columns = [name.lower() for name in batch.columns]
+                for day_start, users in batch.groupby('day_start')['user_id']:
+                    sketches[datetime.fromtimestamp(int(day_start)).date()].add(users.to_numpy())
+        finally:
+            cur.close()
+
+    for day, sketch in sketches.items():
+        save_sketch(metric, day, sketch)
+    return len(sketches)
+
+
+# Function to build missing sketches up to yesterday (hari yang sudah lewat tidak berubah lagi)
+def refresh_sketches(backfill_days=120, today=None):
+    today = today or date.today()
+    built = 0
+    for metric in SKETCH_SOURCES:
+        days = [today - timedelta(days=i) for i in range(1, backfill_days + 1)]
+        missing = sorted(day for day in days if not _sketch_path(metric, day).exists())
+        if missing:
+            built += build_sketches(metric, missing[0], missing[-1])
+    return built
+
+
+_refreshed_on = None
+_refresh_lock = threading.Lock()
+
+
+# Function to make sure yesterday's sketches exist (sekali per proses per hari, setelah update 00:00)
+def ensure_sketches_fresh():
+    global _refreshed_on
+    today = date.today()
+    if _refreshed_on == today:
+        return
+    with _refresh_lock:
+        if _refreshed_on != today:
+            refresh_sketches(today=today)
+            _refreshed_on = today
+
+
+# ===== Error Verification =====
+# Function to compare HLL estimates with exact distinct counts on synthetic daily user sets
+def verify_error(n_days=60, users_per_day=(50, 40_000), windows=40, seed=11):
+    rng = np.random.default_rng(seed)
+    population = 2_000_000
+    daily = [rng.choice(population, size=rng.integers(*users_per_day), replace=False) for _ in range(n_days)]
+    sketches = [HyperLogLog().add(users) for users in daily]
+
+    # Sketch harus tetap sama setelah disimpan dalam format binary
+    roundtrip = [HyperLogLog.from_bytes(sketch.to_bytes()) for sketch in sketches]
+
+    errors = []
+    for _ in range(windows):
+        first = int(rng.integers(0, n_days))
+        last = int(rng.integers(first, n_days))
+        exact = len(np.unique(np.concatenate(daily[first:last + 1])))
+        estimate = HyperLogLog.union(roundtrip[first:last + 1]).estimate()
+        errors.append((estimate - exact) / exact)
+    return np.abs(np.array(errors))
+
+
+# Command line: python -m utils.hll [refresh | verify]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'refresh'
+    if command == 'refresh':
+        print(f"{refresh_sketches()} daily sketch(es) built")
+    elif command == 'verify':
+        errors = verify_error()
+        bound = 3 * HLL_STANDARD_ERROR
+        print(f"mean error {errors.mean():.3%}, max error {errors.max():.3%}, bound {bound:.3%}")
+        sys.exit(0 if errors.max() <= bound else 1)
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,216 @@
+# ----- Import Library -----
+import itertools
+import json
+import math
+import re
+import sqlite3
+import sys
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+from decimal import Decimal
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.first_order import MERGE_FIRST_ORDERS, MERGE_ORDER_DAYS
+
+# ===== Local Snowflake Stand-in =====
+# Database sqlite lokal yang menerima query yang sama dengan dashboard (bind qmark '?', CTE VALUES, CASE, COUNT DISTINCT),
+# untuk benchmark tanpa menyentuh warehouse produksi. Perbedaan dialek ditangani di _translate():
+#   ::NUMERIC -> * 1.0 (pembagian desimal), CLUSTER BY dihapus, ALTER SESSION diabaikan,
+#   MERGE index first-order diganti INSERT ... ON CONFLICT yang setara.
+# Hasil float dikembalikan sebagai Decimal seperti NUMBER(p, s) dari Snowflake.
+
+SQLITE_MERGES = {
+    MERGE_FIRST_ORDERS: [
+        "CREATE UNIQUE INDEX IF NOT EXISTS ufo_created_by ON user_first_orders (created_by)",
+        """
+        INSERT INTO user_first_orders (created_by, first_order_at)
+        SELECT created_by, MIN(created_at) FROM shipment_orders WHERE created_at >= ? GROUP BY created_by
+        ON CONFLICT (created_by) DO UPDATE SET first_order_at = MIN(first_order_at, excluded.first_order_at)
+        """,
+    ],
+    MERGE_ORDER_DAYS: [
+        "CREATE UNIQUE INDEX IF NOT EXISTS uod_user_day ON user_order_days (created_by, order_day)",
+        """
+        INSERT INTO user_order_days (created_by, order_day, first_at, last_at)
+        SELECT created_by, created_at / 86400, MIN(created_at), MAX(created_at)
+        FROM shipment_orders WHERE created_at >= ? GROUP BY created_by, created_at / 86400
+        ON CONFLICT (created_by, order_day) DO UPDATE SET
+            first_at = MIN(first_at, excluded.first_at), last_at = MAX(last_at, excluded.last_at)
+        """,
+    ],
+}
+
+SCHEMA_STATEMENTS = [
+    "CREATE TABLE shipment_orders (created_by INTEGER, created_at INTEGER, status INTEGER, "
+    "gmv_shipment REAL, transaction_value REAL)",
+    "CREATE TABLE user_logs (user_id INTEGER, created_at INTEGER)",
+    "CREATE TABLE bench_meta (key TEXT PRIMARY KEY, value TEXT)",
+]
+
+# Index supaya range scan created_at setara dengan pruning micro-partition di Snowflake
+INDEX_STATEMENTS = [
+    "CREATE INDEX so_created_at ON shipment_orders (created_at)",
+    "CREATE INDEX so_created_by ON shipment_orders (created_by, created_at)",
+    "CREATE INDEX ul_created_at ON user_logs (created_at)",
+]
+
+_query_ids = itertools.count(1)
+
+
+def _translate(query):
+    query = re.sub(r"::NUMERIC", " * 1.0", query)
+    return re.sub(r"CLUSTER BY \([^)]*\)", "", query)
+
+
+def _to_snowflake(value):
+    return Decimal(repr(value)) if isinstance(value, float) else value
+
+
+class LocalCursor:
+    """DB-API cursor over sqlite that mimics the parts of the Snowflake cursor the app uses."""
+
+    def __init__(self, connection):
+        self._cur = connection.cursor()
+        self.sfqid = None
+        self.rowcount = -1
+
+    def execute(self, query, params=None):
+        self.sfqid = f"local-{next(_query_ids)}"
+        if query.lstrip().upper().startswith("ALTER SESSION"):
+            return self
+        for statement in SQLITE_MERGES.get(query, [_translate(query)]):
+            self._cur.execute(statement, () if params is None or '?' not in statement else params)
+        self.rowcount = self._cur.rowcount
+        return self
+
+    def fetchone(self):
+        row = self._cur.fetchone()
+        return None if row is None else tuple(_to_snowflake(value) for value in row)
+
+    def fetchall(self):
+        return [tuple(_to_snowflake(value) for value in row) for row in self._cur.fetchall()]
+
+    def fetch_pandas_batches(self, size=100_000):
+        columns = [column[0].upper() for column in self._cur.description]
+        while rows := self._cur.fetchmany(size):
+            yield pd.DataFrame(rows, columns=columns)
+
+    def fetch_arrow_batches(self, size=100_000):
+        import pyarrow as pa
+        columns = [column[0].upper() for column in self._cur.description]
+        while rows := self._cur.fetchmany(size):
+            yield pa.Table.from_pylist([dict(zip(columns, row)) for row in rows])
+
+    def close(self):
+        self._cur.close()
+
+
+class LocalConnection:
+    """Connection-like wrapper so ConnectionPool can hand out sqlite connections."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # Fungsi Snowflake yang hasilnya harus tetap integer untuk epoch
+        self._conn.create_function("MOD", 2, lambda a, b: None if a is None or b is None else a % b, deterministic=True)
+        self._conn.create_function("FLOOR", 1, lambda x: None if x is None else math.floor(x), deterministic=True)
+        self._closed = False
+
+    def cursor(self):
+        return LocalCursor(self._conn)
+
+    def is_closed(self):
+        return self._closed
+
+    def close(self):
+        self._conn.close()
+        self._closed = True
+
+
+# Function to build a connect() callable for ConnectionPool that opens the local database
+def local_connect_factory(path):
+    return lambda: LocalConnection(str(path))
+
+
+# ===== Synthetic Data Generator =====
+# Status & bobotnya: order dibatalkan/diproses/selesai, COD 702 = RTS
+STATUS_CHOICES = np.array([100, 200, 300, 350, 400, 500, 702, 703])
+STATUS_WEIGHTS = np.array([0.05, 0.05, 0.10, 0.08, 0.07, 0.50, 0.05, 0.10])
+
+
+# Function to draw user ids with a skewed (Zipf-like) activity distribution
+def _draw_users(rng, n, n_users):
+    return np.minimum((rng.pareto(1.2, n) * n_users / 20).astype(np.int64), n_users - 1) + 1
+
+
+# Function to create and fill a synthetic database (shipment_orders + user_logs) in chunks
+# Order & log tersebar rata di `days` hari terakhir sampai hari ini (jam lokal)
+def generate(path, orders=1_000_000, logs=2_000_000, users=200_000, days=760, seed=42, chunk=500_000, today=None):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.exists():
+        path.unlink()
+    today = today or date.today()
+    first_timestamp = int(datetime.combine(today - timedelta(days=days - 1), dt_time.min).timestamp())
+    last_timestamp = int(datetime.combine(today, dt_time.max).timestamp())
+
+    rng = np.random.default_rng(seed)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    for statement in SCHEMA_STATEMENTS:
+        conn.execute(statement)
+
+    for offset in range(0, orders, chunk):
+        n = min(chunk, orders - offset)
+        gmv = np.round(rng.gamma(2.0, 75_000, n), 2)
+        conn.executemany("INSERT INTO shipment_orders VALUES (?, ?, ?, ?, ?)", zip(
+            _draw_users(rng, n, users).tolist(),
+            rng.integers(first_timestamp, last_timestamp + 1, n).tolist(),
+            rng.choice(STATUS_CHOICES, n, p=STATUS_WEIGHTS).tolist(),
+            gmv.tolist(),
+            np.round(gmv * rng.uniform(1.0, 1.3, n), 2).tolist(),
+        ))
+    for offset in range(0, logs, chunk):
+        n = min(chunk, logs - offset)
+        conn.executemany("INSERT INTO user_logs VALUES (?, ?)", zip(
+            _draw_users(rng, n, users).tolist(),
+            rng.integers(first_timestamp, last_timestamp + 1, n).tolist(),
+        ))
+
+    for statement in INDEX_STATEMENTS:
+        conn.execute(statement)
+    meta = {'orders': orders, 'logs': logs, 'users': users, 'days': days, 'seed': seed,
+            'today': today.isoformat(), 'generated_at': int(time.time())}
+    conn.executemany("INSERT INTO bench_meta VALUES (?, ?)", [(key, json.dumps(value)) for key, value in meta.items()])
+    conn.commit()
+    conn.close()
+    return meta
+
+
+# Function to read the generator settings stored in a synthetic database (None kalau file belum ada)
+def read_meta(path):
+    if not Path(path).exists():
+        return None
+    conn = sqlite3.connect(path)
+    try:
+        return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM bench_meta")}
+    except sqlite3.DatabaseError:
+        return None
+    finally:
+        conn.close()
+
+
+# Command line: python -m utils.localdb generate PATH [ORDERS] [LOGS]
+if __name__ == '__main__':
+    if len(sys.argv) >= 3 and sys.argv[1] == 'generate':
+        orders = int(sys.argv[3]) if len(sys.argv) > 3 else 1_000_000
+        logs = int(sys.argv[4]) if len(sys.argv) > 4 else 2 * orders
+        started = time.perf_counter()
+        meta = generate(sys.argv[2], orders=orders, logs=logs)
+        print(f"{meta['orders']:,} orders + {meta['logs']:,} logs generated in {time.perf_counter() - started:.1f}s")
+    else:
+        sys.exit("Usage: python -m utils.localdb generate PATH [ORDERS] [LOGS]")
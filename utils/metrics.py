@@ -0,0 +1,385 @@
+# ----- Import Library -----
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, time as dt_time
+
+from utils.active_users import AU_INDEX_ENABLED, get_au_index
+from utils.cache import get_cache, make_key
+from utils.db import POOL_MAX_SIZE, fetchall
+from utils.rollup import rollup_covers
+from utils.startup import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+SECONDS_PER_DAY = 86400
+
+# Maksimal query per-periode yang dijalankan bersamaan (tidak berguna melebihi ukuran connection pool)
+MAX_CONCURRENT_QUERIES = int(os.environ.get("ORDERFAZ_MAX_CONCURRENT_QUERIES", POOL_MAX_SIZE))
+
+# Urutan kolom KPI hasil query per bucket
+KPI_COLUMNS = ('gmv_final_status', 'order_qty', 'r_trx_user', 'n_trx_user', 'active_user', 'trx_user', 'aov', 'cod_rts')
+
+# Kolom tabel kalender bucket (lihat build_buckets)
+BUCKET_COLUMNS = ('period', 'bucket', 'start_ts', 'end_ts', 'pre_start_ts', 'pre_end_ts', 'pre_start_day', 'pre_end_day')
+
+# ===== Shared SQL Fragments =====
+# Order di dalam setiap bucket (minggu/periode)
+BUCKET_ORDERS_CTE = """
+    bucket_orders AS (
+        SELECT b.period, b.bucket, b.start_ts,
+               so.created_by, so.status, so.gmv_shipment, so.transaction_value
+        FROM buckets b
+        JOIN shipment_orders so
+          ON so.created_at >= b.start_ts AND so.created_at <= b.end_ts
+        WHERE so.created_at >= ? AND so.created_at <= ?
+    )"""
+
+# User yang punya order di window preStart..preEnd, dibaca dari index user_order_days (lihat utils/first_order.py).
+# Untuk window lebih dari 1 hari, irisan [first_at, last_at] per hari sudah pasti berisi order di dalam window.
+# Window di dalam 1 hari dicek langsung ke shipment_orders (range scan < 1 hari).
+PRE_WINDOW_USERS_CTE = """
+    pre_window_users AS (
+        SELECT b.period, b.bucket, d.created_by
+        FROM buckets b
+        JOIN user_order_days d
+          ON d.order_day >= b.pre_start_day AND d.order_day <= b.pre_end_day
+         AND d.last_at >= b.pre_start_ts AND d.first_at <= b.pre_end_ts
+        WHERE b.pre_start_day < b.pre_end_day
+        UNION
+        SELECT b.period, b.bucket, so.created_by
+        FROM buckets b
+        JOIN shipment_orders so
+          ON so.created_at >= b.pre_start_ts AND so.created_at <= b.pre_end_ts
+        WHERE b.pre_start_day = b.pre_end_day
+    )"""
+
+RN_JOINS = """
+        LEFT JOIN user_first_orders fo ON fo.created_by = bo.created_by
+        LEFT JOIN pre_window_users pu
+          ON pu.period = bo.period AND pu.bucket = bo.bucket AND pu.created_by = bo.created_by"""
+
+
+# ===== KPI Definitions =====
+# Setiap KPI didefinisikan sekali di sini, query per halaman/report dibangun dari definisi ini.
+# KPI additive: (ekspresi dari bucket_orders bo, ekspresi dari daily_kpi_rollup r - lihat utils/rollup.py)
+ADDITIVE_KPIS = {
+    'gmv_final_status': (
+        "SUM(CASE WHEN bo.status IN (500, 702, 703) THEN bo.gmv_shipment END)",
+        "SUM(r.gmv_final_status)",
+    ),
+    'order_qty': (
+        "COUNT(CASE WHEN bo.status >= 300 AND bo.status < 500 THEN 1 END)",
+        "SUM(r.order_qty)",
+    ),
+    'aov': (
+        "AVG(bo.transaction_value)",
+        "SUM(r.transaction_value_sum) / NULLIF(SUM(r.transaction_value_count), 0)",
+    ),
+    'cod_rts': (
+        """CASE
+                WHEN COUNT(CASE WHEN bo.status IN (500, 703) THEN 1 END) = 0
+                THEN 0
+                ELSE (COUNT(CASE WHEN bo.status = 702 THEN 1 END)::NUMERIC /
+                      COUNT(CASE WHEN bo.status IN (500, 703) THEN 1 END)::NUMERIC)
+            END""",
+        """CASE
+                WHEN COALESCE(SUM(r.cod_500 + r.cod_703), 0) = 0
+                THEN 0
+                ELSE (SUM(r.cod_702)::NUMERIC / SUM(r.cod_500 + r.cod_703)::NUMERIC)
+            END""",
+    ),
+}
+
+# KPI distinct user per bucket dari bucket_orders bo (R = order pertama sebelum start, N = tanpa order di preStart..preEnd)
+DISTINCT_KPIS = {
+    'r_trx_user': "COUNT(DISTINCT(CASE WHEN fo.first_order_at < bo.start_ts THEN bo.created_by END))",
+    'n_trx_user': "COUNT(DISTINCT(CASE WHEN pu.created_by IS NULL THEN bo.created_by END))",
+    'trx_user': "COUNT(DISTINCT bo.created_by)",
+}
+
+# KPI distinct user (DISTINCT_KPIS dari shipment_orders + AU dari user_logs / index AU), lihat parameter distinct
+DISTINCT_COLUMNS = (*DISTINCT_KPIS, 'active_user')
+
+# Total distinct user 1 bulan (metric month_users report bulanan) dari bucket 'month', bukan jumlah per minggu
+# (user yang order di beberapa minggu tidak terhitung berkali-kali)
+MONTH_USER_COLUMNS = ('active_user', 'trx_user', 'r_trx_user', 'n_trx_user')
+
+# Nilai KPI kalau bucket tidak punya data (AOV tetap NULL, sama seperti AVG tanpa baris)
+KPI_EMPTY_VALUES = {column: (None if column == 'aov' else 0) for column in KPI_COLUMNS}
+
+# Tipe hasil KPI setelah fetch: NUMBER/Decimal Snowflake dikonversi sekali ke float/int, AOV NULL -> NaN
+KPI_DTYPES = {column: ('float64' if column in ('gmv_final_status', 'aov', 'cod_rts') else 'int64') for column in KPI_COLUMNS}
+
+
+# Function to convert one KPI row (Decimal/None dari Snowflake atau result cache) to plain float/int values
+def typed_kpis(row):
+    values = []
+    for column, value in zip(KPI_COLUMNS, row):
+        value = KPI_EMPTY_VALUES[column] if value is None else value
+        if value is None:
+            values.append(np.nan)
+        else:
+            values.append(float(value) if KPI_DTYPES[column] == 'float64' else int(value))
+    return tuple(values)
+
+
+# Function to pick the month_users values (AU, TU, R, N Transacting User) from the KPIs of one bucket
+def month_users_of(kpis):
+    return tuple(kpis[KPI_COLUMNS.index(column)] for column in MONTH_USER_COLUMNS)
+
+
+# Function to build a typed KPI frame (kolom KPI_COLUMNS, float64/int64) from the results of the given buckets
+def kpi_frame(results, keys):
+    return pd.DataFrame({
+        column: np.fromiter((results[key][position] for key in keys), dtype=KPI_DTYPES[column], count=len(keys))
+        for position, column in enumerate(KPI_COLUMNS)
+    })
+
+
+# Function to render KPI definitions as SELECT columns
+def _kpi_columns(definitions):
+    return "".join(f",\n            {expression} AS {name}" for name, expression in definitions.items())
+
+
+# Function to build the (period, bucket, start, end, preStart, preEnd, preStartDay, preEndDay) rows for a list of weeks
+def build_buckets(period, bounds):
+    buckets = []
+    for i, (start_timestamp, end_timestamp) in enumerate(bounds):
+        # Perhitungan preStart dan preEnd (sama seperti query per minggu)
+        c = end_timestamp - start_timestamp
+        pre_start_timestamp = start_timestamp - c
+        pre_end_timestamp = end_timestamp - c
+        buckets.append((period, i, start_timestamp, end_timestamp, pre_start_timestamp, pre_end_timestamp,
+                        pre_start_timestamp // SECONDS_PER_DAY, pre_end_timestamp // SECONDS_PER_DAY))
+    return buckets
+
+
+# Function to render the buckets as an inline calendar table of bind placeholders
+# Teks SQL hanya bergantung pada jumlah bucket, nilai bucket dikirim sebagai bind parameter
+def _buckets_cte(buckets):
+    row = "(" + ", ".join("?" * len(BUCKET_COLUMNS)) + ")"
+    values = ",\n            ".join(row for _ in buckets)
+    return f"""
+    buckets ({', '.join(BUCKET_COLUMNS)}) AS (
+        SELECT * FROM (VALUES
+            {values})
+    )"""
+
+
+CTE_SEPARATOR = ",\n    "
+
+
+def _bucket_params(buckets):
+    return [int(value) if i else str(value) for bucket in buckets for i, value in enumerate(bucket)]
+
+
+# Function to get the scan range of all buckets, dibulatkan ke hari penuh (lokal)
+# Aman karena join tetap memakai batas detik tiap bucket; window yang hanya beda beberapa detik
+# di hari yang sama jadi punya predicate scan yang identik.
+def _scan_range(buckets):
+    first_day = datetime.fromtimestamp(min(bucket[2] for bucket in buckets)).date()
+    last_day = datetime.fromtimestamp(max(bucket[3] for bucket in buckets)).date()
+    return (int(datetime.combine(first_day, dt_time.min).timestamp()),
+            int(datetime.combine(last_day, dt_time.max).timestamp()))
+
+
+# Function to check if a window covers whole local days (00:00:00 .. 23:59:59), syarat pakai daily rollup
+def is_day_aligned(start_timestamp, end_timestamp):
+    return (datetime.fromtimestamp(start_timestamp).time() == dt_time.min
+            and datetime.fromtimestamp(end_timestamp + 1).time() == dt_time.min)
+
+
+# Function to build one grouped KPI query for every bucket (week) at once, returns (sql, params)
+# source='rollup' : metric additive dijumlahkan dari daily_kpi_rollup (O(hari)), hanya untuk bucket per hari penuh
+# source='raw'    : semua metric dihitung langsung dari shipment_orders
+# active_buckets : bucket yang AU-nya dihitung dari scan user_logs (default semua); AU bucket lain tidak dipakai
+#                  (diisi dari index AU - lihat utils/active_users.py), scan user_logs hanya selebar active_buckets
+# distinct       : KPI distinct user yang dihitung (default semua DISTINCT_COLUMNS), sisanya NULL.
+#                  Tanpa KPI distinct dan source='rollup', shipment_orders tidak di-scan sama sekali.
+def build_bucket_kpi_query(buckets, source='raw', active_buckets=None, distinct=None):
+    scan_start, scan_end = _scan_range(buckets)
+    distinct = DISTINCT_COLUMNS if distinct is None else distinct
+    active_buckets = buckets if active_buckets is None else active_buckets
+    active_users = bool(active_buckets) and 'active_user' in distinct
+    from_rollup = source == 'rollup'
+    additive_position = 1 if from_rollup else 0
+    additive = {name: expressions[additive_position] for name, expressions in ADDITIVE_KPIS.items()}
+    order_distinct = {name: expression for name, expression in DISTINCT_KPIS.items() if name in distinct}
+    order_columns = _kpi_columns(order_distinct if from_rollup else {**additive, **order_distinct})
+    with_orders = bool(order_columns)
+    with_rn = 'r_trx_user' in order_distinct or 'n_trx_user' in order_distinct
+
+    # Alias sumber tiap KPI di SELECT akhir
+    sources = {name: ('r' if from_rollup else 'k') for name in ADDITIVE_KPIS}
+    sources.update({name: 'k' for name in DISTINCT_KPIS}, active_user='a')
+    computed = set(ADDITIVE_KPIS) | set(order_distinct) | ({'active_user'} if active_users else set())
+    final_columns = ",\n        ".join(
+        f"NULL AS {name}" if name not in computed
+        else f"{sources[name]}.{name}" if KPI_EMPTY_VALUES[name] is None
+        else f"COALESCE({sources[name]}.{name}, {KPI_EMPTY_VALUES[name]}) AS {name}"
+        for name in KPI_COLUMNS
+    )
+
+    # Semua minggu dikirim sebagai satu tabel kalender, shipment_orders & user_logs cukup di-scan sekali
+    ctes = [_buckets_cte(buckets)]
+    if with_orders:
+        ctes.append(BUCKET_ORDERS_CTE)
+    if with_rn:
+        ctes.append(PRE_WINDOW_USERS_CTE)
+    if from_rollup:
+        ctes.append(f"""rollup_kpis AS (
+        SELECT
+            b.period,
+            b.bucket{_kpi_columns(additive)}
+        FROM buckets b
+        JOIN daily_kpi_rollup r
+          ON r.day_start >= b.start_ts AND r.day_start <= b.end_ts
+        GROUP BY b.period, b.bucket
+    )""")
+    if with_orders:
+        ctes.append(f"""order_kpis AS (
+        SELECT
+            bo.period,
+            bo.bucket{order_columns}
+        FROM bucket_orders bo{RN_JOINS if with_rn else ''}
+        GROUP BY bo.period, bo.bucket
+    )""")
+    if active_users:
+        ctes.append("""active_users AS (
+        SELECT b.period, b.bucket, COUNT(DISTINCT ul.user_id) AS active_user
+        FROM buckets b
+        JOIN user_logs ul
+          ON ul.created_at >= b.start_ts AND ul.created_at <= b.end_ts
+        WHERE ul.created_at >= ? AND ul.created_at <= ?
+        GROUP BY b.period, b.bucket
+    )""")
+
+    joins = "".join((
+        "\n    LEFT JOIN order_kpis k ON k.period = b.period AND k.bucket = b.bucket" if with_orders else '',
+        "\n    LEFT JOIN rollup_kpis r ON r.period = b.period AND r.bucket = b.bucket" if from_rollup else '',
+        "\n    LEFT JOIN active_users a ON a.period = b.period AND a.bucket = b.bucket" if active_users else '',
+    ))
+    query = f"""
+    WITH {CTE_SEPARATOR.join(ctes)}
+    SELECT
+        b.period,
+        b.bucket,
+        {final_columns}
+    FROM buckets b{joins}
+    ORDER BY b.period, b.bucket
+    """
+    order_scan = [scan_start, scan_end] if with_orders else []
+    active_scan = list(_scan_range(active_buckets)) if active_users else []
+    return query, _bucket_params(buckets) + order_scan + active_scan
+
+
+# Function to build a query with only the R/N transacting user columns (dipakai untuk verifikasi index)
+def build_bucket_rn_query(buckets):
+    scan_start, scan_end = _scan_range(buckets)
+    rn_columns = {name: DISTINCT_KPIS[name] for name in ('r_trx_user', 'n_trx_user')}
+    query = f"""
+    WITH {_buckets_cte(buckets)},
+    {BUCKET_ORDERS_CTE},
+    {PRE_WINDOW_USERS_CTE}
+    SELECT
+        bo.period,
+        bo.bucket{_kpi_columns(rn_columns)}
+    FROM bucket_orders bo{RN_JOINS}
+    GROUP BY bo.period, bo.bucket
+    ORDER BY bo.period, bo.bucket
+    """
+    return query, _bucket_params(buckets) + [scan_start, scan_end]
+
+
+# Signature query KPI: berubah otomatis kalau SQL-nya diubah, jadi cache lama tidak terpakai lagi
+KPI_QUERY_SIGNATURE = hashlib.sha256(build_bucket_kpi_query([('signature', 0, 0, 0, 0, 0, 0, 0)])[0].encode()).hexdigest()
+
+
+# Function to fetch KPIs for every bucket in one round trip
+# Metric additive dibaca dari daily rollup kalau semua bucket per hari penuh dan harinya sudah di-build
+# (panggil ensure_rollup_fresh() dulu)
+# Bucket yang sudah ada di result cache tidak di-query ulang, hanya sisanya yang dikirim ke Snowflake
+# AU exact dihitung dari index harian user_logs untuk bucket yang tercakup (panggil ensure_au_index_fresh() dulu),
+# user_logs hanya di-scan untuk bucket sisanya
+# query_tag: QUERY_TAG Snowflake per halaman/report (lihat utils.db.make_query_tag)
+# distinct: KPI distinct user yang dihitung (default semua), sisanya berisi KPI_EMPTY_VALUES dan diisi caller
+#           (mis. AU/TU dari HLL sketch). Hasil parsial di-cache terpisah, hasil lengkap di cache tetap dipakai.
+# Hasil: {(period, bucket): (gmv_final_status, order_qty, r_trx_user, n_trx_user, active_user, trx_user, aov, cod_rts)}
+# dengan tipe KPI_DTYPES (lihat typed_kpis), AOV NaN kalau bucket tidak punya order
+def fetch_bucket_kpis(buckets, use_cache=True, use_rollup=True, stats=None, query_tag=None, use_au_index=True,
+                      distinct=None):
+    cache = get_cache() if use_cache else None
+    partial = distinct is not None and set(distinct) != set(DISTINCT_COLUMNS)
+    signatures = [KPI_QUERY_SIGNATURE]
+    if partial:
+        signatures.append(f"{KPI_QUERY_SIGNATURE}:{','.join(sorted(distinct))}")
+    results = {}
+    missing = {}
+
+    for bucket in buckets:
+        period, i, start_timestamp, end_timestamp = bucket[:4]
+        cached = None
+        for signature in signatures if cache else ():
+            cached = cache.get(make_key(signature, start_timestamp, end_timestamp))
+            if cached is not None:
+                break
+        if cached is not None:
+            results[(period, i)] = typed_kpis(cached[column] for column in KPI_COLUMNS)
+        else:
+            missing[(period, i)] = bucket
+
+    if missing:
+        missing_buckets = list(missing.values())
+        # Rollup hanya dipakai kalau semua bucket per hari penuh dan semua harinya sudah di-build (lihat rollup_covers),
+        # bucket di luar coverage (mis. sebelum backfill) dihitung dari shipment_orders
+        covered = use_rollup and all(is_day_aligned(bucket[2], bucket[3]) and rollup_covers(bucket[2], bucket[3])
+                                     for bucket in missing_buckets)
+        source = 'rollup' if covered else 'raw'
+        index = get_au_index()
+        use_index = use_au_index and AU_INDEX_ENABLED and (distinct is None or 'active_user' in distinct)
+        plans = index.plan_windows([bucket[2:4] for bucket in missing_buckets]) if use_index else [None] * len(missing)
+        active_buckets = [bucket for bucket, plan in zip(missing_buckets, plans) if plan is None]
+        query, params = build_bucket_kpi_query(missing_buckets, source, active_buckets, distinct)
+
+        # AU dari index (+ user_id hari ini/potongan hari di tepi window) dihitung bersamaan dengan query KPI
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="au-index") as executor:
+            indexed = executor.submit(index.count_plans, plans, query_tag) if len(active_buckets) < len(plans) else None
+            rows = fetchall(query, params, query_tag=query_tag, coalesce=True)
+            active_user_counts = dict(zip(missing, indexed.result())) if indexed is not None else {}
+
+        for row in rows:
+            bucket = missing[(row[0], row[1])]
+            kpis = typed_kpis(row[2:])
+            if active_user_counts.get((row[0], row[1])) is not None:
+                kpis = kpis[:4] + (active_user_counts[(row[0], row[1])],) + kpis[5:]
+            results[(row[0], row[1])] = kpis
+            if cache:
+                # Final (disimpan lewat refresh berikutnya) hanya kalau dari raw atau dari hari rollup yang sudah di-build
+                exact = source == 'raw' or rollup_covers(bucket[2], bucket[3])
+                cache.put(make_key(signatures[-1], bucket[2], bucket[3]), dict(zip(KPI_COLUMNS, kpis)), bucket[3],
+                          final=exact)
+
+    if stats is not None:
+        stats['hits'] = stats.get('hits', 0) + len(buckets) - len(missing)
+        stats['misses'] = stats.get('misses', 0) + len(missing)
+    return results
+
+
+# Function to fetch every bucket with its own query on a bounded thread pool
+# Hasil di-yield sebagai ((period, bucket), kpis) sesuai urutan selesai, bukan urutan bucket
+def iter_bucket_kpis(buckets, max_workers=MAX_CONCURRENT_QUERIES, stats=None, initializer=None, query_tag=None,
+                     distinct=None):
+    def fetch(bucket):
+        bucket_stats = {}
+        return fetch_bucket_kpis([bucket], stats=bucket_stats, query_tag=query_tag, distinct=distinct), bucket_stats
+
+    with ThreadPoolExecutor(max_workers=max_workers, initializer=initializer) as executor:
+        futures = [executor.submit(fetch, bucket) for bucket in buckets]
+        for future in as_completed(futures):
+            results, bucket_stats = future.result()
+            if stats is not None:
+                for name, count in bucket_stats.items():
+                    stats[name] = stats.get(name, 0) + count
+            yield from results.items()
@@ -0,0 +1,346 @@
+# ----- Import Library -----
+import hashlib
+import json
+import math
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from utils.active_users import AU_INDEX_ENABLED, count_union, get_au_index
+from utils.db import fetchall
+from utils.metrics import (BUCKET_COLUMNS, DISTINCT_COLUMNS, KPI_COLUMNS, KPI_EMPTY_VALUES, KPI_QUERY_SIGNATURE,
+                           PRE_WINDOW_USERS_CTE, RN_JOINS, build_buckets, fetch_bucket_kpis, month_users_of, typed_kpis)
+from utils.rollup import day_range, utc_offset_seconds
+from utils.startup import lazy_import
+
+np = lazy_import('numpy')
+
+# ===== Month-to-date Settings =====
+# Bulan berjalan: KPI distinct user (R/N, AU, TU) minggu yang sudah lewat dan user_id transacting user bulan ini
+# (semua, R dan N terhadap total 1 bulan) disimpan sebagai state per bulan.
+# KPI distinct tidak bergantung status order, jadi final begitu harinya lewat.
+# KPI additive (GMV, orders, AOV, COD RTS) dan GMV month-to-date masih berubah selama ROLLUP_RESTATE_DAYS hari
+# (status order), jadi selalu dibaca dari daily rollup yang di-restate tiap malam (tanpa scan shipment_orders).
+# Query penuh hanya untuk minggu yang masih terbuka, ditambah user_id hari yang belum masuk state + hari ini.
+MTD_ENABLED = os.environ.get("ORDERFAZ_MTD", "1") != "0"  # 0 = bulan berjalan selalu dihitung ulang penuh
+MTD_DIR = Path(os.environ.get("ORDERFAZ_MTD_DIR", Path(__file__).resolve().parent.parent / ".cache" / "mtd"))
+
+# User per (hari, user) untuk hari baru + hari ini, dengan flag R/N terhadap bucket total 1 bulan
+# (definisi sama dengan DISTINCT_KPIS: R = order pertama sebelum awal bulan, N = tanpa order di preStart..preEnd).
+# TU/R/N 1 bulan = union user_id state + hari ini; flag per user tetap sama di semua hari bulan itu.
+MTD_INCREMENT_QUERY = f"""
+    WITH buckets ({', '.join(BUCKET_COLUMNS)}) AS (
+        SELECT * FROM (VALUES
+            ({', '.join('?' * len(BUCKET_COLUMNS))}))
+    ),
+    bucket_orders AS (
+        SELECT b.period, b.bucket, b.start_ts, so.created_at, so.created_by
+        FROM buckets b
+        JOIN shipment_orders so
+          ON so.created_at >= b.start_ts AND so.created_at <= b.end_ts
+        WHERE so.created_at >= ? AND so.created_at <= ? AND so.created_by IS NOT NULL
+    ),{PRE_WINDOW_USERS_CTE}
+    SELECT DISTINCT
+        bo.created_at - MOD(bo.created_at + ?, 86400) AS day_start,
+        bo.created_by,
+        CASE WHEN fo.first_order_at < bo.start_ts THEN 1 ELSE 0 END AS r_user,
+        CASE WHEN pu.created_by IS NULL THEN 1 ELSE 0 END AS n_user
+    FROM bucket_orders bo{RN_JOINS}
+"""
+
+# Himpunan user_id 1 bulan di state: transacting user, R dan N Transacting User
+USER_SETS = ('trx', 'r', 'n')
+
+# State lama tidak dipakai lagi kalau definisi KPI atau query increment berubah
+MTD_SIGNATURE = hashlib.sha256((KPI_QUERY_SIGNATURE + MTD_INCREMENT_QUERY).encode()).hexdigest()
+
+# Posisi KPI distinct di hasil fetch_bucket_kpis, urutan nilai per minggu di state
+DISTINCT_POSITIONS = [KPI_COLUMNS.index(column) for column in DISTINCT_COLUMNS]
+
+
+class MonthToDateStore:
+    """Per-month state of the open month, one JSON file plus sorted user id arrays.
+
+    The JSON holds the distinct-user KPIs of every closed week and the last
+    day folded in (``through``); ``.users.npz`` holds the distinct users with
+    an order on those days, and the R / N transacting users among them.
+    """
+
+    def __init__(self, directory=MTD_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _paths(self, year, month):
+        stem = f"{year:04d}-{month:02d}"
+        return self.directory / f"{stem}.json", self.directory / f"{stem}.users.npz"
+
+    # Function to load the state of one month, state kosong kalau belum ada atau signature-nya beda
+    def load(self, year, month):
+        json_path, users_path = self._paths(year, month)
+        try:
+            state = json.loads(json_path.read_text())
+            with np.load(users_path) as arrays:
+                users = {name: arrays[name] for name in USER_SETS}
+        except (OSError, ValueError, KeyError):
+            state, users = None, None
+        if state is None or state.get('signature') != MTD_SIGNATURE:
+            empty = {name: np.array([], dtype=np.int64) for name in USER_SETS}
+            return {'signature': MTD_SIGNATURE, 'through': None, 'weeks': {}}, empty
+        return state, users
+
+    # User_id ditulis dulu: kalau proses berhenti di tengah, hari yang sama di-fold ulang (union & dict idempotent)
+    def save(self, year, month, state, users):
+        json_path, users_path = self._paths(year, month)
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = users_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'wb') as file:
+                np.savez(file, **users)
+            os.replace(tmp_path, users_path)
+            tmp_path = json_path.with_suffix(f".{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(state))
+            os.replace(tmp_path, json_path)
+
+    # Function to delete the state of months before (year, month), bulan yang sudah tutup dibaca dari result cache
+    # Semua file bulan itu dihapus, termasuk file format state lama
+    def prune(self, year, month):
+        current = f"{year:04d}-{month:02d}"
+        for path in self.directory.glob("*-*.*"):
+            if path.name.split('.')[0] < current:
+                path.unlink(missing_ok=True)
+
+    def stats(self):
+        months = {}
+        for path in sorted(self.directory.glob("*.json")):
+            state = json.loads(path.read_text())
+            months[path.stem] = {'through': state.get('through'), 'weeks': len(state.get('weeks', {}))}
+        return {'months': months, 'bytes': sum(path.stat().st_size for path in self.directory.glob("*") if path.is_file())}
+
+
+# ===== Process-wide Store =====
+_store = None
+_store_lock = threading.Lock()
+
+
+# Function to get the shared month-to-date store
+def get_mtd_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = MonthToDateStore()
+    return _store
+
+
+# ===== Month-to-date Report =====
+# Function to check if (year, month) is the month of `today` (hanya bulan berjalan yang punya minggu terbuka)
+def is_open_month(year, month, today=None):
+    today = today or date.today()
+    return (year, month) == (today.year, today.month)
+
+
+# Function to fetch the distinct transacting users (semua, R, N) of closed days / today of the month bucket,
+# from first_day 00:00 to the end of today. Hasil: ({USER_SETS: user_id hari yang lewat}, {USER_SETS: hari ini})
+def fetch_increment(month_bucket, first_day, today, query_tag=None):
+    params = (*month_bucket, *day_range(first_day, today), utc_offset_seconds())
+    rows = fetchall(MTD_INCREMENT_QUERY, params, query_tag=query_tag, coalesce=True)
+    day_starts, user_ids, r_flags, n_flags = (
+        np.fromiter((int(row[position]) for row in rows), dtype=np.int64, count=len(rows)) for position in range(4))
+    masks = {'trx': np.ones(len(rows), dtype=bool), 'r': r_flags == 1, 'n': n_flags == 1}
+    closed = day_starts < day_range(today, today)[0]
+    return ({name: np.unique(user_ids[mask & closed]) for name, mask in masks.items()},
+            {name: np.unique(user_ids[mask & ~closed]) for name, mask in masks.items()})
+
+
+# Function to fetch the period results of the open month from its state plus the open week and the new days
+# Hasil: (period_results seperti fetch_bucket_kpis(monthly_buckets(...)), (AU, TU, R, N) 1 bulan, metric proyeksi EOM)
+# Proyeksi EOM = GMV hari yang sudah lewat / jumlah hari itu * hari dalam bulan
+def fetch_month_to_date(weeks, prev_weeks, stats=None, query_tag=None, today=None):
+    today = today or date.today()
+    year, month = int(weeks.years[0]), int(weeks.months[0])
+    store = get_mtd_store()
+    state, users = store.load(year, month)
+
+    # Minggu yang sudah lewat dan ada di state hanya butuh KPI additive; minggu yang belum mulai belum punya data
+    today_number = (today - date(1970, 1, 1)).days
+    closed = [i for i in range(len(weeks)) if weeks.end_days[i] < today_number]
+    future = [i for i in range(len(weeks)) if weeks.start_days[i] > today_number]
+    from_state = [i for i in closed if str(i) in state['weeks']]
+    to_fetch = [i for i in range(len(weeks)) if i not in future and i not in from_state]
+
+    current_bounds = weeks.bounds()
+    month_bounds = (current_bounds[0][0], current_bounds[-1][1])
+    month_bucket = build_buckets('month', [month_bounds])[0]
+    buckets = [bucket for bucket in build_buckets('current', current_bounds) if bucket[1] in to_fetch]
+    buckets += build_buckets('previous', prev_weeks.bounds())
+
+    # KPI additive minggu dari state + GMV hari yang sudah lewat: query tanpa KPI distinct (daily rollup saja)
+    month_start = date(year, month, 1)
+    days_closed = (today - month_start).days
+    additive_buckets = [bucket for bucket in build_buckets('current', current_bounds) if bucket[1] in from_state]
+    if days_closed:
+        additive_buckets += build_buckets('mtd', [day_range(month_start, today - timedelta(days=1))])
+
+    # AU 1 bulan dari index AU; kalau tidak tercakup, total 1 bulan ikut dihitung query KPI seperti mode penuh
+    index = get_au_index()
+    plan = index.plan_windows([month_bounds], today)[0] if AU_INDEX_ENABLED else None
+    if plan is None:
+        buckets.append(month_bucket)
+
+    first_day = date.fromisoformat(state['through']) + timedelta(days=1) if state['through'] else month_start
+
+    # Increment user_id, AU dari index dan KPI additive dihitung bersamaan dengan query KPI minggu terbuka
+    additive_stats = {}
+    with ThreadPoolExecutor(max_workers=3, thread_name_prefix="mtd") as executor:
+        increment = executor.submit(fetch_increment, month_bucket, first_day, today, query_tag)
+        indexed = executor.submit(index.count_plans, [plan], query_tag) if plan is not None else None
+        additive = executor.submit(fetch_bucket_kpis, additive_buckets, stats=additive_stats, query_tag=query_tag,
+                                   distinct=()) if additive_buckets else None
+        results = fetch_bucket_kpis(buckets, stats=stats, query_tag=query_tag)
+        new_users, today_users = increment.result()
+        month_active_users = indexed.result()[0] if indexed is not None else None
+        additive_results = additive.result() if additive is not None else {}
+
+    # Fold user_id hari yang sudah lewat dan KPI distinct minggu yang baru tutup ke state
+    yesterday = today - timedelta(days=1)
+    changed = False
+    if first_day <= yesterday:
+        state['through'] = yesterday.isoformat()
+        users = {name: np.union1d(users[name], new_users[name]) for name in USER_SETS}
+        changed = True
+    for i in closed:
+        if str(i) not in state['weeks']:
+            state['weeks'][str(i)] = [results[('current', i)][position] for position in DISTINCT_POSITIONS]
+            changed = True
+    if changed:
+        store.save(year, month, state, users)
+        store.prune(year, month)
+
+    empty = typed_kpis(KPI_EMPTY_VALUES[column] for column in KPI_COLUMNS)
+    for i in range(len(weeks)):
+        if i in future:
+            results[('current', i)] = empty
+        elif i in from_state:
+            kpis = list(additive_results[('current', i)])
+            for position, value in zip(DISTINCT_POSITIONS, state['weeks'][str(i)]):
+                kpis[position] = value
+            results[('current', i)] = tuple(kpis)
+    if stats is not None:
+        for name, count in additive_stats.items():
+            stats[name] = stats.get(name, 0) + count
+        stats['mtd_weeks'] = stats.get('mtd_weeks', 0) + len(from_state)
+
+    if plan is None:
+        month_users = month_users_of(results[('month', 0)])
+    else:
+        month_users = (month_active_users, *(count_union([users[name], today_users[name]]) for name in USER_SETS))
+
+    gmv_mtd = additive_results[('mtd', 0)][0] if days_closed else 0.0
+    projection = {
+        'mtd_days': days_closed,
+        'gmv_mtd': gmv_mtd,
+        'gmv_eom_mtd': gmv_mtd / days_closed * int(weeks.days_in_month[0]) if days_closed else math.nan,
+    }
+    return results, month_users, projection
+
+
+# ===== Verification on the Local Stand-in =====
+# Function to compare the incremental current-month report with a full recompute
+# State dibangun dari nol (cold), hari demi hari sejak tanggal 1 (daily) dan setelah status order di-restate (restated)
+def verify_against_full(days=75, seed=5):
+    import utils.active_users as active_users_module
+    import utils.cache as cache_module
+    import utils.db as db_module
+    import utils.mtd as mtd_module  # modul yang dipakai reports (bukan __main__ saat dijalankan dari CLI)
+    from utils.active_users import ActiveUserIndex
+    from utils.cache import ResultCache
+    from utils.db import ConnectionPool
+    from utils.first_order import refresh_index
+    from utils.localdb import generate, local_connect_factory
+    from utils.reports import build_monthly_report, previous_month_of
+    from utils.rollup import ROLLUP_RESTATE_DAYS, rebuild_days
+    from utils.weeks import month_weeks
+
+    pd = lazy_import('pandas')
+    today = date.today()
+    weeks = month_weeks(today.year, today.month)
+    prev_weeks = month_weeks(*previous_month_of(today.year, today.month))
+    mismatches = []
+    previous = (db_module._pool, cache_module._cache, active_users_module._index, mtd_module._store)
+    with tempfile.TemporaryDirectory() as directory:
+        database = Path(directory) / "verify.sqlite"
+        generate(database, orders=8_000, logs=60_000, users=20_000, days=days, seed=seed)
+        db_module._pool = ConnectionPool(local_connect_factory(database))
+        cache_module._cache = ResultCache(Path(directory) / "kpi")
+        active_users_module._index = ActiveUserIndex(Path(directory) / "au_index")
+        try:
+            rebuild_days(today - timedelta(days=days), today)
+            refresh_index()
+            active_users_module._index.refresh(backfill_days=days, today=today)
+
+            month_start = today.replace(day=1)
+
+            # Hitung ulang penuh dengan result cache sendiri, supaya tidak berbagi hasil dengan mode incremental
+            def full_recompute(run):
+                cache_module._cache = ResultCache(Path(directory) / f"kpi_full_{run}")
+                report = build_monthly_report(today.year, today.month, figures=False, incremental=False)
+                gmv = fetchall(
+                    "SELECT COALESCE(SUM(CASE WHEN status IN (500, 702, 703) THEN gmv_shipment END), 0) "
+                    "FROM shipment_orders WHERE created_at >= ? AND created_at <= ?",
+                    day_range(month_start, today - timedelta(days=1)))[0][0] if today > month_start else 0
+                cache_module._cache = ResultCache(Path(directory) / f"kpi_incremental_{run}")
+                return report, float(gmv)
+
+            # cold: state dari nol; daily: state dibangun hari demi hari sejak tanggal 1;
+            # restated: state daily dipakai lagi setelah status order di hari yang sudah lewat berubah dan
+            # rollup di-restate (refresh malam berikutnya, result cache yang belum final sudah expired)
+            for mode in ('cold', 'daily', 'restated'):
+                if mode == 'restated':
+                    fetchall("UPDATE shipment_orders SET status = CASE WHEN status = 500 THEN 702 ELSE 500 END "
+                             "WHERE created_at >= ? AND created_at <= ? AND created_at % 3 = 0",
+                             day_range(month_start - timedelta(days=7), today))
+                    rebuild_days(today - timedelta(days=ROLLUP_RESTATE_DAYS), today)
+                else:
+                    mtd_module._store = mtd_module.MonthToDateStore(Path(directory) / f"mtd_{mode}")
+                full, expected_gmv = full_recompute(mode)
+                if mode == 'daily':
+                    for day_number in range((today - month_start).days):
+                        mtd_module.fetch_month_to_date(weeks, prev_weeks, today=month_start + timedelta(days=day_number))
+                incremental = build_monthly_report(today.year, today.month, figures=False)
+
+                for name, table in full['tables'].items():
+                    try:
+                        pd.testing.assert_frame_equal(incremental['tables'][name], table, check_exact=False, rtol=1e-9)
+                    except AssertionError as exc:
+                        mismatches.append((mode, name, str(exc).splitlines()[0]))
+                for name, value in full['metrics'].items():
+                    actual = incremental['metrics'][name]
+                    same = (actual == value if isinstance(value, tuple)
+                            else math.isclose(actual, value, rel_tol=1e-9) or (math.isnan(actual) and math.isnan(value)))
+                    if not same:
+                        mismatches.append((mode, name, value, actual))
+                if not math.isclose(incremental['metrics']['gmv_mtd'], expected_gmv, rel_tol=1e-9):
+                    mismatches.append((mode, 'gmv_mtd', expected_gmv, incremental['metrics']['gmv_mtd']))
+        finally:
+            db_module.get_pool().close_all()
+            db_module._pool, cache_module._cache, active_users_module._index, mtd_module._store = previous
+    return mismatches
+
+
+# Command line: python -m utils.mtd [stats | verify]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'stats'
+    if command == 'stats':
+        print(get_mtd_store().stats())
+    elif command == 'verify':
+        mismatches = verify_against_full()
+        for mismatch in mismatches:
+            print("MISMATCH", mismatch)
+        print("OK" if not mismatches else f"{len(mismatches)} value(s) differ")
+        sys.exit(1 if mismatches else 0)
+    else:
+        sys.exit(f"Unknown command: {command}")
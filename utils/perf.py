@@ -0,0 +1,188 @@
+# ----- Import Library -----
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+# ===== Trace Settings =====
+# Setiap span (connect, query, DataFrame, Excel, chart) disimpan di memory per session untuk panel "Performance"
+# dan ditulis sebagai 1 baris JSON ke log yang di-rotate, supaya bisa diagregasi lintas user & hari.
+TRACE_DIR = Path(os.environ.get("ORDERFAZ_TRACE_DIR", Path(__file__).resolve().parent.parent / ".cache" / "trace"))
+TRACE_LOG_ENABLED = os.environ.get("ORDERFAZ_TRACE_LOG", "1") != "0"
+TRACE_LOG_MAX_BYTES = int(os.environ.get("ORDERFAZ_TRACE_LOG_MAX_BYTES", 20 * 1024 * 1024))
+TRACE_LOG_BACKUPS = int(os.environ.get("ORDERFAZ_TRACE_LOG_BACKUPS", 10))
+SESSION_SPAN_LIMIT = 500  # Span terakhir yang disimpan per session
+SESSION_LIMIT = 200       # Session terakhir yang span-nya disimpan di memory
+
+# Bytes scanned hanya bisa dibaca dari QUERY_HISTORY (1 query tambahan per query), jadi default mati
+TRACE_QUERY_STATS = os.environ.get("ORDERFAZ_TRACE_QUERY_STATS", "0") == "1"
+
+QUERY_STATS_QUERY = """
+    SELECT bytes_scanned, rows_produced
+    FROM TABLE(INFORMATION_SCHEMA.QUERY_HISTORY_BY_SESSION(RESULT_LIMIT => 100))
+    WHERE query_id = ?
+"""
+
+_lock = threading.Lock()
+_session_spans = OrderedDict()  # session_id -> deque span terakhir (urut dari session yang paling lama tidak aktif)
+_session_pages = {}             # session_id -> halaman yang sedang dijalankan
+_span_started = {}              # id(record) -> perf_counter saat span dimulai
+_captures = []                  # list penampung span aktif (lihat capture())
+_logger = None
+
+
+# Function to get the Streamlit session id of the current thread (None di luar script run, mis. CLI)
+def _session_id():
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return None
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else None
+
+
+def _trace_logger():
+    global _logger
+    if _logger is None:
+        with _lock:
+            if _logger is None:
+                TRACE_DIR.mkdir(parents=True, exist_ok=True)
+                handler = RotatingFileHandler(TRACE_DIR / "spans.jsonl", maxBytes=TRACE_LOG_MAX_BYTES,
+                                              backupCount=TRACE_LOG_BACKUPS, encoding="utf-8")
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger = logging.getLogger("orderfaz.trace")
+                logger.setLevel(logging.INFO)
+                logger.propagate = False
+                logger.addHandler(handler)
+                _logger = logger
+    return _logger
+
+
+# Function to mark which page the current session is running (dipanggil di awal setiap halaman)
+def set_page(page):
+    session_id = _session_id()
+    with _lock:
+        _session_pages[session_id] = page
+
+
+def _record(record):
+    with _lock:
+        spans = _session_spans.get(record['session'])
+        if spans is None:
+            spans = _session_spans[record['session']] = deque(maxlen=SESSION_SPAN_LIMIT)
+            while len(_session_spans) > SESSION_LIMIT:
+                stale, _ = _session_spans.popitem(last=False)
+                _session_pages.pop(stale, None)
+        _session_spans.move_to_end(record['session'])
+        spans.append(record)
+        for captured in _captures:
+            captured.append(record)
+    if TRACE_LOG_ENABLED:
+        _trace_logger().info(json.dumps(record, default=str, separators=(',', ':')))
+
+
+# Context manager to time one block of work
+# Caller boleh mengisi field tambahan di record yang di-yield (query_id, rows, bytes_scanned, ...)
+@contextmanager
+def span(name, **attrs):
+    session_id = _session_id()
+    record = {
+        'ts': round(time.time(), 3),
+        'session': session_id,
+        'page': _session_pages.get(session_id),
+        'span': name,
+        'wall_ms': None,
+        'query_id': None,
+        'rows': None,
+        'bytes_scanned': None,
+        'thread': threading.current_thread().name,
+        **attrs,
+    }
+    started = _span_started[id(record)] = time.perf_counter()
+    try:
+        yield record
+    except Exception as exc:
+        record['error'] = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _span_started.pop(id(record), None)
+        if record['wall_ms'] is None:
+            record['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        _record(record)
+
+
+# Function to fill query_id & rows after a query was executed and fetched
+# Kalau TRACE_QUERY_STATS aktif, bytes scanned dibaca dari QUERY_HISTORY dengan cursor yang sama
+# (jadi panggil setelah hasil di-fetch); wall time dihentikan dulu supaya lookup tidak ikut terhitung.
+def annotate_query(record, cur, rows=None):
+    record['query_id'] = getattr(cur, 'sfqid', None)
+    record['rows'] = rows if rows is not None else getattr(cur, 'rowcount', None)
+    if TRACE_QUERY_STATS and record['query_id']:
+        started = _span_started.get(id(record))
+        if started is not None:
+            record['wall_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        try:
+            cur.execute(QUERY_STATS_QUERY, (record['query_id'],))
+            row = cur.fetchone()
+            if row is not None:
+                record['bytes_scanned'], record['rows'] = int(row[0] or 0), int(row[1] or 0)
+        except Exception:
+            pass  # Statistik opsional, jangan gagalkan query utama
+
+
+# Function to get the latest spans of the current session, terbaru di atas
+def session_spans(limit=100):
+    with _lock:
+        spans = list(_session_spans.get(_session_id(), ()))
+    return spans[::-1][:limit]
+
+
+# Context manager to collect every span recorded inside the block, dari thread & session mana pun (dipakai benchmark)
+@contextmanager
+def capture():
+    captured = []
+    with _lock:
+        _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        with _lock:
+            _captures.remove(captured)
+
+
+# ===== Trace Log Summary =====
+# Function to aggregate the rotated JSONL logs per day, page and span
+def summarize_log(directory=TRACE_DIR):
+    import pandas as pd
+
+    frames = [pd.read_json(path, lines=True) for path in sorted(Path(directory).glob("spans.jsonl*")) if path.stat().st_size]
+    if not frames:
+        return pd.DataFrame()
+    spans = pd.concat(frames, ignore_index=True)
+    spans['day'] = pd.to_datetime(spans['ts'], unit='s').dt.date
+    spans['page'] = spans['page'].fillna('-')
+    return (spans.groupby(['day', 'page', 'span'])
+            .agg(count=('wall_ms', 'size'),
+                 sessions=('session', 'nunique'),
+                 p50_ms=('wall_ms', 'median'),
+                 p95_ms=('wall_ms', lambda wall_ms: wall_ms.quantile(0.95)),
+                 max_ms=('wall_ms', 'max'),
+                 rows=('rows', 'sum'),
+                 bytes_scanned=('bytes_scanned', 'sum'))
+            .reset_index())
+
+
+# Command line: python -m utils.perf summary [DIR]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'summary'
+    if command == 'summary':
+        summary = summarize_log(sys.argv[2] if len(sys.argv) > 2 else TRACE_DIR)
+        print(summary.to_string(index=False) if not summary.empty else "No spans logged yet")
+    else:
+        sys.exit(f"Unknown command: {command}")
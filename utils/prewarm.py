@@ -0,0 +1,304 @@
+# ----- Import Library -----
+import json
+import os
+import pickle
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+from utils.cache import last_refresh_boundary
+from utils.db import POOL_MAX_SIZE, fetchone, make_query_tag
+from utils.active_users import ensure_au_index_fresh
+from utils.first_order import ensure_index_fresh
+from utils.reports import WEEKLY_DEFAULT_DAYS, build_monthly_report, build_weekly_report, previous_month_of
+from utils.rollup import ensure_rollup_fresh
+from utils.startup import lazy_import
+
+pio = lazy_import('plotly.io')
+
+# ===== Pre-warm Settings =====
+# Setelah data 00:00 masuk, view default setiap halaman dihitung di background dan disimpan (tabel, metric,
+# figure Plotly dalam JSON), jadi user pertama di pagi hari cukup membaca report store.
+REPORT_DIR = Path(os.environ.get("ORDERFAZ_REPORT_DIR", Path(__file__).resolve().parent.parent / ".cache" / "reports"))
+PREWARM_ENABLED = os.environ.get("ORDERFAZ_PREWARM", "1") != "0"
+# Maksimal query pre-warm bersamaan, di bawah ukuran pool supaya user tetap kebagian koneksi
+PREWARM_MAX_CONCURRENCY = max(1, min(int(os.environ.get("ORDERFAZ_PREWARM_CONCURRENCY", 2)), POOL_MAX_SIZE - 1))
+PREWARM_START_DELAY = 5 * 60       # Detik setelah 00:00 sebelum mulai cek data
+PREWARM_POLL_SECONDS = 60          # Interval cek scheduler
+PREWARM_MAX_ATTEMPTS = 6           # Percobaan per report sebelum dianggap gagal untuk hari itu
+PREWARM_BACKOFF_BASE = 30          # Detik, dikali 2 setiap percobaan gagal (+ jitter)
+PREWARM_BACKOFF_MAX = 30 * 60
+PREWARM_LOCK_STALE = 2 * 60 * 60   # Lock proses lain dianggap mati setelah 2 jam
+# Data dianggap sudah masuk kalau order terakhir paling lama sekian detik sebelum 00:00
+PREWARM_LANDED_SLACK = int(os.environ.get("ORDERFAZ_PREWARM_LANDED_SLACK", 6 * 60 * 60))
+
+PREWARM_QUERY_TAG = make_query_tag('prewarm')
+
+
+# Function to build the report store key of a page view
+def report_key(page, *params):
+    return "_".join([page, *(str(param) for param in params)])
+
+
+# Function to list the default views as (key, builder) pairs
+def default_reports(today=None):
+    today = today or date.today()
+    start_date = today - timedelta(days=WEEKLY_DEFAULT_DAYS)
+    previous_year, previous_month = previous_month_of(today.year, today.month)
+    return [
+        (report_key('gmv_weekly', start_date, today),
+         lambda: build_weekly_report(start_date, today, query_tag=make_query_tag('prewarm', 'gmv_weekly'))),
+        (report_key('gmv_monthly', today.year, today.month),
+         lambda: build_monthly_report(today.year, today.month, query_tag=make_query_tag('prewarm', 'gmv_monthly'))),
+        (report_key('gmv_monthly', previous_year, previous_month),
+         lambda: build_monthly_report(previous_year, previous_month, query_tag=make_query_tag('prewarm', 'gmv_monthly'))),
+    ]
+
+
+# ===== Report Store =====
+def _report_path(key):
+    return REPORT_DIR / f"{key}.pkl"
+
+
+# Sidecar JSON kecil per report (built_at, refresh_boundary): status warm/cold dibaca dari sini
+# tanpa membuka pickle berisi DataFrame (dan tanpa import pandas saat first paint home.py)
+def _meta_path(key):
+    return REPORT_DIR / f"{key}.json"
+
+
+def _write_atomic(path, data):
+    tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+# Function to store a report; figure disimpan sebagai JSON Plotly, valid sampai refresh 00:00 berikutnya
+# Sidecar ditulis setelah pickle, jadi sidecar yang valid selalu berarti pickle-nya sudah ada
+def save_report(key, report):
+    built_at, boundary = datetime.now(), last_refresh_boundary()
+    payload = {
+        'tables': report['tables'],
+        'metrics': report['metrics'],
+        'figures': {name: pio.to_json(figure) for name, figure in report['figures'].items()},
+        'built_at': built_at,
+        'refresh_boundary': boundary,
+    }
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    _write_atomic(_report_path(key), pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL))
+    _write_atomic(_meta_path(key), json.dumps({'built_at': built_at.isoformat(), 'refresh_boundary': boundary}).encode())
+
+
+# Function to read the sidecar of a warm report (None kalau belum ada atau dibuat sebelum refresh 00:00 terakhir)
+def load_report_meta(key):
+    try:
+        meta = json.loads(_meta_path(key).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+    if meta.get('refresh_boundary') != last_refresh_boundary():
+        return None
+    return {**meta, 'built_at': datetime.fromisoformat(meta['built_at'])}
+
+
+def _load_payload(key):
+    try:
+        payload = pickle.loads(_report_path(key).read_bytes())
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    return payload if payload['refresh_boundary'] == last_refresh_boundary() else None
+
+
+# Function to read a warm report (None kalau belum ada atau dibuat sebelum refresh 00:00 terakhir)
+def load_report(key):
+    payload = _load_payload(key)
+    if payload is None:
+        return None
+    payload['figures'] = {name: pio.from_json(figure) for name, figure in payload['figures'].items()}
+    return payload
+
+
+# Function to delete reports & lock files of earlier refreshes (key report berisi tanggal, file lama tidak ditimpa)
+# Report tanpa sidecar (proses berhenti sebelum sidecar ditulis) dan file .tmp dihapus kalau dibuat sebelum boundary
+def prune_reports(boundary):
+    removed = 0
+    for meta_path in REPORT_DIR.glob("*.json"):
+        try:
+            stale = json.loads(meta_path.read_text())['refresh_boundary'] < boundary
+        except (FileNotFoundError, ValueError, KeyError):
+            continue
+        if stale:
+            meta_path.unlink(missing_ok=True)  # Sidecar dulu: pickle tanpa sidecar hanya dianggap cold
+            _report_path(meta_path.stem).unlink(missing_ok=True)
+            removed += 1
+    for path in [*REPORT_DIR.glob("*.pkl"), *REPORT_DIR.glob("*.tmp")]:
+        try:
+            orphan = not _meta_path(path.stem).exists() and path.stat().st_mtime < boundary
+        except FileNotFoundError:
+            continue
+        if orphan:
+            path.unlink(missing_ok=True)
+            removed += 1
+    for lock_path in REPORT_DIR.glob("prewarm_*.lock"):
+        if int(lock_path.stem.split('_')[-1]) < boundary:
+            lock_path.unlink(missing_ok=True)
+            removed += 1
+    return removed
+
+
+# ===== Pre-warm Runner =====
+_status = {}  # key -> {'state', 'attempts', 'error', 'seconds'}
+_status_lock = threading.Lock()
+
+
+def _set_status(key, **fields):
+    with _status_lock:
+        _status.setdefault(key, {'state': 'cold', 'attempts': 0, 'error': None, 'seconds': None}).update(fields)
+
+
+# Function to build & store one report with exponential backoff between failed attempts
+def _warm_one(key, build):
+    for attempt in range(1, PREWARM_MAX_ATTEMPTS + 1):
+        _set_status(key, state='warming', attempts=attempt)
+        started = time.perf_counter()
+        try:
+            save_report(key, build())
+        except Exception as exc:
+            _set_status(key, state='retrying', error=f"{type(exc).__name__}: {exc}")
+            if attempt == PREWARM_MAX_ATTEMPTS:
+                break
+            delay = min(PREWARM_BACKOFF_BASE * 2 ** (attempt - 1), PREWARM_BACKOFF_MAX)
+            time.sleep(delay * random.uniform(0.8, 1.2))
+        else:
+            _set_status(key, state='warm', error=None, seconds=round(time.perf_counter() - started, 1))
+            return True
+    _set_status(key, state='failed')
+    return False
+
+
+# Function to take the per-day lock so only one process on the host warms the reports
+def _acquire_lock(boundary):
+    REPORT_DIR.mkdir(parents=True, exist_ok=True)
+    lock_path = REPORT_DIR / f"prewarm_{boundary}.lock"
+    try:
+        if time.time() - lock_path.stat().st_mtime > PREWARM_LOCK_STALE:
+            lock_path.unlink()
+    except FileNotFoundError:
+        pass
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return lock_path
+    except FileExistsError:
+        return None
+
+
+# Function to check that the 00:00 load has landed in shipment_orders
+def data_landed():
+    last_order = fetchone("SELECT MAX(created_at) FROM shipment_orders", query_tag=PREWARM_QUERY_TAG)[0]
+    return last_order is not None and int(last_order) >= last_refresh_boundary() - PREWARM_LANDED_SLACK
+
+
+# Function to warm every default view that is still cold, returns True kalau semua warm
+def warm_all(today=None):
+    pending = [(key, build) for key, build in default_reports(today) if load_report_meta(key) is None]
+    if not pending:
+        return True
+
+    boundary = last_refresh_boundary()
+    lock_path = _acquire_lock(boundary)
+    if lock_path is None:
+        return False  # Proses lain sedang pre-warm
+    try:
+        prune_reports(boundary)
+        ensure_index_fresh()
+        ensure_rollup_fresh()
+        ensure_au_index_fresh()
+        with ThreadPoolExecutor(max_workers=PREWARM_MAX_CONCURRENCY, thread_name_prefix="prewarm") as executor:
+            return all(executor.map(lambda item: _warm_one(*item), pending))
+    finally:
+        lock_path.unlink(missing_ok=True)
+
+
+# Function to get the warm/cold state of every default view (dibaca dari sidecar report store, berlaku lintas proses)
+def prewarm_status(today=None):
+    statuses = []
+    for key, _ in default_reports(today):
+        meta = load_report_meta(key)
+        with _status_lock:
+            status = dict(_status.get(key, {'state': 'cold', 'attempts': 0, 'error': None, 'seconds': None}))
+        if meta is not None:
+            status.update(state='warm', built_at=meta['built_at'])
+        elif status['state'] == 'warm':
+            status['state'] = 'cold'  # Report hari sebelumnya, belum di-warm ulang
+        statuses.append({'key': key, **status})
+    return statuses
+
+
+class PrewarmScheduler(threading.Thread):
+    """Daemon thread that warms the default views once per day after the 00:00 refresh lands."""
+
+    def __init__(self, poll_seconds=PREWARM_POLL_SECONDS):
+        super().__init__(name="prewarm-scheduler", daemon=True)
+        self.poll_seconds = poll_seconds
+        self._stop_event = threading.Event()
+        self._warmed_boundary = None
+        self._next_check = 0.0
+        self._failures = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run_pending(self):
+        boundary = last_refresh_boundary()
+        now = time.time()
+        if self._warmed_boundary == boundary or now < boundary + PREWARM_START_DELAY or now < self._next_check:
+            return
+        try:
+            done = data_landed() and warm_all()
+        except Exception:
+            done = False
+        if done:
+            self._warmed_boundary, self._failures = boundary, 0
+        else:
+            # Data belum masuk / ada report gagal: cek lagi dengan backoff
+            self._failures += 1
+            self._next_check = now + min(PREWARM_BACKOFF_BASE * 2 ** self._failures, PREWARM_BACKOFF_MAX)
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.run_pending()
+            self._stop_event.wait(self.poll_seconds)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+# Function to start the in-process scheduler once per Streamlit process (ORDERFAZ_PREWARM=0 untuk mematikan)
+def start_prewarm_scheduler():
+    global _scheduler
+    if not PREWARM_ENABLED:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrewarmScheduler()
+            _scheduler.start()
+    return _scheduler
+
+
+# Command line: python -m utils.prewarm [once | run | status]  (run = sidecar tanpa Streamlit)
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'once'
+    if command == 'once':
+        sys.exit(0 if warm_all() else 1)
+    elif command == 'run':
+        scheduler = PrewarmScheduler()
+        scheduler.run()
+    elif command == 'status':
+        for status in prewarm_status():
+            print(f"{status['key']:32s} {status['state']:8s} {status.get('built_at') or ''}")
+    else:
+        sys.exit(f"Unknown command: {command}")
@@ -0,0 +1,369 @@
+# ----- Import Library -----
+from datetime import date, timedelta
+
+from utils.hll import approx_distinct
+from utils.metrics import (DISTINCT_COLUMNS, KPI_COLUMNS, build_buckets, fetch_bucket_kpis, iter_bucket_kpis, kpi_frame,
+                           month_users_of)
+from utils.mtd import MTD_ENABLED, fetch_month_to_date, is_open_month
+from utils.perf import span
+from utils.rollup import day_range
+from utils.startup import lazy_import
+from utils.weeks import month_weeks
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+px = lazy_import('plotly.express')
+
+# ===== Report Builders =====
+# Tabel, metric dan figure Plotly untuk halaman GMV Weekly & GMV Monthly.
+# Dipakai oleh halaman (saat Submit), pre-warm scheduler (utils/prewarm.py) dan batch export (utils/batch.py).
+# Report = {'tables': {nama: DataFrame}, 'metrics': {nama: nilai}, 'figures': {nama: plotly Figure}}
+
+WEEKLY_DEFAULT_DAYS = 30  # Default dashboard1: 30 hari terakhir sampai hari ini
+
+# Mode approximate: KPI distinct yang diambil dari HLL sketch harian (nama metric utils/hll.py = nama KPI),
+# query KPI hanya menghitung KPI distinct sisanya (R/N Transacting User tidak punya sketch)
+SKETCH_COLUMNS = ('active_user', 'trx_user')
+SKETCH_FREE_DISTINCT = tuple(column for column in DISTINCT_COLUMNS if column not in SKETCH_COLUMNS)
+
+
+# Function to calculate GMV EOM (skalar atau array per minggu: GMV kumulatif / hari berjalan * hari dalam bulan)
+def calculate_gmv_eom(gmv_final, days, days_in_month):
+    gmv_eom = np.asarray(gmv_final, dtype=np.float64) / days * days_in_month
+    return gmv_eom if gmv_eom.ndim else float(gmv_eom)
+
+
+# Function to map a typed KPI frame (utils.metrics.kpi_frame) to the report table columns, TU = R + N Transacting User
+def report_columns(kpis):
+    return {
+        'GMV Final Status': kpis['gmv_final_status'].to_numpy(),
+        'Orders Qty': kpis['order_qty'].to_numpy(),
+        'R Transacting User': kpis['r_trx_user'].to_numpy(),
+        'N Transacting User': kpis['n_trx_user'].to_numpy(),
+        'AU (Aktive User)': kpis['active_user'].to_numpy(),
+        'TU (Trx User)': (kpis['r_trx_user'] + kpis['n_trx_user']).to_numpy(),
+        'AOV': kpis['aov'].to_numpy(),
+        'COD RTS%': kpis['cod_rts'].to_numpy(),
+    }
+
+
+# Function to get the previous (year, month)
+def previous_month_of(year, month):
+    previous = date(year, month, 1) - timedelta(days=1)
+    return previous.year, previous.month
+
+
+# ===== GMV Weekly (dashboard1) =====
+# Metric perbandingan mode compare: key metric -> kolom tabel
+COMPARE_METRICS = {
+    'gmv': 'GMV Final Status',
+    'orders_qty': 'Orders Qty',
+    'aov': 'AOV',
+    'active_user': 'AU (Aktive User)',
+    'trx_user': 'TU (Trx User)',
+    'cod_rts': 'COD RTS%',
+}
+
+
+# Function to get the period of the same length right before (start_date, end_date)
+def previous_period_of(start_date, end_date):
+    days_in_period = (end_date - start_date).days + 1
+    return start_date - timedelta(days=days_in_period), start_date - timedelta(days=1)
+
+
+# Function to compute the % change vs the previous value, NaN kalau nilai sebelumnya 0/kosong (tidak ada data)
+def pct_delta(current, previous):
+    return (current - previous) / previous * 100 if previous and not pd.isna(previous) else np.nan
+
+
+# Function to format a delta for st.metric, None (delta tidak ditampilkan) kalau delta NaN/inf
+def format_delta(value, unit):
+    return None if pd.isna(value) or np.isinf(value) else f"{np.round(value, 2)}{unit}"
+
+
+# Function to compute current vs previous period values and deltas (COD RTS% dalam poin persen, lainnya %)
+def period_deltas(df, prev_df):
+    metrics = {}
+    for name, column in COMPARE_METRICS.items():
+        current, previous = float(df[column].iloc[0]), float(prev_df[column].iloc[0])
+        metrics[name], metrics[f'{name}_prev'] = current, previous
+        if name == 'cod_rts':
+            metrics[f'delta_{name}'] = (current - previous) * 100
+        else:
+            metrics[f'delta_{name}'] = pct_delta(current, previous)
+    return metrics
+
+
+# Function to build the KPI table for one date range
+# compare=True: periode sebelumnya (panjang sama) ikut dihitung di query yang sama sebagai bucket kedua,
+# shipment_orders di-scan sekali untuk window gabungan dan diagregasi per bucket
+def build_weekly_report(start_date, end_date, stats=None, query_tag=None, compare=False):
+    # Window selalu hari penuh (00:00:00 .. 23:59:59) supaya bind-nya sama untuk request yang sama
+    buckets = build_buckets('period', [day_range(start_date, end_date)])
+    if compare:
+        buckets += build_buckets('previous', [day_range(*previous_period_of(start_date, end_date))])
+    results = fetch_bucket_kpis(buckets, stats=stats, query_tag=query_tag)
+
+    # Prepare DataFrame with results
+    with span('dataframe', table='period'):
+        df = pd.DataFrame(report_columns(kpi_frame(results, [('period', 0)])))
+        if not compare:
+            return {'tables': {'df': df}, 'metrics': {}, 'figures': {}}
+        prev_df = pd.DataFrame(report_columns(kpi_frame(results, [('previous', 0)])))
+
+    return {'tables': {'df': df, 'prev_df': prev_df}, 'metrics': period_deltas(df, prev_df), 'figures': {}}
+
+
+# ===== GMV Monthly (dashboard2) =====
+# Function to build the buckets of a monthly report: semua minggu bulan ini & bulan lalu + total 1 bulan
+def monthly_buckets(weeks, prev_weeks):
+    current_bounds = weeks.bounds()
+    return (build_buckets('current', current_bounds) + build_buckets('previous', prev_weeks.bounds())
+            + build_buckets('month', [(current_bounds[0][0], current_bounds[-1][1])]))
+
+
+# Function to plan an approximate monthly report: AU & TU minggu bulan ini dan total 1 bulan dari HLL sketch
+# (panggil ensure_sketches_fresh() dulu), minggu bulan lalu tidak butuh AU/TU. Total 1 bulan tetap di-query
+# untuk R/N Transacting User (tidak punya sketch).
+# Window yang sketch-nya belum lengkap (mis. bulan lama di luar backfill) tetap dihitung exact.
+# Hasil: ([(buckets, distinct)] untuk fetch_bucket_kpis / iter_bucket_kpis, {(period, bucket): (AU, TU) dari sketch})
+def approximate_plan(weeks, prev_weeks):
+    sketched = {}
+    buckets = monthly_buckets(weeks, prev_weeks)
+    for bucket in buckets:
+        if bucket[0] != 'previous':
+            values = tuple(approx_distinct(metric, bucket[2], bucket[3]) for metric in SKETCH_COLUMNS)
+            if None not in values:
+                sketched[bucket[:2]] = values
+
+    sketch_buckets = [bucket for bucket in buckets if bucket[0] == 'previous' or bucket[:2] in sketched]
+    exact_buckets = [bucket for bucket in buckets if bucket[0] != 'previous' and bucket[:2] not in sketched]
+    groups = [(group, distinct) for group, distinct in ((sketch_buckets, SKETCH_FREE_DISTINCT), (exact_buckets, None))
+              if group]
+    return groups, sketched
+
+
+# Function to put the sketch AU & TU into the period results of an approximate monthly report
+def apply_sketches(period_results, sketched):
+    positions = [KPI_COLUMNS.index(column) for column in SKETCH_COLUMNS]
+    for key, values in sketched.items():
+        if key in period_results:
+            kpis = list(period_results[key])
+            for position, value in zip(positions, values):
+                kpis[position] = value
+            period_results[key] = tuple(kpis)
+    return period_results
+
+
+# Function to fill the current & previous month week tables from the per-bucket results
+# approximate=True: AU & TU dari hasil apply_sketches (TU = distinct transacting user, bukan R + N)
+def fill_month_tables(weeks, prev_weeks, period_results, approximate=False):
+    weeks_df, days_in_month = weeks.to_frame(), int(weeks.days_in_month[0])
+    prev_weeks_df, prev_days_in_month = prev_weeks.to_frame(), int(prev_weeks.days_in_month[0])
+
+    with span('dataframe', table='current'):
+        kpis = kpi_frame(period_results, [('current', i) for i in range(len(weeks))])
+        for name, values in report_columns(kpis).items():
+            weeks_df[name] = values
+
+        if approximate:
+            weeks_df['TU (Trx User)'] = kpis['trx_user'].to_numpy()
+
+        # Tambahkan kolom GMV EOM setelah GMV Final Status (GMV kumulatif sampai minggu itu)
+        weeks_df.insert(weeks_df.columns.get_loc('GMV Final Status') + 1, 'GMV EOM',
+                        calculate_gmv_eom(kpis['gmv_final_status'].cumsum().to_numpy(), weeks.days_elapsed, days_in_month))
+
+    # ==== PROCESS DATA FOR PREVIOUS MONTH ====
+    with span('dataframe', table='previous'):
+        prev_kpis = kpi_frame(period_results, [('previous', i) for i in range(len(prev_weeks))])
+        prev_weeks_df['GMV Final Status'] = prev_kpis['gmv_final_status'].to_numpy()
+        prev_weeks_df['GMV EOM'] = calculate_gmv_eom(prev_kpis['gmv_final_status'].cumsum().to_numpy(),
+                                                     prev_weeks.days_elapsed, prev_days_in_month)
+        prev_weeks_df['Orders Qty'] = prev_kpis['order_qty'].to_numpy()
+        prev_weeks_df['AOV'] = prev_kpis['aov'].to_numpy()
+
+    return weeks_df, prev_weeks_df
+
+
+# Function to build the raw per-week KPI rows of both months (periode, minggu, window epoch, semua KPI) untuk export
+def raw_week_rows(weeks, prev_weeks, period_results):
+    frames = []
+    for period, calendar in (('current', weeks), ('previous', prev_weeks)):
+        frame = kpi_frame(period_results, [(period, i) for i in range(len(calendar))])
+        frame.insert(0, 'period', period)
+        frame.insert(1, 'week', calendar.week_numbers)
+        frame.insert(2, 'start_ts', calendar.starts)
+        frame.insert(3, 'end_ts', calendar.ends)
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True)
+
+
+# Function to compute the summary metrics (rata-rata, GMV EOM, delta % vs bulan lalu)
+def monthly_metrics(weeks_df, prev_weeks_df):
+    # Menghitung nilai rata-rata
+    avg_gmv = weeks_df['GMV Final Status'].mean()
+    sum_gmv_eom = weeks_df[weeks_df['Minggu ke-'] == 4]['GMV EOM'].max()
+    avg_orders_qty = weeks_df['Orders Qty'].mean()
+
+    # Hitung rata-rata untuk bulan sebelumnya
+    avg_gmv_prev = prev_weeks_df['GMV Final Status'].mean()
+    sum_gmv_eom_prev = prev_weeks_df[prev_weeks_df['Minggu ke-'] == 4]['GMV EOM'].max()
+    avg_orders_qty_prev = prev_weeks_df['Orders Qty'].mean()
+
+    return {
+        'avg_gmv': avg_gmv,
+        'sum_gmv_eom': sum_gmv_eom,
+        'avg_orders_qty': avg_orders_qty,
+        'avg_gmv_prev': avg_gmv_prev,
+        'sum_gmv_eom_prev': sum_gmv_eom_prev,
+        'avg_orders_qty_prev': avg_orders_qty_prev,
+        # Hitung delta untuk setiap metrics
+        'delta_gmv': pct_delta(avg_gmv, avg_gmv_prev),
+        'delta_gmv_eom': pct_delta(sum_gmv_eom, sum_gmv_eom_prev),
+        'delta_orders_qty': pct_delta(avg_orders_qty, avg_orders_qty_prev),
+    }
+
+
+# Function to build every Plotly figure of the monthly page
+def monthly_figures(weeks_df, month_users):
+    # Dataframe 1
+    first_columns = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan',
+                     'GMV Final Status', 'GMV EOM', 'Orders Qty', 'R Transacting User', 'N Transacting User']
+    df1 = weeks_df[first_columns]
+
+    # Dataframe 2
+    second_columns = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan',
+                      'AU (Aktive User)', 'TU (Trx User)', 'AOV', 'COD RTS%']
+    df2 = weeks_df[second_columns]
+
+    with span('chart', chart='fig_gmv'):
+        fig_gmv = px.line(df1, x='Tanggal Senin (Awal Minggu)', y='GMV Final Status',
+                          title='GMV Final Status per Minggu', labels={
+                'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
+                'GMV Final Status': 'GMV Final Status'
+            })
+        fig_gmv.update_traces(textposition='top center', mode='lines+markers+text',
+                              text=df1['GMV Final Status'].apply(lambda x: f"{x:,.0f}"))
+        fig_gmv.update_layout(yaxis_tickformat=',', showlegend=False)
+
+    # Plot Orders Qty chart
+    with span('chart', chart='fig_orders'):
+        fig_orders = px.line(df1, x='Tanggal Senin (Awal Minggu)', y='Orders Qty',
+                             title='Orders Qty per Minggu', labels={
+                'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
+                'Orders Qty': 'Jumlah Orders'
+            })
+        fig_orders.update_traces(textposition='top center', mode='lines+markers+text',
+                                 text=df1['Orders Qty'].apply(lambda x: f"{x:,.0f}"))
+        fig_orders.update_layout(yaxis_tickformat=',', showlegend=False)
+
+    # Total distinct user 1 bulan (bukan jumlah per minggu), lihat utils.metrics.MONTH_USER_COLUMNS
+    active_user_total, trx_user_total, r_transacting_total, n_transacting_total = month_users
+
+    # Plot Pie Chart for R Transacting User vs N Transacting User
+    with span('chart', chart='fig_pie_transacting'):
+        fig_pie_transacting = px.pie(values=[r_transacting_total, n_transacting_total],
+                                     names=['R Transacting User', 'N Transacting User'],
+                                     title='Perbandingan R Transacting User dan N Transacting User',
+                                     labels={'value': 'Jumlah User', 'names': 'Kategori'})
+
+        fig_pie_transacting.update_traces(textinfo='percent+label')
+        fig_pie_transacting.update_layout(legend_title_text='Jenis User')
+
+    # Plot Pie Chart for Active User vs Trx User
+    with span('chart', chart='fig_pie_active_trx'):
+        fig_pie_active_trx = px.pie(values=[active_user_total, trx_user_total],
+                                    names=['Aktive User', 'Transacting User'],
+                                    title='Perbandingan Aktive User dan Transacting User',
+                                    labels={'value': 'Jumlah User', 'names': 'Kategori'})
+
+        fig_pie_active_trx.update_traces(textinfo='percent+label')
+        fig_pie_active_trx.update_layout(legend_title_text='Jenis User')
+
+    df2_bar = df2.copy()
+
+    # Ubah sumbu X menjadi kategori (string) hanya untuk bar chart
+    df2_bar['Tanggal Senin (Awal Minggu)'] = df2_bar['Tanggal Senin (Awal Minggu)'].astype(str)
+
+    # Plot Bar Chart for AOV per Minggu
+    with span('chart', chart='fig_bar_aov'):
+        fig_bar_aov = px.bar(df2_bar, x='Tanggal Senin (Awal Minggu)', y='AOV',
+                             title='Rata-rata Nilai Pesanan (AOV) per Minggu',
+                             labels={'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
+                                     'AOV': 'Rata-rata Nilai Pesanan (AOV)'})
+
+        fig_bar_aov.update_traces(texttemplate='%{y:,.0f}', textposition='outside')
+        fig_bar_aov.update_layout(yaxis_tickformat=',', showlegend=False)
+
+    # Plot Line Chart for COD RTS per Minggu
+    with span('chart', chart='fig_line_cod_rts'):
+        fig_line_cod_rts = px.line(df2, x='Tanggal Senin (Awal Minggu)', y='COD RTS%',
+                                   title='COD RTS per Minggu',
+                                   labels={'Tanggal Senin (Awal Minggu)': 'Tanggal Minggu Awal',
+                                           'COD RTS%': 'Persentase COD RTS'})
+
+        fig_line_cod_rts.update_traces(textposition='top center', mode='lines+markers+text',
+                                       text=df2['COD RTS%'].apply(lambda x: f"{x:.2%}"))
+        # Update sumbu Y menjadi persentase
+        fig_line_cod_rts.update_layout(yaxis_tickformat='.2%', showlegend=False)
+
+    return {
+        'fig_gmv': fig_gmv,
+        'fig_orders': fig_orders,
+        'fig_pie_transacting': fig_pie_transacting,
+        'fig_pie_active_trx': fig_pie_active_trx,
+        'fig_bar_aov': fig_bar_aov,
+        'fig_line_cod_rts': fig_line_cod_rts,
+    }
+
+
+# Function to assemble the full monthly report once every bucket result is available
+# figures=False untuk batch/export tanpa halaman (utils/batch.py)
+def assemble_monthly_report(weeks, prev_weeks, period_results, month_users, approximate=False, figures=True):
+    weeks_df, prev_weeks_df = fill_month_tables(weeks, prev_weeks, period_results, approximate)
+    return {
+        'tables': {'weeks_df': weeks_df, 'prev_weeks_df': prev_weeks_df,
+                   'raw_df': raw_week_rows(weeks, prev_weeks, period_results)},
+        'metrics': {**monthly_metrics(weeks_df, prev_weeks_df), 'month_users': month_users},
+        'figures': monthly_figures(weeks_df, month_users) if figures else {},
+    }
+
+
+# Function to build the monthly report for (year, month) - dipakai halaman GMV Monthly, pre-warm & batch
+# Bulan berjalan (exact, single-scan) dibangun incremental dari state month-to-date (utils/mtd.py),
+# incremental=False = hitung ulang penuh
+# approximate=True: AU & TU dari HLL sketch (panggil ensure_sketches_fresh() dulu), lihat approximate_plan
+# max_workers: satu query per bucket di thread pool (iter_bucket_kpis) dan on_result(key, period_results, total)
+#              dipanggil setiap hasil bucket masuk (rendering progresif); None = semua bucket dalam satu query
+def build_monthly_report(year, month, stats=None, query_tag=None, figures=True, incremental=True, approximate=False,
+                         max_workers=None, on_result=None, initializer=None):
+    weeks = month_weeks(year, month)
+    prev_weeks = month_weeks(*previous_month_of(year, month))
+    if incremental and max_workers is None and not approximate and MTD_ENABLED and is_open_month(year, month):
+        period_results, month_users, projection = fetch_month_to_date(weeks, prev_weeks, stats=stats, query_tag=query_tag)
+        report = assemble_monthly_report(weeks, prev_weeks, period_results, month_users, figures=figures)
+        report['metrics'].update(projection)
+        return report
+
+    # Mode approximate: window yang sudah punya sketch di-query tanpa AU/TU (user_logs tidak di-scan)
+    if approximate:
+        bucket_groups, sketched = approximate_plan(weeks, prev_weeks)
+    else:
+        bucket_groups, sketched = [(monthly_buckets(weeks, prev_weeks), None)], {}
+
+    period_results = {}
+    if max_workers is None:
+        for group, distinct in bucket_groups:
+            period_results.update(fetch_bucket_kpis(group, stats=stats, query_tag=query_tag, distinct=distinct))
+    else:
+        total = sum(len(group) for group, _ in bucket_groups)
+        for group, distinct in bucket_groups:
+            for key, result in iter_bucket_kpis(group, max_workers=max_workers, stats=stats, initializer=initializer,
+                                                query_tag=query_tag, distinct=distinct):
+                period_results[key] = result
+                if on_result is not None:
+                    on_result(key, period_results, total)
+
+    period_results = apply_sketches(period_results, sketched)
+    return assemble_monthly_report(weeks, prev_weeks, period_results, month_users_of(period_results[('month', 0)]),
+                                   approximate, figures)
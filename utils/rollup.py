@@ -0,0 +1,239 @@
+# ----- Import Library -----
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta
+
+from utils.db import get_pool, make_query_tag, set_query_tag, traced_execute
+from utils.flight import get_gate
+
+# ===== Daily KPI Rollup =====
+# daily_kpi_rollup menyimpan metric additive per hari (jam 00:00 waktu lokal server, sama seperti dashboard):
+# GMV per status group, jumlah order, sum/count transaction_value (untuk AOV) dan jumlah COD 702/500/703.
+# Status order masih bisa berubah beberapa minggu setelah dibuat, jadi setiap refresh menghitung ulang
+# ROLLUP_RESTATE_DAYS hari terakhir.
+ROLLUP_RESTATE_DAYS = 35
+
+ROLLUP_SELECT = """
+    SELECT
+        created_at - MOD(created_at + ?, 86400) AS day_start,
+        COALESCE(SUM(CASE WHEN status IN (500, 702, 703) THEN gmv_shipment END), 0) AS gmv_final_status,
+        COALESCE(SUM(CASE WHEN status >= 300 AND status < 500 THEN gmv_shipment END), 0) AS gmv_in_process,
+        COUNT(CASE WHEN status >= 300 AND status < 500 THEN 1 END) AS order_qty,
+        COALESCE(SUM(transaction_value), 0) AS transaction_value_sum,
+        COUNT(transaction_value) AS transaction_value_count,
+        COUNT(CASE WHEN status = 702 THEN 1 END) AS cod_702,
+        COUNT(CASE WHEN status = 500 THEN 1 END) AS cod_500,
+        COUNT(CASE WHEN status = 703 THEN 1 END) AS cod_703,
+        COUNT(*) AS order_rows
+    FROM shipment_orders
+    WHERE created_at >= ? AND created_at <= ?
+    GROUP BY 1
+"""
+
+ROLLUP_COLUMNS = ('day_start', 'gmv_final_status', 'gmv_in_process', 'order_qty', 'transaction_value_sum',
+                  'transaction_value_count', 'cod_702', 'cod_500', 'cod_703', 'order_rows')
+
+CREATE_ROLLUP = "CREATE TABLE IF NOT EXISTS daily_kpi_rollup CLUSTER BY (day_start) AS " + ROLLUP_SELECT + " HAVING FALSE"
+
+# Rentang hari yang sudah pernah di-build (refresh/backfill), disimpan sebagai interval [covered_from, covered_through]
+# yang sudah digabung. Hari tanpa order tidak punya baris di daily_kpi_rollup, jadi MIN/MAX(day_start) saja tidak cukup
+# untuk membedakan "tidak ada order" dari "belum di-build".
+CREATE_COVERAGE = "CREATE TABLE IF NOT EXISTS daily_kpi_rollup_coverage (covered_from NUMBER, covered_through NUMBER)"
+
+# Coverage dibaca ulang dari database paling lama setiap ROLLUP_COVERAGE_TTL detik (backfill dari proses lain)
+ROLLUP_COVERAGE_TTL = int(os.environ.get("ORDERFAZ_ROLLUP_COVERAGE_TTL", 300))
+
+ROLLUP_QUERY_TAG = make_query_tag('maintenance', 'daily_kpi_rollup')
+
+
+# Function to get the local UTC offset in seconds (dashboard memakai jam lokal server untuk batas hari)
+def utc_offset_seconds():
+    return int(datetime.now().astimezone().utcoffset().total_seconds())
+
+
+# Function to convert a date range to (start, end) epoch timestamps
+def day_range(start_date, end_date):
+    start_timestamp = int(datetime.combine(start_date, dt_time.min).timestamp())
+    end_timestamp = int(datetime.combine(end_date, dt_time.max).timestamp())
+    return start_timestamp, end_timestamp
+
+
+# Function to merge (from, through) timestamp intervals, interval yang bersambung (detik berikutnya) ikut digabung
+def merge_intervals(intervals):
+    merged = []
+    for first, last in sorted((int(first), int(last)) for first, last in intervals):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], last))
+        else:
+            merged.append((first, last))
+    return merged
+
+
+# Function to (re)build the rollup rows for every day between start_date and end_date
+# Rentang yang di-build dicatat di daily_kpi_rollup_coverage dalam transaksi yang sama
+def rebuild_days(start_date, end_date):
+    start_timestamp, end_timestamp = day_range(start_date, end_date)
+    params = (utc_offset_seconds(), start_timestamp, end_timestamp)
+
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, ROLLUP_QUERY_TAG)
+            cur.execute(CREATE_ROLLUP, params)
+            cur.execute(CREATE_COVERAGE)
+            cur.execute("BEGIN")
+            try:
+                traced_execute(cur, "DELETE FROM daily_kpi_rollup WHERE day_start >= ? AND day_start <= ?", params[1:],
+                               query_tag=ROLLUP_QUERY_TAG, statement='delete')
+                traced_execute(cur, f"INSERT INTO daily_kpi_rollup ({', '.join(ROLLUP_COLUMNS)}) " + ROLLUP_SELECT, params,
+                               query_tag=ROLLUP_QUERY_TAG, statement='insert')
+                rows = cur.rowcount
+                cur.execute("SELECT covered_from, covered_through FROM daily_kpi_rollup_coverage")
+                coverage = merge_intervals(cur.fetchall() + [params[1:]])
+                cur.execute("DELETE FROM daily_kpi_rollup_coverage")
+                for interval in coverage:
+                    cur.execute("INSERT INTO daily_kpi_rollup_coverage (covered_from, covered_through) VALUES (?, ?)",
+                                interval)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        finally:
+            cur.close()
+    _set_coverage(coverage)
+    return rows
+
+
+_coverage = None  # (pool, dibaca pada, interval) - coverage milik database pool yang sedang dipakai
+_coverage_lock = threading.Lock()
+
+
+def _set_coverage(coverage):
+    global _coverage
+    with _coverage_lock:
+        _coverage = (get_pool(), time.monotonic(), coverage)
+
+
+# Function to get the covered (from, through) intervals of the rollup, dibaca ulang setelah ROLLUP_COVERAGE_TTL
+def rollup_coverage():
+    cached = _coverage
+    if cached is not None and cached[0] is get_pool() and time.monotonic() - cached[1] < ROLLUP_COVERAGE_TTL:
+        return cached[2]
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, ROLLUP_QUERY_TAG)
+            cur.execute(CREATE_COVERAGE)
+            cur.execute("SELECT covered_from, covered_through FROM daily_kpi_rollup_coverage")
+            coverage = merge_intervals(cur.fetchall())
+        finally:
+            cur.close()
+    _set_coverage(coverage)
+    return coverage
+
+
+# Function to check if every day of a window is in the rollup (hari setelah hari ini belum punya order, tidak perlu di-build)
+def rollup_covers(start_timestamp, end_timestamp):
+    end_timestamp = min(end_timestamp, day_range(date.today(), date.today())[1])
+    return any(first <= start_timestamp and end_timestamp <= last for first, last in rollup_coverage())
+
+
+# Function to incrementally refresh the rollup: hari baru + ROLLUP_RESTATE_DAYS hari terakhir
+def refresh_rollup(today=None):
+    today = today or date.today()
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, ROLLUP_QUERY_TAG)
+            cur.execute(CREATE_ROLLUP, (utc_offset_seconds(), 0, 0))
+            cur.execute("SELECT MAX(day_start) FROM daily_kpi_rollup")
+            last_day = cur.fetchone()[0]
+        finally:
+            cur.close()
+
+    restate_from = today - timedelta(days=ROLLUP_RESTATE_DAYS)
+    if last_day is None:
+        # Rollup masih kosong, gunakan backfill untuk mengisi riwayat lengkap (sebelum itu bucket lama dihitung raw)
+        start_date = restate_from
+    else:
+        start_date = min(datetime.fromtimestamp(int(last_day)).date(), restate_from)
+    return rebuild_days(start_date, today)
+
+
+_refreshed_on = None
+_refresh_lock = threading.Lock()
+
+
+# Function to make sure the rollup was refreshed today (sekali per proses per hari, setelah update 00:00)
+def ensure_rollup_fresh():
+    global _refreshed_on
+    today = date.today()
+    if _refreshed_on == today:
+        return
+    with _refresh_lock:
+        if _refreshed_on != today:
+            refresh_rollup(today)
+            _refreshed_on = today
+
+
+# Function to backfill the rollup month by month (supaya tiap transaksi tidak terlalu besar)
+def backfill(start_date, end_date):
+    total = 0
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        next_month = (chunk_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+        chunk_end = min(next_month - timedelta(days=1), end_date)
+        rows = rebuild_days(chunk_start, chunk_end)
+        print(f"{chunk_start} .. {chunk_end}: {rows} day(s)")
+        total += rows
+        chunk_start = next_month
+    return total
+
+
+# Function to compare the rollup against the raw shipment_orders query, day by day
+def check_consistency(start_date, end_date):
+    start_timestamp, end_timestamp = day_range(start_date, end_date)
+    params = (utc_offset_seconds(), start_timestamp, end_timestamp)
+
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, ROLLUP_QUERY_TAG)
+            cur.execute(ROLLUP_SELECT, params)
+            raw = {row[0]: tuple(row) for row in cur.fetchall()}
+            cur.execute(f"SELECT {', '.join(ROLLUP_COLUMNS)} FROM daily_kpi_rollup "
+                        "WHERE day_start >= ? AND day_start <= ?", params[1:])
+            rolled = {row[0]: tuple(row) for row in cur.fetchall()}
+        finally:
+            cur.close()
+
+    mismatches = []
+    for day_start in sorted(set(raw) | set(rolled)):
+        if raw.get(day_start) != rolled.get(day_start):
+            mismatches.append((datetime.fromtimestamp(int(day_start)).date(), raw.get(day_start), rolled.get(day_start)))
+    return mismatches
+
+
+# Command line: python -m utils.rollup [refresh | coverage | backfill START END | check START END]
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'refresh'
+    if command == 'refresh':
+        print(f"Rollup refreshed, {refresh_rollup()} day(s) rebuilt")
+    elif command == 'coverage':
+        for first, last in rollup_coverage():
+            print(f"{datetime.fromtimestamp(first).date()} .. {datetime.fromtimestamp(last).date()}")
+    elif command in ('backfill', 'check') and len(sys.argv) == 4:
+        start_date = date.fromisoformat(sys.argv[2])
+        end_date = date.fromisoformat(sys.argv[3])
+        if command == 'backfill':
+            print(f"Backfill done, {backfill(start_date, end_date)} day(s) rebuilt")
+        else:
+            mismatches = check_consistency(start_date, end_date)
+            for day, raw, rolled in mismatches:
+                print(f"MISMATCH {day}: raw={raw} rollup={rolled}")
+            print("OK" if not mismatches else f"{len(mismatches)} day(s) differ")
+            sys.exit(1 if mismatches else 0)
+    else:
+        sys.exit("Usage: python -m utils.rollup [refresh | coverage | backfill YYYY-MM-DD YYYY-MM-DD | check YYYY-MM-DD YYYY-MM-DD]")
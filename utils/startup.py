@@ -0,0 +1,198 @@
+# ----- Import Library -----
+import argparse
+import ast
+import importlib
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+# ===== Startup Settings =====
+# First paint (app.py + home.py) dan halaman yang baru dibuka tidak boleh menunggu pandas/numpy/plotly/pyarrow:
+# library berat di-import lewat lazy_import() dan baru benar-benar di-load saat report dijalankan.
+ROOT_DIR = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = ('pandas', 'numpy', 'plotly', 'pyarrow', 'PIL', 'xlsxwriter', 'tqdm', 'stqdm', 'snowflake')
+
+# Script yang dijalankan Streamlit: app.py + home.py saat first paint, halaman lain saat dibuka
+ENTRY_SCRIPTS = ['app.py', 'home.py'] + sorted(f"pages/{path.name}" for path in (ROOT_DIR / "pages").glob("*.py"))
+
+# Budget benchmark: import per script (tanpa streamlit sendiri) dan first paint app.py lewat streamlit.testing
+STARTUP_IMPORT_BUDGET_MS = float(os.environ.get("ORDERFAZ_STARTUP_IMPORT_BUDGET_MS", 150))
+STARTUP_FIRST_PAINT_BUDGET_MS = float(os.environ.get("ORDERFAZ_STARTUP_FIRST_PAINT_BUDGET_MS", 1500))
+
+_lazy_lock = threading.Lock()
+_lazy_loaded = {}  # nama module -> ms saat di-import pertama kali
+
+
+class LazyModule:
+    """Module placeholder that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        self._lazy_name = name
+
+    def __getattr__(self, attr):
+        value = getattr(_load(self._lazy_name), attr)
+        setattr(self, attr, value)  # akses berikutnya langsung dari __dict__, tanpa __getattr__
+        return value
+
+    def __repr__(self):
+        state = 'loaded' if self._lazy_name in _lazy_loaded else 'not loaded'
+        return f"<lazy module '{self._lazy_name}' ({state})>"
+
+
+def _load(name):
+    module = sys.modules.get(name)
+    if module is not None and name in _lazy_loaded:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)  # import lock Python sudah thread-safe per module
+    with _lazy_lock:
+        _lazy_loaded.setdefault(name, round((time.perf_counter() - started) * 1000, 2))
+    return module
+
+
+# Function to declare a heavy import at module level without loading it yet
+def lazy_import(name):
+    return LazyModule(name)
+
+
+# Function to list which lazy modules were actually loaded in this process and how long each import took
+def startup_stats():
+    with _lazy_lock:
+        return {'lazy_loaded_ms': dict(_lazy_loaded),
+                'heavy_in_process': [name for name in HEAVY_MODULES if name in sys.modules]}
+
+
+# ===== One-time Assets & Secrets =====
+# Function to read a static file (logo, icon) once per process
+@lru_cache(maxsize=None)
+def load_asset(name):
+    return (ROOT_DIR / name).read_bytes()
+
+
+# Function to read one st.secrets section once per process (dipakai setiap koneksi baru di pool)
+# streamlit di-import di sini saja supaya lazy_import (dipakai semua utils, CLI & tests) tidak butuh streamlit
+@lru_cache(maxsize=None)
+def get_secrets(section):
+    import streamlit as st
+    return dict(st.secrets[section])
+
+
+# ===== Startup Benchmark =====
+# Proses baru per pengukuran: import streamlit dulu (baseline), lalu semua import top-level dari script
+_IMPORT_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import streamlit
+streamlit_ms = (time.perf_counter() - started) * 1000
+baseline = set(sys.modules)
+started = time.perf_counter()
+exec(compile({source!r}, {script!r}, 'exec'), {{'__name__': '__startup_probe__'}})
+import_ms = (time.perf_counter() - started) * 1000
+loaded = sorted({{name.split('.')[0] for name in set(sys.modules) - baseline}})
+print(json.dumps({{'streamlit_ms': streamlit_ms, 'import_ms': import_ms, 'loaded': loaded}}))
+"""
+
+_FIRST_PAINT_PROBE = """
+import json, time
+try:
+    from streamlit.testing.v1 import AppTest
+except ImportError:
+    print(json.dumps({{'skipped': 'streamlit.testing tidak tersedia'}}))
+    raise SystemExit(0)
+app = AppTest.from_file({script!r}, default_timeout=120)
+started = time.perf_counter()
+app.run()
+first_paint_ms = (time.perf_counter() - started) * 1000
+print(json.dumps({{'first_paint_ms': first_paint_ms, 'exception': [e.message for e in app.exception]}}))
+"""
+
+
+# Function to extract the module-level import statements of one entry script
+def script_imports(script):
+    source = (ROOT_DIR / script).read_text(encoding='utf-8')
+    tree = ast.parse(source)
+    return "\n".join(ast.get_source_segment(source, node) for node in tree.body
+                     if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def _run_probe(code):
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# Function to measure the cold import time of every entry script (minimum over fresh processes)
+def measure_imports(scripts=ENTRY_SCRIPTS, repeat=3):
+    results = []
+    for script in scripts:
+        code = _IMPORT_PROBE.format(source=script_imports(script), script=script)
+        try:
+            runs = [_run_probe(code) for _ in range(repeat)]
+        except RuntimeError as exc:
+            results.append({'script': script, 'error': str(exc)})
+            continue
+        best = min(runs, key=lambda run: run['import_ms'])
+        results.append({'script': script,
+                        'import_ms': round(best['import_ms'], 1),
+                        'streamlit_ms': round(best['streamlit_ms'], 1),
+                        'heavy': [name for name in HEAVY_MODULES if name in best['loaded']]})
+    return results
+
+
+# Function to measure the first paint of app.py (app.py + home.py) with streamlit.testing, None kalau tidak tersedia
+def measure_first_paint(script='app.py'):
+    result = _run_probe(_FIRST_PAINT_PROBE.format(script=str(ROOT_DIR / script)))
+    return None if 'skipped' in result else result
+
+
+# Function to run the startup benchmark, returns the list of budget violations (kosong = lolos)
+def run_benchmark(import_budget_ms=STARTUP_IMPORT_BUDGET_MS, first_paint_budget_ms=STARTUP_FIRST_PAINT_BUDGET_MS,
+                  repeat=3, first_paint=True):
+    failures = []
+    print(f"{'script':<22} {'import ms':>10} {'streamlit ms':>13}  heavy modules")
+    for result in measure_imports(repeat=repeat):
+        if 'error' in result:
+            print(f"{result['script']:<22} {'error':>10}  {result['error']}")
+            failures.append(f"{result['script']}: {result['error']}")
+            continue
+        print(f"{result['script']:<22} {result['import_ms']:>10.1f} {result['streamlit_ms']:>13.1f}  "
+              f"{', '.join(result['heavy']) or '-'}")
+        if result['import_ms'] > import_budget_ms:
+            failures.append(f"{result['script']}: import {result['import_ms']:.1f} ms > budget {import_budget_ms:.0f} ms")
+        if result['heavy']:
+            failures.append(f"{result['script']}: library berat di-import saat startup ({', '.join(result['heavy'])})")
+
+    if first_paint:
+        paint = measure_first_paint()
+        if paint is None:
+            print("first paint: dilewati (streamlit.testing tidak tersedia)")
+        else:
+            print(f"first paint app.py: {paint['first_paint_ms']:.1f} ms")
+            if paint['exception']:
+                failures.append(f"first paint app.py: {paint['exception'][0]}")
+            if paint['first_paint_ms'] > first_paint_budget_ms:
+                failures.append(f"first paint {paint['first_paint_ms']:.1f} ms > budget {first_paint_budget_ms:.0f} ms")
+    return failures
+
+
+# Command line: python -m utils.startup bench [--import-budget-ms MS] [--first-paint-budget-ms MS] [--repeat N]
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cold start benchmark (import time per script + first paint)")
+    parser.add_argument('command', choices=['bench'])
+    parser.add_argument('--import-budget-ms', type=float, default=STARTUP_IMPORT_BUDGET_MS)
+    parser.add_argument('--first-paint-budget-ms', type=float, default=STARTUP_FIRST_PAINT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-first-paint', action='store_true')
+    args = parser.parse_args()
+
+    failures = run_benchmark(args.import_budget_ms, args.first_paint_budget_ms, args.repeat, not args.no_first_paint)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    print("OK" if not failures else f"{len(failures)} budget violation(s)")
+    sys.exit(1 if failures else 0)
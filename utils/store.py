@@ -0,0 +1,122 @@
+# ----- Import Library -----
+import os
+import sys
+import threading
+from collections import OrderedDict
+
+from utils.cache import last_refresh_boundary
+from utils.startup import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+go = lazy_import('plotly.graph_objects')
+pio = lazy_import('plotly.io')
+
+# ===== Report Store Settings =====
+# Satu salinan hasil (tabel, metric, figure, ranking) per key untuk semua session di proses Streamlit yang sama.
+# Session hanya menyimpan key di st.session_state; entry dibuang LRU kalau total melebihi budget byte,
+# dan tidak berlaku lagi setelah refresh 00:00 berikutnya.
+STORE_MAX_BYTES = int(os.environ.get("ORDERFAZ_STORE_MAX_BYTES", 512 * 1024 * 1024))
+
+
+# Function to estimate the resident size of a stored value in bytes
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, go.Figure):
+        # Perkiraan dari ukuran JSON-nya (data trace mendominasi)
+        return len(pio.to_json(value, validate=False))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key) + estimate_size(item) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+
+# Function to mark NumPy arrays inside a value read-only (entry dipakai bersama, jangan diubah di tempat)
+def _freeze(value):
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, dict):
+        for item in value.values():
+            _freeze(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _freeze(item)
+    return value
+
+
+class ReportStore:
+    """Process-wide LRU of finished results, bounded by an estimated byte budget.
+
+    Entries are shared between sessions and must be treated as read-only.
+    An entry built before the last 00:00 refresh is dropped on access.
+    """
+
+    def __init__(self, max_bytes=STORE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, refresh_boundary)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'puts': 0, 'evictions': 0, 'rejected': 0}
+
+    def _drop(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] != last_refresh_boundary():
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = estimate_size(_freeze(value))
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            if size > self.max_bytes:
+                self._stats['rejected'] += 1  # Lebih besar dari seluruh budget, tidak disimpan
+                return value
+            self._entries[key] = (value, size, last_refresh_boundary())
+            self._bytes += size
+            self._stats['puts'] += 1
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+# ===== Process-wide Store =====
+_store = None
+_store_lock = threading.Lock()
+
+
+# Function to get the shared report store
+def get_store():
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ReportStore()
+    return _store
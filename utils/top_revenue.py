@@ -0,0 +1,149 @@
+# ----- Import Library -----
+import os
+import sys
+
+from utils.db import get_pool, set_query_tag
+from utils.flight import get_flight, get_gate
+from utils.metrics import ADDITIVE_KPIS
+from utils.perf import annotate_query, span
+from utils.startup import lazy_import
+from utils.store import get_store
+
+np = lazy_import('numpy')
+
+# ===== Top Revenue Settings =====
+# Agregasi GMV per user dikerjakan Snowflake (GROUP BY), hasilnya dibaca sebagai Arrow batch dan di-ranking
+# dengan top-K terbatas di NumPy: memory hanya O(K + 1 batch) berapa pun jumlah user di periode itu.
+# Satu pass yang sama juga menghitung total user & GMV untuk kolom share.
+TOP_REVENUE_MAX_RANK = int(os.environ.get("ORDERFAZ_TOP_REVENUE_MAX_RANK", 1000))
+
+_gmv_expression = ADDITIVE_KPIS['gmv_final_status'][0]
+TOP_REVENUE_QUERY = f"""
+    SELECT bo.created_by, {_gmv_expression} AS gmv_final_status, COUNT(*) AS orders
+    FROM shipment_orders bo
+    WHERE bo.created_at >= ? AND bo.created_at <= ? AND bo.status IN (500, 702, 703)
+    GROUP BY bo.created_by
+    HAVING {_gmv_expression} > 0
+"""
+
+
+class TopK:
+    """Bounded top-K by value over streamed (id, value, orders) chunks.
+
+    Chunks are appended to a buffer that is cut back to the K largest values
+    with ``np.argpartition`` whenever it grows past 2K, so memory stays
+    O(K + chunk) and the amortized cost is linear in the number of rows.
+    """
+
+    def __init__(self, k):
+        self.k = k
+        self._parts = []
+        self._size = 0
+        self.total_rows = 0
+        self.total_value = 0.0
+
+    def push(self, ids, values, orders):
+        values = np.asarray(values, dtype=np.float64)
+        self.total_rows += len(values)
+        self.total_value += float(values.sum())
+        self._parts.append((np.asarray(ids), values, np.asarray(orders, dtype=np.int64)))
+        self._size += len(values)
+        if self._size > 2 * self.k:
+            self._compact()
+
+    def _compact(self):
+        ids = np.concatenate([part[0] for part in self._parts])
+        values = np.concatenate([part[1] for part in self._parts])
+        orders = np.concatenate([part[2] for part in self._parts])
+        if len(values) > self.k:
+            keep = np.argpartition(-values, self.k - 1)[:self.k]
+            ids, values, orders = ids[keep], values[keep], orders[keep]
+        self._parts = [(ids, values, orders)]
+        self._size = len(values)
+
+    # Hasil akhir urut GMV terbesar, seri diurutkan berdasarkan id supaya ranking stabil
+    def result(self):
+        if not self._parts:
+            return np.array([]), np.array([], dtype=np.float64), np.array([], dtype=np.int64)
+        self._compact()
+        ids, values, orders = self._parts[0]
+        order = np.lexsort((ids.astype(str) if ids.dtype == object else ids, -values))
+        return ids[order], values[order], orders[order]
+
+
+# Function to stream the per-user GMV aggregate for a window through a bounded top-K
+def rank_top_revenue(start_timestamp, end_timestamp, k=TOP_REVENUE_MAX_RANK, query_tag=None):
+    top = TopK(k)
+    with get_gate().slot(), get_pool().connection() as connection:
+        cur = connection.cursor()
+        try:
+            set_query_tag(connection, cur, query_tag)
+            with span('query', query_tag=query_tag, ranking='top_revenue') as record:
+                cur.execute(TOP_REVENUE_QUERY, (start_timestamp, end_timestamp))
+                for batch in cur.fetch_arrow_batches():
+                    columns = {name.lower(): column for name, column in zip(batch.column_names, batch.columns)}
+                    top.push(columns['created_by'].to_numpy(zero_copy_only=False),
+                             columns['gmv_final_status'].to_numpy(zero_copy_only=False).astype(np.float64),
+                             columns['orders'].to_numpy(zero_copy_only=False))
+                annotate_query(record, cur, top.total_rows)
+        finally:
+            cur.close()
+
+    ids, gmv, orders = top.result()
+    return {'ids': ids, 'gmv': gmv, 'orders': orders, 'total_users': top.total_rows, 'total_gmv': top.total_value}
+
+
+# ===== Ranking Store & Paging =====
+# Function to get the ranking of a window from the shared report store (dihitung ulang setelah refresh 00:00)
+def get_ranking(start_timestamp, end_timestamp, k=TOP_REVENUE_MAX_RANK, query_tag=None):
+    key = "_".join(['top_revenue', str(int(start_timestamp)), str(int(end_timestamp)), str(k)])
+    ranking = get_store().get(key)
+    if ranking is None:
+        # Session lain yang meminta ranking yang sama saat ini menunggu hasil yang sama
+        ranking = get_flight().do(key, lambda: get_store().get(key) or get_store().put(
+            key, rank_top_revenue(start_timestamp, end_timestamp, k, query_tag)))
+    return ranking
+
+
+# Function to slice one page of a ranking as plain columns (hanya baris halaman itu yang dikirim ke browser)
+def ranking_page(ranking, page, page_size):
+    start = page * page_size
+    stop = min(start + page_size, len(ranking['gmv']))
+    gmv = ranking['gmv'][start:stop]
+    return {
+        'Rank': np.arange(start + 1, stop + 1),
+        'User': ranking['ids'][start:stop],
+        'GMV Final Status': gmv,
+        'Orders Qty': ranking['orders'][start:stop],
+        'Share GMV %': gmv / ranking['total_gmv'] * 100 if ranking['total_gmv'] else np.zeros(len(gmv)),
+    }
+
+
+# ===== Verification =====
+# Function to compare the streamed top-K with a full sort on random data
+def verify_top_k(n_rows=2_000_000, k=1000, chunk=65_536, seed=5):
+    rng = np.random.default_rng(seed)
+    ids = rng.permutation(n_rows).astype(np.int64)
+    values = np.round(rng.pareto(1.1, n_rows) * 1e5, 2)
+    values[rng.integers(0, n_rows, 5000)] = 1e5  # banyak nilai seri
+    orders = rng.integers(1, 50, n_rows)
+
+    top = TopK(k)
+    for offset in range(0, n_rows, chunk):
+        top.push(ids[offset:offset + chunk], values[offset:offset + chunk], orders[offset:offset + chunk])
+    top_ids, top_values, _ = top.result()
+
+    expected = np.lexsort((ids, -values))[:k]
+    return (np.array_equal(top_values, values[expected]) and np.array_equal(top_ids, ids[expected])
+            and top.total_rows == n_rows and np.isclose(top.total_value, values.sum()))
+
+
+# Command line: python -m utils.top_revenue verify
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'verify'
+    if command == 'verify':
+        ok = verify_top_k()
+        print("OK" if ok else "MISMATCH")
+        sys.exit(0 if ok else 1)
+    else:
+        sys.exit(f"Unknown command: {command}")
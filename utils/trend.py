@@ -0,0 +1,68 @@
+# ----- Import Library -----
+from utils.metrics import build_buckets, fetch_bucket_kpis, kpi_frame
+from utils.perf import span
+from utils.startup import lazy_import
+from utils.weeks import span_weeks
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# KPI distinct user yang ditampilkan trend (per bulan trend saja); bulan pembanding YoY dan data mingguan
+# hanya butuh KPI additive, jadi di-query tanpa KPI distinct (daily rollup, tanpa scan shipment_orders/user_logs)
+TREND_DISTINCT = ('active_user', 'trx_user')
+
+
+# Function to shift (year, month) by a number of months
+def shift_month(year, month, delta):
+    index = year * 12 + (month - 1) + delta
+    return index // 12, index % 12 + 1
+
+
+# Function to compute monthly + weekly KPIs for the n_months ending at (year, month) in one batched query
+# Span query ditambah 12 bulan sebelumnya supaya setiap bulan di trend punya pembanding YoY.
+def fetch_trend(year, month, n_months, stats=None, query_tag=None):
+    total_months = n_months + 12
+    first_year, first_month = shift_month(year, month, -(total_months - 1))
+    weeks = span_weeks(first_year, first_month, total_months)
+
+    # Batas tiap bulan = awal minggu pertama .. akhir minggu terakhir bulan itu
+    first_week = np.searchsorted(weeks.month_index, np.arange(total_months), side='left')
+    last_week = np.searchsorted(weeks.month_index, np.arange(total_months), side='right') - 1
+    month_bounds = list(zip(weeks.starts[first_week].tolist(), weeks.ends[last_week].tolist()))
+
+    # Data mingguan hanya untuk bulan-bulan trend (bukan 12 bulan pembanding)
+    trend_weeks = np.flatnonzero(weeks.month_index >= 12)
+    week_bounds = list(zip(weeks.starts[trend_weeks].tolist(), weeks.ends[trend_weeks].tolist()))
+
+    month_buckets = build_buckets('month', month_bounds)
+    results = fetch_bucket_kpis(month_buckets[12:], stats=stats, query_tag=query_tag, distinct=TREND_DISTINCT)
+    results.update(fetch_bucket_kpis(month_buckets[:12] + build_buckets('week', week_bounds), stats=stats,
+                                     query_tag=query_tag, distinct=()))
+
+    with span('dataframe', table='trend'):
+        month_kpis = kpi_frame(results, [('month', i) for i in range(total_months)])
+        monthly_df = pd.DataFrame({
+            'Bulan': [f"{shift_month(first_year, first_month, i)[0]}-{shift_month(first_year, first_month, i)[1]:02d}"
+                      for i in range(total_months)],
+            'GMV Final Status': month_kpis['gmv_final_status'],
+            'Orders Qty': month_kpis['order_qty'],
+            'AU (Aktive User)': month_kpis['active_user'],
+            'Trx User': month_kpis['trx_user'],
+            'AOV': month_kpis['aov'],
+            'COD RTS%': month_kpis['cod_rts'],
+        })
+
+        # YoY: dibandingkan dengan bulan yang sama tahun sebelumnya
+        monthly_df['GMV Final Status (Tahun Lalu)'] = monthly_df['GMV Final Status'].shift(12)
+        for column in ('GMV Final Status', 'Orders Qty', 'AOV'):
+            previous = monthly_df[column].shift(12).astype(float)
+            monthly_df[f'{column} YoY %'] = (monthly_df[column] - previous) / previous.replace(0, np.nan) * 100
+        monthly_df = monthly_df.iloc[12:].reset_index(drop=True)
+
+        week_kpis = kpi_frame(results, [('week', i) for i in range(len(trend_weeks))])
+        weekly_df = weeks.to_frame().iloc[trend_weeks].reset_index(drop=True)
+        weekly_df['GMV Final Status'] = week_kpis['gmv_final_status']
+        weekly_df['Orders Qty'] = week_kpis['order_qty']
+        weekly_df['AOV'] = week_kpis['aov']
+
+    return monthly_df, weekly_df
@@ -0,0 +1,225 @@
+# ----- Import Library -----
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from utils.startup import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+SECONDS_PER_DAY = 86400
+
+# Kolom tabel minggu yang dipakai dashboard
+WEEK_COLUMNS = ['Tanggal Senin (Awal Minggu)', 'Tanggal Minggu (Akhir Minggu)', 'Minggu ke-', 'Bulan']
+
+MONTH_NAMES = [datetime(1900, month, 1).strftime('%B') for month in range(1, 13)]
+
+
+# Function to convert local day numbers + second of day to epoch seconds (seperti datetime.timestamp())
+def _local_epoch(days, second_of_day):
+    naive = days * SECONDS_PER_DAY + second_of_day
+    if naive.size == 0:
+        return naive
+
+    def offset(moment):
+        return int(datetime.fromisoformat(str(moment)).astimezone().utcoffset().total_seconds())
+
+    # Zona tanpa DST (seperti WIB): satu offset untuk seluruh span, cukup dicek di awal & akhir span
+    moments = naive.astype('datetime64[s]')
+    first, last = offset(moments.min()), offset(moments.max())
+    if not time.daylight and first == last:
+        return naive - first
+    return naive - np.array([offset(moment) for moment in moments], dtype=np.int64)
+
+
+class WeekCalendar:
+    """Week buckets of one or more months as read-only NumPy int64 arrays.
+
+    ``starts``/``ends`` are epoch seconds (local time, 00:00:00 .. 23:59:59),
+    labels for the report table are only formatted when ``to_frame()`` is called.
+    """
+
+    def __init__(self, month_index, years, months, week_numbers, start_days, end_days, days_elapsed, days_in_month):
+        self.month_index = month_index
+        self.years = years
+        self.months = months
+        self.week_numbers = week_numbers
+        self.start_days = start_days        # nomor hari lokal sejak 1970-01-01
+        self.end_days = end_days
+        self.starts = _local_epoch(start_days, 0)
+        self.ends = _local_epoch(end_days, SECONDS_PER_DAY - 1)
+        self.days_elapsed = days_elapsed
+        self.days_in_month = days_in_month  # per bulan di dalam span
+        for array in (month_index, years, months, week_numbers, start_days, end_days, self.starts, self.ends,
+                      days_elapsed, days_in_month):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.starts)
+
+    # Function to get the (start, end) epoch pairs, format yang dipakai build_buckets
+    def bounds(self):
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    # Function to format the week table exactly like the original generate_weeks output
+    def to_frame(self):
+        def labels(days, clock):
+            return np.char.add(np.datetime_as_string(days.astype('datetime64[D]')), clock)
+
+        return pd.DataFrame({
+            WEEK_COLUMNS[0]: labels(self.start_days, ' 00:00:00'),
+            WEEK_COLUMNS[1]: labels(self.end_days, ' 23:59:59'),
+            WEEK_COLUMNS[2]: self.week_numbers,
+            WEEK_COLUMNS[3]: np.array(MONTH_NAMES)[self.months - 1],
+        })
+
+
+# Function to build the week calendar for n_months consecutive months starting at (year, month)
+# Aturan sama seperti generate_weeks: minggu 1 dimulai tanggal 1 dan berakhir di hari Minggu pertama
+# (atau Minggu berikutnya kalau tanggal 1 jatuh di Sabtu/Minggu), minggu terakhir yang kurang dari 7 hari
+# digabung ke minggu sebelumnya.
+def build_calendar(year, month, n_months=1):
+    first_month = np.datetime64(f"{year:04d}-{month:02d}", 'M') + np.arange(n_months)
+    month_start = first_month.astype('datetime64[D]').astype(np.int64)
+    month_end = (first_month + 1).astype('datetime64[D]').astype(np.int64) - 1
+    day_of_week = (month_start + 3) % 7  # 1970-01-01 adalah hari Kamis (weekday 3)
+
+    first_sunday = np.where(day_of_week <= 4, month_start + 6 - day_of_week, month_start + 13 - day_of_week)
+    mondays = first_sunday[:, None] + 1 + 7 * np.arange(5)[None, :]
+
+    start_days = np.concatenate([month_start[:, None], mondays], axis=1)
+    end_days = np.concatenate([first_sunday[:, None], mondays + 6], axis=1)
+    # Minggu 1 selalu ada, minggu berikutnya hanya kalau 7 harinya masih di dalam bulan
+    valid = np.concatenate([np.ones((n_months, 1), dtype=bool), mondays + 6 <= month_end[:, None]], axis=1)
+    # Sisa hari di akhir bulan ikut ke minggu terakhir
+    end_days[np.arange(n_months), valid.sum(axis=1) - 1] = month_end
+
+    rows = np.broadcast_to(np.arange(n_months)[:, None], valid.shape)[valid]
+    end_days = end_days[valid]
+
+    return WeekCalendar(
+        month_index=rows.astype(np.int64),
+        years=first_month.astype('datetime64[Y]').astype(np.int64)[rows] + 1970,
+        months=first_month.astype(np.int64)[rows] % 12 + 1,
+        week_numbers=np.cumsum(valid, axis=1)[valid].astype(np.int64),
+        start_days=start_days[valid],
+        end_days=end_days,
+        days_elapsed=end_days - month_start[rows] + 1,
+        days_in_month=month_end - month_start + 1,
+    )
+
+
+# Function to get the (memoized) week calendar of one month
+@lru_cache(maxsize=None)
+def month_weeks(year, month):
+    return build_calendar(year, month, 1)
+
+
+# Function to get the (memoized) week calendar of a span of months, misalnya 12/24 bulan untuk trend
+@lru_cache(maxsize=256)
+def span_weeks(year, month, n_months):
+    return build_calendar(year, month, n_months)
+
+
+# ===== Verification =====
+# generate_weeks asli dari pages/dashboard2.py, dipakai sebagai acuan
+
+# Function to generate weekly data based on month and year
+def legacy_generate_weeks(month, year):
+    start_date = datetime(year, month, 1)
+    end_date = (datetime(year, month + 1, 1) - timedelta(seconds=1)) if month < 12 else datetime(year, month, 31, 23, 59, 59)
+    days_in_month = (end_date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    days_in_month = days_in_month.day
+    data = []
+    day_of_week = start_date.weekday()
+
+    if day_of_week == 0:
+        current_date = start_date
+    elif day_of_week in {1, 2, 3, 4}:
+        end_of_week = start_date + timedelta(days=(6 - day_of_week))
+        end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
+        data.append({
+            "Tanggal Senin (Awal Minggu)": start_date.strftime('%Y-%m-%d %H:%M:%S'),
+            "Tanggal Minggu (Akhir Minggu)": end_of_week.strftime('%Y-%m-%d %H:%M:%S'),
+            "Minggu ke-": 1,
+            "Bulan": start_date.strftime('%B')
+        })
+        current_date = end_of_week + timedelta(seconds=1)
+    else:
+        start_of_week = start_date
+        end_of_week = start_of_week + timedelta(days=(6 - day_of_week + 7))
+        end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
+        data.append({
+            "Tanggal Senin (Awal Minggu)": start_of_week.strftime('%Y-%m-%d %H:%M:%S'),
+            "Tanggal Minggu (Akhir Minggu)": end_of_week.strftime('%Y-%m-%d %H:%M:%S'),
+            "Minggu ke-": 1,
+            "Bulan": start_of_week.strftime('%B')
+        })
+        current_date = end_of_week + timedelta(seconds=1)
+
+    week_number = 2 if day_of_week != 0 else 1
+
+    while current_date <= end_date:
+        start_of_week = current_date
+        end_of_week = start_of_week + timedelta(days=6)
+        end_of_week = end_of_week.replace(hour=23, minute=59, second=59)
+
+        if end_of_week > end_date:
+            end_of_week = end_date
+
+        data.append({
+            "Tanggal Senin (Awal Minggu)": start_of_week.strftime('%Y-%m-%d %H:%M:%S'),
+            "Tanggal Minggu (Akhir Minggu)": end_of_week.strftime('%Y-%m-%d %H:%M:%S'),
+            "Minggu ke-": week_number,
+            "Bulan": start_of_week.strftime('%B')
+        })
+
+        current_date = end_of_week + timedelta(seconds=1)
+        week_number += 1
+
+    if len(data) > 1 and (datetime.strptime(data[-1]['Tanggal Minggu (Akhir Minggu)'], '%Y-%m-%d %H:%M:%S') - datetime.strptime(data[-1]['Tanggal Senin (Awal Minggu)'], '%Y-%m-%d %H:%M:%S')).days < 6:
+        data[-2]['Tanggal Minggu (Akhir Minggu)'] = data[-1]['Tanggal Minggu (Akhir Minggu)']
+        data.pop()
+
+    return pd.DataFrame(data), days_in_month
+
+
+
+# Function to compare the calendar engine with legacy_generate_weeks for every month in a year range
+def verify_against_legacy(first_year=2000, last_year=2100):
+    mismatches = []
+    for year in range(first_year, last_year + 1):
+        for month in range(1, 13):
+            expected, expected_days = legacy_generate_weeks(month, year)
+            weeks = month_weeks(year, month)
+            actual = weeks.to_frame()
+
+            expected_bounds = [
+                (int(datetime.strptime(start, '%Y-%m-%d %H:%M:%S').timestamp()),
+                 int(datetime.strptime(end, '%Y-%m-%d %H:%M:%S').timestamp()))
+                for start, end in zip(expected[WEEK_COLUMNS[0]], expected[WEEK_COLUMNS[1]])
+            ]
+            if (not expected.equals(actual) or expected_days != int(weeks.days_in_month[0])
+                    or expected_bounds != weeks.bounds()):
+                mismatches.append((year, month))
+
+    # Span multi-bulan harus sama dengan gabungan kalender per bulan
+    span = span_weeks(first_year, 1, (last_year - first_year + 1) * 12)
+    monthly = [month_weeks(year, month) for year in range(first_year, last_year + 1) for month in range(1, 13)]
+    if span.bounds() != [bound for weeks in monthly for bound in weeks.bounds()]:
+        mismatches.append(('span', first_year, last_year))
+    return mismatches
+
+
+# Command line: python -m utils.weeks verify [FIRST_YEAR LAST_YEAR]
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'verify':
+        years = [int(year) for year in sys.argv[2:4]] or [2000, 2100]
+        mismatches = verify_against_legacy(*years)
+        for mismatch in mismatches[:20]:
+            print("MISMATCH", mismatch)
+        print("OK" if not mismatches else f"{len(mismatches)} month(s) differ")
+        sys.exit(1 if mismatches else 0)
+    sys.exit("Usage: python -m utils.weeks verify [FIRST_YEAR LAST_YEAR]")